@@ -15,10 +15,14 @@ from app.core.config import settings
 from app.db.session import get_db
 from app.db.models import User
 from app.schemas.auth import TokenData
+from app.services.principal_cache import principal_cache, snapshot_user, user_from_snapshot
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"/api/v1/auth/login"
 )
+optional_oauth2 = OAuth2PasswordBearer(
+    tokenUrl=f"/api/v1/auth/login", auto_error=False
+)
 
 
 async def get_current_user(
@@ -36,15 +40,41 @@ async def get_current_user(
             detail="Could not validate credentials",
         )
     
-    result = await db.execute(
-        select(User)
-        .options(selectinload(User.profile))
-        .where(User.id == uuid.UUID(token_data.id))
-    )
-    user = result.scalar_one_or_none()
+    user_id = uuid.UUID(token_data.id)
+    cached = await principal_cache.get(user_id)
+    if cached is not None:
+        user = user_from_snapshot(cached)
+    else:
+        generation = await principal_cache.generation(user_id)
+        result = await db.execute(
+            select(User)
+            .options(selectinload(User.profile))
+            .where(User.id == user_id)
+        )
+        user = result.scalar_one_or_none()
+        if user:
+            await principal_cache.set(user_id, snapshot_user(user), generation)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
+
+
+async def get_current_user_optional(
+    db: AsyncSession = Depends(get_db),
+    token: Optional[str] = Depends(optional_oauth2)
+) -> Optional[User]:
+    # For endpoints that work anonymously but do more for a signed-in user
+    if not token:
+        return None
+    return await get_current_user(db=db, token=token)
+
+
+async def get_current_admin(
+    current_user: User = Depends(get_current_user),
+) -> User:
+    if not current_user.is_superuser and (current_user.role or "").upper() != "ADMIN":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return current_user
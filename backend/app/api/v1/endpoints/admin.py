@@ -0,0 +1,104 @@
+# Future annotations disabled - causes Pydantic ForwardRef issues
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import deps
+from app.core.encryption import encryption_service
+from app.db.models import KeyRotationCheckpoint, User
+from app.db.session import get_db, get_session_factory
+from app.jobs.reencrypt import ENCRYPTED_COLUMNS, reencrypt_all
+from app.services.audit import audit_sink
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Per-process handle on the running job; the checkpoint table is the shared view
+_key_rotation_task: Optional[asyncio.Task] = None
+
+
+class KeyRotationTableStatus(BaseModel):
+    table_name: str
+    key_id: int
+    rows_scanned: int
+    rows_updated: int
+    last_id: Optional[uuid.UUID] = None
+    completed_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class KeyRotationStatus(BaseModel):
+    running: bool
+    active_key_id: int
+    key_ids: List[int]
+    tables: List[KeyRotationTableStatus]
+
+
+class KeyRotationRequest(BaseModel):
+    tables: Optional[List[str]] = None
+    reset: bool = False
+
+
+def _key_rotation_running() -> bool:
+    return _key_rotation_task is not None and not _key_rotation_task.done()
+
+
+async def _run_key_rotation(session_factory: Callable[[], AsyncSession], tables: List[str], reset: bool) -> None:
+    try:
+        results: Dict[str, Any] = await reencrypt_all(session_factory, tables=tables, reset=reset)
+        logger.info(f"Key rotation to key {encryption_service.active_key_id} finished: {results}")
+    except Exception:
+        logger.exception("Key rotation failed; rerun to resume from the last checkpoint")
+
+
+@router.get("/key-rotation", response_model=KeyRotationStatus)
+async def read_key_rotation(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    Progress of the bulk re-encryption job, per table.
+    """
+    result = await db.execute(select(KeyRotationCheckpoint).order_by(KeyRotationCheckpoint.table_name))
+    return KeyRotationStatus(
+        running=_key_rotation_running(),
+        active_key_id=encryption_service.active_key_id,
+        key_ids=encryption_service.key_ids,
+        tables=[KeyRotationTableStatus.model_validate(c) for c in result.scalars().all()],
+    )
+
+
+@router.post("/key-rotation", response_model=KeyRotationStatus, status_code=status.HTTP_202_ACCEPTED)
+async def start_key_rotation(
+    body: KeyRotationRequest,
+    db: AsyncSession = Depends(get_db),
+    session_factory: Callable[[], AsyncSession] = Depends(get_session_factory),
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    Start re-encrypting every PII column under the active key in the
+    background. Resumes from the last checkpoint unless `reset` is set.
+    """
+    global _key_rotation_task
+    if _key_rotation_running():
+        raise HTTPException(status_code=409, detail="Key rotation is already running")
+
+    tables = body.tables or list(ENCRYPTED_COLUMNS)
+    unknown = set(tables) - set(ENCRYPTED_COLUMNS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(sorted(unknown))}")
+
+    _key_rotation_task = asyncio.create_task(_run_key_rotation(session_factory, tables, body.reset))
+    await audit_sink.log(action="key_rotation_started", actor_id=current_user.id)
+    return await read_key_rotation(db=db, current_user=current_user)
@@ -1,16 +1,32 @@
 # Future annotations disabled - causes Pydantic ForwardRef issues
 
+import json
 import logging
+import math
+import uuid
+from typing import Any, AsyncIterator, List, Optional
 
 from pydantic import BaseModel, Field
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.pii import sanitize_pii
+from app.api import deps
+from app.core.pii import PIIStreamSanitizer, sanitize_pii
+from app.core.tokens import estimate_tokens, message_tokens
 from app.core.config import settings
-from app.services.context_store import ContextStore
-from app.services.gemini import GeminiService
+from app.db.models import Case, User
+from app.services.ai_quota import ANONYMOUS_ROLE, DEFAULT_ROLE, QuotaSubject, ai_quota
+from app.services.context_store import ContextWindow, context_store
+from app.services.context_summarizer import context_summarizer
+from app.services.document_index import Passage, build_grounded_prompt, document_indexer
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.gemini import FALLBACK_REPLIES, UNAVAILABLE_REPLY, GeminiError, build_contents, gemini_service
+from app.services.response_cache import response_cache
+from app.services.vector_index import IndexMismatch
 
 
 router = APIRouter()
@@ -18,33 +34,301 @@ router = APIRouter()
 # Rate limiter instance
 limiter = Limiter(key_func=get_remote_address)
 
-_context_store = ContextStore(settings.redis_url)
-_gemini = GeminiService(settings.gemini_api_key)
+_context_store = context_store
+_summarizer = context_summarizer
+_gemini = gemini_service
+_response_cache = response_cache
+_indexer = document_indexer
+_quota = ai_quota
 _logger = logging.getLogger(__name__)
 
 
 class GenerateRequest(BaseModel):
     prompt: str = Field(min_length=1, max_length=20000)
     session_id: str = Field(default="default", min_length=1, max_length=128)
+    # Ground the answer in this case's documents (requires sign-in)
+    case_id: Optional[uuid.UUID] = None
+
+
+class SourcePassage(BaseModel):
+    document_id: uuid.UUID
+    filename: str
+    score: float
 
 
 class GenerateResponse(BaseModel):
     text: str
+    sources: List[SourcePassage] = []
+
+
+class SessionCacheSettings(BaseModel):
+    enabled: bool
+
+
+def _cacheable(text: str) -> bool:
+    return text not in FALLBACK_REPLIES
+
+
+def _cache_session(session_id: str, current_user: Optional[User]) -> str:
+    # Session ids are client-chosen; cache opt-outs only apply to the owner's session
+    return f"user:{current_user.id}:{session_id}" if current_user else f"anonymous:{session_id}"
+
+
+async def _retrieve(req: GenerateRequest, query: str, db: AsyncSession, current_user: Optional[User]) -> List[Passage]:
+    if req.case_id is None:
+        return []
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="Sign in to ask about case documents")
+    result = await db.execute(select(Case.user_id).where(Case.id == req.case_id))
+    owner_id = result.scalar_one_or_none()
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    if current_user.role != "ADMIN" and owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    # Retrieval only adds context; without it the question is still answered
+    try:
+        return await _indexer.retrieve(db, req.case_id, query)
+    except (CircuitOpenError, GeminiError, IndexMismatch) as e:
+        _logger.warning(f"Retrieval for case {req.case_id} skipped: {e}")
+    except Exception:
+        _logger.exception(f"Retrieval for case {req.case_id} failed")
+    return []
+
+
+def _sources(passages: List[Passage]) -> List[SourcePassage]:
+    return [SourcePassage(document_id=p.document_id, filename=p.filename, score=round(p.score, 4)) for p in passages]
+
+
+def _quota_subject(request: Request, current_user: Optional[User]) -> QuotaSubject:
+    if current_user is None:
+        return QuotaSubject(f"ip:{get_remote_address(request)}", ANONYMOUS_ROLE)
+    return QuotaSubject(f"user:{current_user.id}", (current_user.role or DEFAULT_ROLE).lower())
+
+
+def _prompt_tokens(window: ContextWindow, prompt: str) -> int:
+    # What is actually sent: the fitted window (summary + recent turns), not every stored turn
+    return sum(message_tokens(m) for m in window.messages) + estimate_tokens(prompt)
+
+
+async def _reserve(subject: QuotaSubject, prompt_tokens: int) -> int:
+    """
+    Reserve the prompt plus room for the answer; 429 with the exact wait if
+    the caller's quota cannot cover it yet.
+    """
+    reserved = prompt_tokens + _quota.response_reserve
+    decision = await _quota.acquire(subject, reserved)
+    if not decision.allowed:
+        retry_after = max(1, math.ceil(decision.retry_after))
+        raise HTTPException(
+            status_code=429,
+            detail=f"AI token quota exceeded. Try again in {retry_after} s.",
+            headers={"Retry-After": str(retry_after)},
+        )
+    return reserved
+
+
+async def _account(subject: QuotaSubject, reserved: int, prompt_tokens: int, answer: Optional[str]) -> None:
+    """
+    Settle a reservation; `answer` is None when the model was not called
+    or produced nothing (cache hit, upstream failure) and the reservation
+    is refunded.
+    """
+    if answer is None:
+        await _quota.settle(subject, reserved, 0)
+        return
+    response_tokens = estimate_tokens(answer)
+    await _quota.settle(subject, reserved, prompt_tokens + response_tokens)
+    await _quota.record_usage(subject, prompt_tokens, response_tokens)
+
+
+async def _remember(session_id: str, stored_tokens: int, prompt: str, answer: str) -> None:
+    await _context_store.append_messages(session_id, [("user", prompt), ("model", answer)])
+    _summarizer.schedule_if_needed(session_id, stored_tokens + estimate_tokens(prompt) + estimate_tokens(answer))
 
 
 @router.post("/generate", response_model=GenerateResponse)
 @limiter.limit("10/minute")
-async def generate(req: GenerateRequest, request: Request) -> GenerateResponse:
+async def generate(
+    req: GenerateRequest,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: Optional[User] = Depends(deps.get_current_user_optional),
+) -> GenerateResponse:
+    sanitized = sanitize_pii(req.prompt)
+    passages = await _retrieve(req, sanitized, db, current_user)
+    prompt = build_grounded_prompt(sanitized, passages)
+    window = await _context_store.get_context(req.session_id)
+    subject = _quota_subject(request, current_user)
+    prompt_tokens = _prompt_tokens(window, prompt)
+    reserved = await _reserve(subject, prompt_tokens)
+    answered = []
+
+    async def produce() -> str:
+        text = await _gemini.generate(prompt, context=window.messages)
+        answered.append(text)
+        return text
+
     try:
-        sanitized = sanitize_pii(req.prompt)
-        context = _context_store.get_last_messages(req.session_id, limit=5)
-        text = _gemini.generate(sanitized, context=context)
-        _context_store.append_message(req.session_id, role="user", text=sanitized, keep_last=10)
-        _context_store.append_message(req.session_id, role="model", text=text, keep_last=10)
-        return GenerateResponse(text=text)
+        text = await _response_cache.get_or_generate(
+            _response_cache.make_key(_gemini.model, prompt, window.messages),
+            _cache_session(req.session_id, current_user),
+            produce,
+            cacheable=_cacheable,
+        )
+        await _account(subject, reserved, prompt_tokens, text if answered and _cacheable(text) else None)
+        # Only the question is kept in the session; passages are re-retrieved per turn.
+        # Fallback replies (upstream down or unconfigured) are not part of the conversation.
+        if _cacheable(text):
+            await _remember(req.session_id, window.stored_tokens, sanitized, text)
+        return GenerateResponse(text=text, sources=_sources(passages))
     except Exception as e:
         _logger.exception("AI generation failed")
+        await _account(subject, reserved, prompt_tokens, None)
         raise HTTPException(
             status_code=500,
             detail=f"AI generation failed: {type(e).__name__}: {e}",
         ) from e
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/generate/stream")
+@limiter.limit("10/minute")
+async def generate_stream(
+    req: GenerateRequest,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: Optional[User] = Depends(deps.get_current_user_optional),
+) -> StreamingResponse:
+    """
+    Streaming variant of /generate. Emits server-sent events:
+    `sources` (when case_id retrieval found passages), `chunk`
+    ({"text": ...}) as the model produces output, then `done` with the
+    full text, or `error` (with `retry_after` seconds while the upstream
+    circuit breaker is open). Output is PII-sanitized incrementally, and the
+    exchange is stored in the session context only once complete.
+    """
+    sanitized = sanitize_pii(req.prompt)
+    passages = await _retrieve(req, sanitized, db, current_user)
+    prompt = build_grounded_prompt(sanitized, passages)
+    window = await _context_store.get_context(req.session_id)
+    subject = _quota_subject(request, current_user)
+    prompt_tokens = _prompt_tokens(window, prompt)
+    reserved = await _reserve(subject, prompt_tokens)
+    cache_key = _response_cache.make_key(_gemini.model, prompt, window.messages)
+    use_cache, cached = await _response_cache.lookup(cache_key, _cache_session(req.session_id, current_user))
+
+    async def events() -> AsyncIterator[str]:
+        # Whatever the model produced is charged, even if the stream was cut off
+        # (client gone, upstream failed); the reservation is refunded otherwise
+        model_answer = None
+        answer: List[str] = []
+        try:
+            if passages:
+                yield _sse("sources", {"sources": [s.model_dump(mode="json") for s in _sources(passages)]})
+            if cached is not None:
+                # Entries written by /generate were never passed through the output sanitizer
+                text = sanitize_pii(cached)
+                await _remember(req.session_id, window.stored_tokens, sanitized, text)
+                yield _sse("chunk", {"text": text})
+                yield _sse("done", {"text": text})
+                return
+            if not _gemini.api_key:
+                yield _sse("error", {"detail": "Gemini API key is not configured."})
+                return
+            output = PIIStreamSanitizer()
+            try:
+                async for delta in _gemini.stream_generate_content(build_contents(prompt, window.messages)):
+                    text = output.feed(delta)
+                    if text:
+                        answer.append(text)
+                        yield _sse("chunk", {"text": text})
+                text = output.flush()
+                if text:
+                    answer.append(text)
+                    yield _sse("chunk", {"text": text})
+            except CircuitOpenError as e:
+                yield _sse("error", {"detail": UNAVAILABLE_REPLY, "retry_after": round(e.retry_after, 1)})
+                return
+            except Exception as e:
+                _logger.exception("AI streaming failed")
+                yield _sse("error", {"detail": f"AI generation failed: {type(e).__name__}"})
+                return
+
+            full_text = "".join(answer)
+            model_answer = full_text
+            if use_cache and _cacheable(full_text):
+                await _response_cache.store(cache_key, full_text)
+            await _remember(req.session_id, window.stored_tokens, sanitized, full_text)
+            yield _sse("done", {"text": full_text})
+        finally:
+            if model_answer is None and answer:
+                model_answer = "".join(answer)
+            await _account(subject, reserved, prompt_tokens, model_answer)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.put("/sessions/{session_id}/cache", response_model=SessionCacheSettings)
+async def update_session_cache(
+    session_id: str,
+    settings_in: SessionCacheSettings,
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Opt one of your sessions in or out of the shared response cache.
+    Opted-out sessions always go to the model and their answers are never
+    cached. Applies to requests made with the same session id while signed
+    in as the same user.
+    """
+    await _response_cache.set_opt_out(_cache_session(session_id, current_user), not settings_in.enabled)
+    return settings_in
+
+
+@router.get("/cache/stats")
+async def read_cache_stats(
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    Hit/miss/coalesced counters for this worker's AI response cache.
+    """
+    return _response_cache.get_stats()
+
+
+@router.get("/upstream/stats")
+async def read_upstream_stats(
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    Circuit breaker state, transition counts and hedging counters for this
+    worker's Gemini client.
+    """
+    return _gemini.get_stats()
+
+
+@router.get("/usage")
+async def read_usage(
+    days: int = Query(7, ge=1, le=settings.ai_usage_retention_days),
+    user_id: Optional[uuid.UUID] = None,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    AI token consumption per day (overall, by role, top users) and, with
+    `user_id`, that user's tokens left in their quota right now.
+    """
+    report: dict = {"days": await _quota.usage(days), "quota": _quota.get_stats()}
+    if user_id is not None:
+        result = await db.execute(select(User.role).where(User.id == user_id))
+        role = result.scalar_one_or_none()
+        if role is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        subject = QuotaSubject(f"user:{user_id}", (role or DEFAULT_ROLE).lower())
+        report["user"] = {"user_id": str(user_id), "role": subject.role, "remaining_tokens": await _quota.remaining(subject)}
+    return report
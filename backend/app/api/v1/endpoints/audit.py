@@ -1,21 +1,31 @@
 # Future annotations disabled - causes Pydantic ForwardRef issues
 
-from typing import Any, List, Optional
+import csv
+import io
+import json
+import uuid
+from typing import Any, AsyncIterator, Callable, List, Optional
 from datetime import datetime
 
 from pydantic import BaseModel, ConfigDict
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, tuple_
 
-from app.db.session import get_db
+from app.api import deps
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db.session import get_db, get_session_factory
 from app.db.models import AuditLog, User
 
 router = APIRouter()
 
+EXPORT_COLUMNS = ["id", "timestamp", "action", "actor_id", "ip_address", "details", "cursor"]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 
 class AuditLogResponse(BaseModel):
-    id: int
+    id: uuid.UUID
     actor_id: Optional[str] = None
     action: str
     resource_id: Optional[str] = None
@@ -25,40 +35,169 @@ class AuditLogResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
-@router.get("/logs", response_model=List[AuditLogResponse])
+class AuditLogPage(BaseModel):
+    items: List[AuditLogResponse]
+    next_cursor: Optional[str] = None
+
+
+def _to_response(log: AuditLog) -> AuditLogResponse:
+    return AuditLogResponse(
+        id=log.id,
+        actor_id=str(log.actor_id) if log.actor_id else None,
+        action=log.action,
+        resource_id=(log.details or {}).get("resource_id"),
+        ip_address=log.ip_address,
+        timestamp=log.timestamp,
+    )
+
+
+def filter_audit_logs(
+    query,
+    action: Optional[str] = None,
+    actor_id: Optional[uuid.UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Apply the shared audit-log filters. Each combination is served by one of
+    the composite (…, timestamp, id) indexes on AuditLog.
+    """
+    if action is not None:
+        query = query.where(AuditLog.action == action)
+    if actor_id is not None:
+        query = query.where(AuditLog.actor_id == actor_id)
+    if since is not None:
+        query = query.where(AuditLog.timestamp >= since)
+    if until is not None:
+        query = query.where(AuditLog.timestamp < until)
+    return query
+
+
+@router.get("/logs", response_model=AuditLogPage)
 async def get_audit_logs(
     db: AsyncSession = Depends(get_db),
-    limit: int = Query(default=50, le=100),
-    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    action: Optional[str] = None,
+    actor_id: Optional[uuid.UUID] = None,
+    since: Optional[datetime] = Query(default=None, description="Inclusive lower bound on timestamp"),
+    until: Optional[datetime] = Query(default=None, description="Exclusive upper bound on timestamp"),
 ) -> Any:
     """
     Retrieve audit logs.
-    Returns paginated list of audit logs ordered by timestamp descending.
+    Returns a page of audit logs ordered by timestamp descending. Pages are
+    keyed on (timestamp, id), so every page costs the same regardless of depth.
     """
+    query = filter_audit_logs(select(AuditLog), action, actor_id, since, until)
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = query.where(tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(*after))
+
     result = await db.execute(
-        select(AuditLog)
-        .order_by(desc(AuditLog.timestamp))
-        .limit(limit)
-        .offset(offset)
+        query
+        .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+        .limit(limit + 1)
     )
     logs = result.scalars().all()
-    
-    return [
-        AuditLogResponse(
-            id=log.id,
-            actor_id=str(log.actor_id) if log.actor_id else None,
-            action=log.action,
-            resource_id=str(log.resource_id) if log.resource_id else None,
-            ip_address=log.ip_address,
-            timestamp=log.timestamp,
-        )
-        for log in logs
-    ]
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_cursor(logs[-1].timestamp, logs[-1].id)
+
+    return AuditLogPage(items=[_to_response(log) for log in logs], next_cursor=next_cursor)
+
+
+def _export_record(row) -> dict:
+    return {
+        "id": str(row.id),
+        "timestamp": row.timestamp.isoformat(),
+        "action": row.action,
+        "actor_id": str(row.actor_id) if row.actor_id else None,
+        "ip_address": row.ip_address,
+        "details": row.details,
+        # Resume token: pass as ?cursor= to continue after this row
+        "cursor": encode_cursor(row.timestamp, row.id),
+    }
+
+
+async def _stream_export(
+    session_factory: Callable[[], AsyncSession],
+    query,
+    fmt: str,
+    chunk_rows: int,
+) -> AsyncIterator[str]:
+    async with session_factory() as session:
+        # Column rows over a server-side cursor: nothing enters the identity
+        # map and at most `chunk_rows` rows are held in memory at a time
+        result = await session.stream(query.execution_options(yield_per=chunk_rows))
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            async for partition in result.partitions():
+                for row in partition:
+                    record = _export_record(row)
+                    if record["details"] is not None:
+                        record["details"] = json.dumps(record["details"])
+                    writer.writerow([record[column] for column in EXPORT_COLUMNS])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            async for partition in result.partitions():
+                yield "".join(json.dumps(_export_record(row)) + "\n" for row in partition)
+
+
+@router.get("/export")
+async def export_audit_logs(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    cursor: Optional[str] = Query(default=None, description="Resume after the row carrying this cursor"),
+    action: Optional[str] = None,
+    actor_id: Optional[uuid.UUID] = None,
+    since: Optional[datetime] = Query(default=None, description="Inclusive lower bound on timestamp"),
+    until: Optional[datetime] = Query(default=None, description="Exclusive upper bound on timestamp"),
+    chunk_rows: int = Query(default=1000, ge=1, le=10000),
+    session_factory: Callable[[], AsyncSession] = Depends(get_session_factory),
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    Stream every matching audit log as NDJSON or CSV, oldest first.
+    Each record carries a cursor; pass the last one received to resume an
+    interrupted export.
+    """
+    query = filter_audit_logs(
+        select(
+            AuditLog.id,
+            AuditLog.timestamp,
+            AuditLog.action,
+            AuditLog.actor_id,
+            AuditLog.ip_address,
+            AuditLog.details,
+        ),
+        action,
+        actor_id,
+        since,
+        until,
+    )
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = query.where(tuple_(AuditLog.timestamp, AuditLog.id) > tuple_(*after))
+    query = query.order_by(AuditLog.timestamp.asc(), AuditLog.id.asc())
+
+    return StreamingResponse(
+        _stream_export(session_factory, query, format, chunk_rows),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="audit_logs.{format}"'},
+    )
 
 
 @router.get("/logs/{log_id}", response_model=AuditLogResponse)
 async def get_audit_log(
-    log_id: int,
+    log_id: uuid.UUID,
     db: AsyncSession = Depends(get_db),
 ) -> Any:
     """
@@ -72,11 +211,4 @@ async def get_audit_log(
     if not log:
         raise HTTPException(status_code=404, detail="Audit log not found")
     
-    return AuditLogResponse(
-        id=log.id,
-        actor_id=str(log.actor_id) if log.actor_id else None,
-        action=log.action,
-        resource_id=str(log.resource_id) if log.resource_id else None,
-        ip_address=log.ip_address,
-        timestamp=log.timestamp,
-    )
+    return _to_response(log)
@@ -16,7 +16,7 @@ from app.core.config import settings
 from app.db.session import get_db
 from app.db.models import User
 from app.schemas.user import Token, UserCreate, UserResponse as UserSchema, ForgotPassword
-from app.services.audit import create_audit_log
+from app.services.audit import audit_sink
 
 router = APIRouter()
 
@@ -45,7 +45,7 @@ async def register(
         )
     
     try:
-        password_hash = security.get_password_hash(user_in.password)
+        password_hash = await security.password_hasher.hash(user_in.password)
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e)) from e
 
@@ -71,8 +71,7 @@ async def register(
     user = result.scalar_one()
     
     # Audit log
-    await create_audit_log(
-        db=db,
+    await audit_sink.log(
         action="user_registered",
         actor_id=user.id,
         ip_address=request.client.host if request.client else None,
@@ -94,7 +93,7 @@ async def login(
     result = await db.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
     
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    if not user or not await security.password_hasher.verify(form_data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -102,8 +101,7 @@ async def login(
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     
     # Audit log
-    await create_audit_log(
-        db=db,
+    await audit_sink.log(
         action="user_login",
         actor_id=user.id,
         ip_address=request.client.host if request.client else None,
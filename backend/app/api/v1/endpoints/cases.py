@@ -1,59 +1,109 @@
 from __future__ import annotations
 
 import uuid
-from typing import Any, List
+from typing import Any, Callable, List, Optional, Union
 
 import os
-import shutil
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.orm import noload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.api import deps
-from app.db.models import Case, User, Document
-from app.schemas.case import Case as CaseSchema, CaseCreate, CaseUpdate
-from app.schemas.document import Document as DocumentSchema
+from app.db.models import Case, User, Document, DocumentAnalysis
+from app.schemas.case import Case as CaseSchema, CaseCreate, CaseSummary, CaseUpdate
+from app.schemas.document import Document as DocumentSchema, DocumentAnalysis as DocumentAnalysisSchema
+from app.core.config import settings
+from app.core.pagination import decode_cursor, encode_cursor
 from app.core.encryption import encryption_service
+from app.core.responses import SendfileResponse
+from app.db.session import get_session_factory
+from app.services.document_analysis import document_analyzer
+from app.services.document_index import document_indexer
+from app.services.storage import UploadTooLarge, acquire_blob_ref, blob_store
 
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = settings.upload_dir
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[CaseSchema])
+async def _count_cases(db: AsyncSession, current_user: User, estimated: bool) -> int:
+    if current_user.role == "ADMIN":
+        if estimated and db.get_bind().dialect.name == "postgresql":
+            # Planner statistics instead of a full-table COUNT(*)
+            result = await db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"),
+                {"name": '"case"'},
+            )
+            reltuples = result.scalar()
+            if reltuples is not None and reltuples >= 0:
+                return reltuples
+        result = await db.execute(select(func.count()).select_from(Case))
+    else:
+        # One user's cases: an index-only range scan on ix_case_user_created_id
+        result = await db.execute(
+            select(func.count()).select_from(Case).where(Case.user_id == current_user.id)
+        )
+    return result.scalar_one()
+
+
+@router.get("/", response_model=List[Union[CaseSchema, CaseSummary]])
 async def read_cases(
+    response: Response,
     db: AsyncSession = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_user),
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(default=0, ge=0, deprecated=True, description="Use cursor instead"),
+    limit: int = Query(default=100, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor from the previous page"),
+    include: Optional[str] = Query(default=None, pattern="^documents$"),
+    count: Optional[str] = Query(default=None, pattern="^(estimated|exact)$"),
 ) -> Any:
     """
-    Retrieve cases.
+    Retrieve cases, newest first.
+    Pages are keyed on (created_at, id); the next page's cursor is returned
+    in the X-Next-Cursor header. Documents are only loaded, and the
+    documents field only present, with include=documents. count=estimated|exact adds an X-Total-Count header.
     """
-    if current_user.role == "ADMIN":
-        result = await db.execute(
-            select(Case)
-            .options(selectinload(Case.documents))
-            .offset(skip)
-            .limit(limit)
-        )
+    query = select(Case)
+    if current_user.role != "ADMIN":
+        query = query.where(Case.user_id == current_user.id)
+    if include == "documents":
+        query = query.options(selectinload(Case.documents))
     else:
-        result = await db.execute(
-            select(Case)
-            .where(Case.user_id == current_user.id)
-            .options(selectinload(Case.documents))
-            .offset(skip)
-            .limit(limit)
-        )
+        query = query.options(noload(Case.documents))
+
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = query.where(tuple_(Case.created_at, Case.id) < tuple_(*after))
+    elif skip:
+        query = query.offset(skip)
+
+    result = await db.execute(
+        query
+        .order_by(Case.created_at.desc(), Case.id.desc())
+        .limit(limit + 1)
+    )
     cases = result.scalars().all()
+
+    if len(cases) > limit:
+        cases = cases[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(cases[-1].created_at, cases[-1].id)
+    if count:
+        response.headers["X-Total-Count"] = str(
+            await _count_cases(db, current_user, estimated=count == "estimated")
+        )
     
-    # Decrypt descriptions for the response
-    for case in cases:
-        if case.description_enc:
-            case.description = encryption_service.decrypt(case.description_enc)
+    # Decrypt descriptions for the response, one batch per page. Set as
+    # committed state so the plaintext can never be flushed back to the row
+    descriptions = await encryption_service.decrypt_many([case.description_enc for case in cases])
+    for case, description in zip(cases, descriptions):
+        if description is not None:
+            set_committed_value(case, "description", description)
     
-    return cases
+    if include == "documents":
+        return [CaseSchema.model_validate(case) for case in cases]
+    return [CaseSummary.model_validate(case) for case in cases]
 
 
 @router.post("/", response_model=CaseSchema)
@@ -114,7 +164,7 @@ async def read_case(
         raise HTTPException(status_code=400, detail="Not enough permissions")
     
     if case.description_enc:
-        case.description = encryption_service.decrypt(case.description_enc)
+        set_committed_value(case, "description", encryption_service.decrypt(case.description_enc))
         
     return case
 
@@ -124,10 +174,12 @@ async def upload_document(
     id: uuid.UUID,
     file: UploadFile = File(...),
     db: AsyncSession = Depends(deps.get_db),
+    session_factory: Callable[[], AsyncSession] = Depends(get_session_factory),
     current_user: User = Depends(deps.get_current_user),
 ) -> Any:
     """
-    Upload a document to a case.
+    Upload a document to a case. It is indexed for AI retrieval in the
+    background.
     """
     # Verify case access
     result = await db.execute(select(Case).where(Case.id == id))
@@ -138,20 +190,141 @@ async def upload_document(
     if current_user.role != "ADMIN" and case.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    # Save file
-    file_location = f"{UPLOAD_DIR}/{id}_{file.filename}"
-    with open(file_location, "wb+") as file_object:
-        shutil.copyfileobj(file.file, file_object)
+    # Save file into the content-addressed store; identical content is
+    # stored once and re-uploads skip the disk write. The raw body was
+    # already capped by BodySizeLimitMiddleware while it was received;
+    # this enforces the exact file size.
+    filename = os.path.basename(file.filename or "") or "upload"
+    try:
+        digest = await blob_store.digest(file, max_bytes=settings.upload_max_bytes)
+        # Reference before relying on an existing file: it locks the Blob
+        # row against the garbage collector until the commit below
+        await acquire_blob_ref(db, *digest)
+        stored = await blob_store.put(file, max_bytes=settings.upload_max_bytes, digest=digest)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
     
     # Create DB record
     document = Document(
         case_id=id,
-        filename=file.filename,
-        file_path=file_location,
-        content_type=file.content_type or "application/octet-stream"
+        filename=filename,
+        file_url=stored.path,
+        content_type=file.content_type or "application/octet-stream",
+        content_hash=stored.sha256,
+        size_bytes=stored.size,
     )
     db.add(document)
     await db.commit()
     await db.refresh(document)
+    document_indexer.schedule(session_factory, document)
     
     return document
+
+
+async def _get_case_document(db: AsyncSession, case_id: uuid.UUID, document_id: uuid.UUID, current_user: User) -> Document:
+    result = await db.execute(
+        select(Document, Case.user_id)
+        .join(Case, Document.case_id == Case.id)
+        .where(Document.id == document_id, Document.case_id == case_id)
+    )
+    row = result.one_or_none()
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found")
+    document, owner_id = row
+    if current_user.role != "ADMIN" and owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return document
+
+
+@router.api_route("/{id}/documents/{document_id}", methods=["GET", "HEAD"])
+async def download_document(
+    id: uuid.UUID,
+    document_id: uuid.UUID,
+    request: Request,
+    disposition: str = Query(default="attachment", pattern="^(attachment|inline)$"),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Download a case document.
+    Supports Range/If-Range (resume, PDF preview) and If-None-Match against
+    an ETag derived from the content hash.
+    """
+    document = await _get_case_document(db, id, document_id, current_user)
+
+    headers = {"Cache-Control": "private, no-cache"}
+    if document.content_hash:
+        etag = f'"{document.content_hash}"'
+        headers["ETag"] = etag
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if etag in candidates or "*" in candidates:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if not os.path.isfile(document.file_url):
+        raise HTTPException(status_code=404, detail="Document file is missing")
+
+    return SendfileResponse(
+        document.file_url,
+        media_type=document.content_type or "application/octet-stream",
+        filename=document.filename,
+        headers=headers,
+        content_disposition_type=disposition,
+    )
+
+
+def _analysis_response(analysis: DocumentAnalysis) -> DocumentAnalysisSchema:
+    return DocumentAnalysisSchema(
+        document_id=analysis.document_id,
+        status=analysis.status,
+        model=analysis.model,
+        chunks_total=analysis.chunks_total,
+        chunks_done=analysis.chunks_done,
+        summary=encryption_service.decrypt(analysis.summary_enc) if analysis.summary_enc else None,
+        error=analysis.error,
+        created_at=analysis.created_at,
+        updated_at=analysis.updated_at,
+        completed_at=analysis.completed_at,
+    )
+
+
+@router.post("/{id}/documents/{document_id}/analysis", response_model=DocumentAnalysisSchema)
+async def request_document_analysis(
+    id: uuid.UUID,
+    document_id: uuid.UUID,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_db),
+    session_factory: Callable[[], AsyncSession] = Depends(get_session_factory),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Start an AI analysis of a case document, or return the existing one.
+    Returns 200 with the result when it is already available (including
+    from an identical earlier upload), otherwise 202; poll
+    GET .../analysis for progress.
+    """
+    document = await _get_case_document(db, id, document_id, current_user)
+    analysis = await document_analyzer.request(db, document, session_factory)
+    if analysis.status != "COMPLETED":
+        response.status_code = status.HTTP_202_ACCEPTED
+    return _analysis_response(analysis)
+
+
+@router.get("/{id}/documents/{document_id}/analysis", response_model=DocumentAnalysisSchema)
+async def read_document_analysis(
+    id: uuid.UUID,
+    document_id: uuid.UUID,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Status, progress (chunks_done / chunks_total) and, once completed, the
+    analysis text.
+    """
+    await _get_case_document(db, id, document_id, current_user)
+    result = await db.execute(select(DocumentAnalysis).where(DocumentAnalysis.document_id == document_id))
+    analysis = result.scalar_one_or_none()
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Document has not been analysed")
+    return _analysis_response(analysis)
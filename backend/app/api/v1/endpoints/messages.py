@@ -33,17 +33,18 @@ async def read_messages(
         .limit(limit)
     )
     messages = result.scalars().all()
+    contents = await encryption_service.decrypt_many([m.content_enc for m in messages])
     
     return [
         {
             "id": str(m.id),
-            "content": encryption_service.decrypt(m.content_enc) if m.content_enc else "",
+            "content": content if m.content_enc else "",
             "sender_id": str(m.sender_id),
             "recipient_id": str(m.recipient_id),
             "created_at": m.created_at,
             "is_read": m.is_read
         }
-        for m in messages
+        for m, content in zip(messages, contents)
     ]
 
 @router.post("/send")
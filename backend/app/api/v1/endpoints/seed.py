@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.db.session import get_db
 from app.db.models import User, UserProfile
-from app.core.security import get_password_hash
+from app.core.security import password_hasher
 
 router = APIRouter()
 
@@ -46,7 +46,7 @@ async def seed_data(
         if existing_user:
             continue
 
-        hashed_password = get_password_hash(user_data["password"])
+        hashed_password = await password_hasher.hash(user_data["password"])
         new_user = User(
             email=user_data["email"],
             password_hash=hashed_password,
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, List, Optional
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -12,6 +12,9 @@ from app.api import deps
 from app.db.models import User, UserProfile
 from app.schemas.user import UserResponse as UserSchema, UserProfileUpdate, UserPasswordUpdate
 from app.core import security
+from app.core.encryption import encryption_service
+from app.services.audit import audit_sink
+from app.services.principal_cache import principal_cache
 
 router = APIRouter()
 
@@ -26,6 +29,43 @@ async def read_user_me(
     return current_user
 
 
+@router.get("/principal-cache/stats")
+async def read_principal_cache_stats(
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    Hit/miss/invalidation counters for this worker's principal cache.
+    """
+    return principal_cache.get_stats()
+
+
+@router.get("/lookup", response_model=List[UserSchema])
+async def lookup_users(
+    db: AsyncSession = Depends(deps.get_db),
+    pesel: Optional[str] = Query(default=None),
+    phone: Optional[str] = Query(default=None),
+    current_user: User = Depends(deps.get_current_admin),
+) -> Any:
+    """
+    Find users by exact PESEL or phone number. Resolved through the blind
+    index in one indexed query; no profile is decrypted to search.
+    """
+    if (pesel is None) == (phone is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of pesel or phone")
+    field, value = ("pesel", pesel) if pesel is not None else ("phone", phone)
+    index = encryption_service.blind_index(field, value)
+    if index is None:
+        return []
+
+    result = await db.execute(
+        select(User)
+        .join(UserProfile, UserProfile.user_id == User.id)
+        .where(getattr(UserProfile, f"{field}_bidx") == index)
+    )
+    await audit_sink.log(action=f"user_lookup_{field}", actor_id=current_user.id)
+    return result.scalars().all()
+
+
 @router.patch("/me", response_model=UserSchema)
 async def update_user_me(
     *,
@@ -43,16 +83,22 @@ async def update_user_me(
         profile = UserProfile(user_id=current_user.id)
         db.add(profile)
     
-    if profile_in.first_name is not None:
-        profile.first_name_enc = profile_in.first_name # In real app, encrypt this
-    if profile_in.last_name is not None:
-        profile.last_name_enc = profile_in.last_name
-    if profile_in.pesel is not None:
-        profile.pesel_enc = profile_in.pesel
-    if profile_in.address is not None:
-        profile.address_enc = profile_in.address
+    updates = profile_in.model_dump(exclude_none=True)
+    for field in ("first_name", "last_name", "pesel", "address", "phone"):
+        column = f"{field}_enc"
+        if field in updates:
+            profile.set_field(field, updates[field])
+        elif encryption_service.needs_reencrypt(getattr(profile, column)):
+            # Lazy rotation: legacy/old-key values move to the active key on
+            # write; plaintext left by the original endpoint is also indexed
+            plaintext = encryption_service.legacy_plaintext(getattr(profile, column))
+            if plaintext is not None:
+                profile.set_field(field, plaintext)
+            else:
+                setattr(profile, column, encryption_service.reencrypt(getattr(profile, column)))
         
     await db.commit()
+    await principal_cache.invalidate(current_user.id)
     
     # Re-fetch with profile eagerly loaded
     result = await db.execute(
@@ -73,14 +119,18 @@ async def change_password(
     """
     Change user password.
     """
-    if not security.verify_password(password_in.current_password, current_user.password_hash):
+    # The cached principal never carries the hash, so load it explicitly
+    result = await db.execute(select(User.password_hash).where(User.id == current_user.id))
+    password_hash = result.scalar_one()
+    if not await security.password_hasher.verify(password_in.current_password, password_hash):
         raise HTTPException(
             status_code=400,
             detail="Incorrect current password",
         )
     
-    current_user.password_hash = security.get_password_hash(password_in.new_password)
+    current_user.password_hash = await security.password_hasher.hash(password_in.new_password)
     db.add(current_user)
     await db.commit()
+    await principal_cache.invalidate(current_user.id)
     
     return {"message": "Password updated successfully"}
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -26,10 +26,61 @@ class Settings(BaseSettings):
     # Security
     encryption_key: str = ""
     secret_key: str = "supersecretkey" # Used for encryption key derivation if encryption_key is empty
+    # Extra AES-GCM key generations for field encryption, "2:<urlsafe-b64 32-byte key>,3:..."
+    # Key id 1 is always derived from secret_key; new values use the active id
+    encryption_keyring: str = ""
+    encryption_active_key_id: int = 1
+    # HMAC key for blind indexes (urlsafe-b64, 32 bytes); derived from the key id 1 material if empty.
+    # Changing it requires `python -m app.jobs.blind_index --all`
+    blind_index_key: str = ""
+    # Bulk re-encryption job (python -m app.jobs.reencrypt / POST /admin/key-rotation)
+    key_rotation_batch_size: int = 500
+    key_rotation_workers: int = 2
+    key_rotation_max_rows_per_second: int = 2000  # 0 = unthrottled
     jwt_secret: str = "secret"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 480
 
+    # Password hashing pool (Argon2 runs off the event loop)
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 32  # in-flight + queued; beyond this -> 503
+    password_hash_retry_after: int = 1  # seconds
+
+    # Authenticated-principal cache (deps.get_current_user)
+    principal_cache_enabled: bool = True
+    principal_cache_local_ttl: int = 30  # seconds, per-process LRU
+    principal_cache_redis_ttl: int = 300  # seconds, shared tier
+    principal_cache_max_entries: int = 10000
+    principal_cache_redis_backoff: int = 30  # seconds without Redis after a connection error
+
+    # Buffered audit-log writer
+    audit_batch_size: int = 100
+    audit_flush_interval_ms: int = 200
+    audit_buffer_size: int = 10000
+    audit_overflow_policy: str = "block"  # block | drop_newest | drop_oldest
+
+    # Document uploads
+    upload_dir: str = "uploads"
+    upload_max_bytes: int = 500 * 1024 * 1024  # 500 MB
+    upload_chunk_size: int = 1024 * 1024  # 1 MB
+
+    # Document analysis (map-reduce over chunks, background jobs)
+    document_analysis_chunk_tokens: int = 2000
+    document_analysis_concurrency: int = 4  # model calls in flight per worker, across all jobs
+    document_analysis_max_bytes: int = 50 * 1024 * 1024  # stored file, and unpacked text of a .docx
+    document_analysis_max_chars: int = 2_000_000
+    document_analysis_stale_seconds: int = 900  # restart jobs whose progress stopped this long ago
+
+    # Retrieval over case documents (vector index per case, memory-mapped)
+    embedding_backend: str = "hashing"  # hashing (local, deterministic) | gemini
+    embedding_model: str = "text-embedding-004"  # gemini backend
+    embedding_dim: int = 256  # hashing backend
+    vector_index_dir: str = "vector_index"
+    rag_chunk_tokens: int = 250
+    rag_top_k: int = 4
+    rag_min_score: float = 0.2
+    rag_index_concurrency: int = 2  # documents extracted and embedded at once per worker
+
     trusted_ips: List[str] = ["127.0.0.1", "::1"]
     
     # DDoS Protection
@@ -38,6 +89,56 @@ class Settings(BaseSettings):
     ddos_window_seconds: int = 300  # 5 minutes
     
     gemini_api_key: str = ""
+    gemini_model: str = "gemini-1.5-flash"
+    gemini_base_url: str = "https://generativelanguage.googleapis.com/v1beta"
+    gemini_connect_timeout: float = 5.0  # seconds
+    gemini_read_timeout: float = 60.0  # seconds, per read (not the whole completion)
+    gemini_stream_timeout: Optional[float] = 120.0  # seconds, whole streamed completion
+    gemini_max_concurrency: int = 16  # in-flight requests per worker
+    gemini_max_connections: int = 32
+    gemini_max_retries: int = 3  # on 429 / 5xx / transport errors
+    gemini_backoff_base: float = 0.5  # seconds; full jitter, doubled per attempt
+    gemini_backoff_max: float = 8.0
+    gemini_http2: bool = True  # used when the optional `h2` package is installed
+    # Circuit breaker: opens on failure or slow-call rate over the last
+    # `window` attempts, fails fast for `open_seconds`, then probes
+    gemini_breaker_window: int = 50
+    gemini_breaker_min_calls: int = 20
+    gemini_breaker_failure_rate: float = 0.5
+    gemini_breaker_slow_call_seconds: float = 20.0  # time to response / first streamed chunk
+    gemini_breaker_slow_call_rate: float = 0.5
+    gemini_breaker_open_seconds: float = 30.0
+    gemini_breaker_half_open_calls: int = 3
+    # Hedged requests (non-streaming only): send a second copy once an attempt
+    # has taken longer than this latency percentile; unset disables hedging
+    gemini_hedge_percentile: Optional[float] = None
+    gemini_hedge_min_delay: float = 1.0  # seconds
+
+    # AI conversation context: budget of what is sent upstream per request
+    # (running summary + newest raw turns); older turns are folded into the
+    # summary by a background task
+    ai_context_budget_tokens: int = 3000
+    ai_context_summary_tokens: int = 400
+    ai_context_max_turns: int = 50  # hard cap on stored raw turns per session
+
+    # Exact-match AI response cache (Redis), with in-process single-flight
+    ai_cache_enabled: bool = True
+    ai_cache_ttl: int = 86400  # seconds
+
+    # Per-caller AI token quotas (Redis token buckets, refilled continuously).
+    # Role (lower case) -> [burst tokens, tokens refilled per minute]; unknown roles use
+    # "client", anonymous callers are bucketed by IP as "anonymous". Optional
+    # shared buckets per role cap a whole role; missing roles are unlimited.
+    ai_quota_enabled: bool = True
+    ai_quota_user_limits: Dict[str, List[float]] = {
+        "anonymous": [6000, 300],
+        "client": [30000, 1500],
+        "lawyer": [120000, 6000],
+        "admin": [120000, 6000],
+    }
+    ai_quota_role_limits: Dict[str, List[float]] = {"anonymous": [200000, 10000]}
+    ai_quota_response_reserve: int = 1000  # tokens held for the answer until its size is known
+    ai_usage_retention_days: int = 35
 
 
 settings = Settings()
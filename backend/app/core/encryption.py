@@ -1,15 +1,87 @@
+"""
+Field encryption for PII columns.
+
+New values are written as a compact binary envelope:
+
+    version (1 byte, 0x01) | key id (1 byte) | nonce (12 bytes) | AES-256-GCM ciphertext + tag
+
+stored raw in LargeBinary columns. The header is authenticated as AAD.
+Legacy Fernet tokens (base64 text, from before the envelope existed) are
+still readable, whether they come back as str or as bytes, and are
+replaced by envelopes the next time the row is written.
+
+The original profile endpoint wrote plaintext into the *_enc columns.
+`legacy_plaintext` recognizes such values, and `reencrypt` (lazy rotation
+and the bulk job) encrypts them.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+from typing import Dict, List, Optional, Sequence, Union
+
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from starlette.concurrency import run_in_threadpool
+
 from app.core.config import settings
 
+ENVELOPE_VERSION = 0x01
+_ENVELOPE_HEADER = 2
+_NONCE_SIZE = 12
+_FERNET_MIN_SIZE = 1 + 8 + 16 + 16 + 32  # version, timestamp, IV, one block, HMAC
+
+Ciphertext = Union[bytes, str]
+
+
+def _derive_gcm_key(fernet_key: bytes) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"lexportal/field-encryption/aes-gcm/1",
+    ).derive(base64.urlsafe_b64decode(fernet_key))
+
+
+def normalize_identifier(value: str) -> str:
+    """
+    Canonical form for blind-indexed identifiers: PESEL and phone numbers are
+    matched regardless of spaces, dashes or brackets.
+    """
+    return "".join(ch for ch in value if ch.isalnum() or ch == "+")
+
+
+def parse_keyring(spec: str) -> Dict[int, bytes]:
+    """
+    Parse "1:<urlsafe-b64 32-byte key>,2:<...>" into {key_id: key}.
+    """
+    keyring = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        key_id, _, encoded = entry.partition(":")
+        key = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        if not 0 <= int(key_id) <= 255 or len(key) != 32:
+            raise ValueError(f"Invalid encryption keyring entry for key id {key_id}")
+        keyring[int(key_id)] = key
+    return keyring
+
+
 class EncryptionService:
-    def __init__(self, key: str = None):
+    def __init__(
+        self,
+        key: str = None,
+        offload_threshold: int = 64,
+        keyring: Optional[Dict[int, bytes]] = None,
+        active_key_id: int = 1,
+        blind_index_key: Optional[bytes] = None,
+    ):
         if not key:
             # Generate a key if not provided (in production this should be persistent!)
             # Here we derive it from SECRET_KEY or use a fallback
             if settings.secret_key and len(settings.secret_key) >= 32:
                  # Simple derivation for demo purposes - in real app use KDF
-                 import base64
-                 import hashlib
                  digest = hashlib.sha256(settings.secret_key.encode()).digest()
                  self.key = base64.urlsafe_b64encode(digest)
             else:
@@ -17,20 +89,142 @@ class EncryptionService:
         else:
             self.key = key.encode() if isinstance(key, str) else key
             
+        # Legacy Fernet, read-only: old rows are decrypted with it
         self.cipher_suite = Fernet(self.key)
 
-    def encrypt(self, data: str) -> str:
+        # Key id 1 is derived from the legacy key; extra generations come
+        # from the keyring and the active one encrypts all new values
+        keys = {1: _derive_gcm_key(self.key)}
+        keys.update(keyring or {})
+        if active_key_id not in keys:
+            raise ValueError(f"Active encryption key id {active_key_id} is not in the keyring")
+        self._keys = {key_id: AESGCM(k) for key_id, k in keys.items()}
+        self.active_key_id = active_key_id
+
+        # Blind indexes must stay stable across encryption key rotations
+        self._blind_index_key = blind_index_key or HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"lexportal/blind-index/1",
+        ).derive(base64.urlsafe_b64decode(self.key))
+
+        # Batches at least this large are processed in the threadpool
+        self.offload_threshold = offload_threshold
+
+    @property
+    def key_ids(self) -> List[int]:
+        return sorted(self._keys)
+
+    def encrypt(self, data: str) -> Optional[bytes]:
         if not data:
             return None
-        return self.cipher_suite.encrypt(data.encode()).decode()
+        header = bytes((ENVELOPE_VERSION, self.active_key_id))
+        nonce = os.urandom(_NONCE_SIZE)
+        return header + nonce + self._keys[self.active_key_id].encrypt(nonce, data.encode(), header)
 
-    def decrypt(self, token: str) -> str:
+    def _decrypt_envelope(self, token: bytes) -> Optional[str]:
+        aead = self._keys.get(token[1])
+        if aead is None or len(token) < _ENVELOPE_HEADER + _NONCE_SIZE + 16:
+            return None
+        nonce = token[_ENVELOPE_HEADER:_ENVELOPE_HEADER + _NONCE_SIZE]
+        return aead.decrypt(nonce, token[_ENVELOPE_HEADER + _NONCE_SIZE:], token[:_ENVELOPE_HEADER]).decode()
+
+    def decrypt(self, token: Optional[Ciphertext]) -> Optional[str]:
+        if not token:
+            return None
+        try:
+            if isinstance(token, (bytes, bytearray, memoryview)):
+                token = bytes(token)
+                if token[0] == ENVELOPE_VERSION:
+                    return self._decrypt_envelope(token)
+            return self.cipher_suite.decrypt(token).decode()
+        except Exception:
+            return None
+
+    def legacy_plaintext(self, token: Optional[Ciphertext]) -> Optional[str]:
+        """
+        The value of a column written unencrypted, or None when `token` is
+        ciphertext or merely shaped like it (an envelope or a Fernet token,
+        e.g. under a key that has left the keyring), which is left alone.
+        """
         if not token:
             return None
+        raw = token.encode() if isinstance(token, str) else bytes(token)
+        if raw[0] == ENVELOPE_VERSION and len(raw) >= _ENVELOPE_HEADER + _NONCE_SIZE + 16:
+            return None
         try:
-            return self.cipher_suite.decrypt(token.encode()).decode()
+            data = base64.urlsafe_b64decode(raw)
+            if data[0] == 0x80 and len(data) >= _FERNET_MIN_SIZE:
+                return None
         except Exception:
+            pass
+        try:
+            return raw.decode()
+        except UnicodeDecodeError:
             return None
 
+    def needs_reencrypt(self, token: Optional[Ciphertext]) -> bool:
+        """
+        True for legacy Fernet tokens, legacy plaintext and envelopes under
+        a non-active key.
+        """
+        if not token:
+            return False
+        if isinstance(token, str) or token[0] != ENVELOPE_VERSION:
+            return True
+        return token[1] != self.active_key_id
+
+    def reencrypt(self, token: Optional[Ciphertext]) -> Optional[bytes]:
+        """
+        Re-encrypt under the active key; legacy plaintext is encrypted.
+        Returns the input unchanged when it is already current or is
+        ciphertext that cannot be decrypted (never destroys data).
+        """
+        if not self.needs_reencrypt(token):
+            return token
+        plaintext = self.decrypt(token) or self.legacy_plaintext(token)
+        if plaintext is None:
+            return token
+        return self.encrypt(plaintext)
+
+    def blind_index(self, field: str, value: Optional[str]) -> Optional[bytes]:
+        """
+        Keyed HMAC of a normalized value, for exact-match lookups on an
+        encrypted column without decrypting it. The field name is mixed in so
+        equal values in different columns do not share an index entry.
+        """
+        if not value:
+            return None
+        message = f"{field}:{normalize_identifier(value)}".encode()
+        return hmac.new(self._blind_index_key, message, hashlib.sha256).digest()
+
+    def _encrypt_batch(self, items: Sequence[Optional[str]]) -> List[Optional[bytes]]:
+        return [self.encrypt(data) for data in items]
+
+    def _decrypt_batch(self, tokens: Sequence[Optional[Ciphertext]]) -> List[Optional[str]]:
+        return [self.decrypt(token) for token in tokens]
+
+    async def encrypt_many(self, items: Sequence[Optional[str]]) -> List[Optional[bytes]]:
+        """
+        Encrypt a batch, preserving order. Empty items map to None, as in encrypt().
+        """
+        if len(items) >= self.offload_threshold:
+            return await run_in_threadpool(self._encrypt_batch, items)
+        return self._encrypt_batch(items)
+
+    async def decrypt_many(self, tokens: Sequence[Optional[Ciphertext]]) -> List[Optional[str]]:
+        """
+        Decrypt a batch, preserving order. Empty or invalid tokens map to None,
+        as in decrypt().
+        """
+        if len(tokens) >= self.offload_threshold:
+            return await run_in_threadpool(self._decrypt_batch, tokens)
+        return self._decrypt_batch(tokens)
+
 # Singleton instance
-encryption_service = EncryptionService()
+encryption_service = EncryptionService(
+    keyring=parse_keyring(settings.encryption_keyring),
+    active_key_id=settings.encryption_active_key_id,
+    blind_index_key=base64.urlsafe_b64decode(settings.blind_index_key) if settings.blind_index_key else None,
+)
@@ -1,19 +1,178 @@
+"""
+PII masking for text sent to (and received from) the AI provider.
+
+One precompiled trigger pattern finds every "@" and 9-15 digit run in a
+single pass; an email is resolved around its "@", and digit runs are
+classified afterwards: a standalone 11-digit number with
+a valid PESEL checksum and month is masked as a PESEL, anything else of
+9-15 digits as a phone number.
+
+For input that should not be materialized whole (uploaded documents,
+streamed model output) use PIIStreamSanitizer or sanitize_pii_stream.
+None of the patterns can match across whitespace, so text is cut at the
+last whitespace of each chunk and the output is identical to
+sanitize_pii on the concatenated input.
+"""
+
+import codecs
 import re
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Tuple, Union
+
+EMAIL_MASK = "[EMAIL PROTECTED]"
+PHONE_MASK = "[PHONE REMOVED]"
+PESEL_MASK = "[PESEL REMOVED]"
+
+# Every match starts at "@", "+" or a digit. Leading with a character class
+# lets the regex engine skip ordinary prose without trying each position;
+# an email's extent is then resolved around its "@"
+_TRIGGER = re.compile(r"[@+\d](?:(?<=@)|(?<=\+)\d{9,15}|(?<=\d)\d{8,14})")
+_RUN = re.compile(r"[\w.-]*")
+_CUT_CHARS = (" ", "\n", "\t", "\r")
+_PESEL_WEIGHTS = (1, 3, 7, 9, 1, 3, 7, 9, 1, 3)
+
+Chunk = Union[str, bytes]
+
+
+def is_valid_pesel(value: str) -> bool:
+    """
+    Checksum and date sanity check for an 11-digit PESEL.
+    """
+    if len(value) != 11 or not value.isdigit():
+        return False
+    digits = [int(ch) for ch in value]
+    if (10 - sum(w * d for w, d in zip(_PESEL_WEIGHTS, digits)) % 10) % 10 != digits[10]:
+        return False
+    # Month carries the century offset (+20, +40, +60, +80)
+    month = (digits[2] * 10 + digits[3]) % 20
+    day = digits[4] * 10 + digits[5]
+    return 1 <= month <= 12 and 1 <= day <= 31
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _is_email_char(ch: str) -> bool:
+    return ch.isalnum() or ch in "_.-"
+
+
+def _email_span(text: str, at: int, floor: int) -> Optional[Tuple[int, int]]:
+    """
+    Extent of `[\\w.-]+@[\\w.-]+` around the "@" at `at`, not reaching back
+    past `floor` (the end of the previous mask).
+    """
+    start = at
+    while start > floor and _is_email_char(text[start - 1]):
+        start -= 1
+    end = _RUN.match(text, at + 1).end()
+    if start == at or end == at + 1:
+        return None
+    return start, end
+
 
 def sanitize_pii(text: str) -> str:
     """
-    Simple PII sanitizer that masks emails and phone numbers.
+    Mask emails, PESEL numbers and phone numbers in one pass.
     """
     if not text:
         return text
-        
-    # Mask emails
-    text = re.sub(r'[\w\.-]+@[\w\.-]+', '[EMAIL PROTECTED]', text)
-    
-    # Mask phone numbers (simple pattern)
-    text = re.sub(r'\+?\d{9,15}', '[PHONE REMOVED]', text)
-    
-    # Mask PESEL (11 digits)
-    text = re.sub(r'\b\d{11}\b', '[PESEL REMOVED]', text)
-    
-    return text
+    parts = []
+    pos = 0
+    run_end = -1  # end of the [\w.-] run last checked for a trailing "@"
+    match = _TRIGGER.search(text)
+    while match is not None:
+        start, end = match.span()
+        if text[start] == "@":
+            span = _email_span(text, start, pos)
+        else:
+            # Digits in an email's local part belong to the email
+            if run_end < end:
+                run_end = _RUN.match(text, end).end()
+            at_email = run_end + 1 < len(text) and text[run_end] == "@" and _is_email_char(text[run_end + 1])
+            span = _email_span(text, run_end, pos) if at_email else None
+        if span is not None:
+            parts.append(text[pos:span[0]])
+            parts.append(EMAIL_MASK)
+            pos = resume = span[1]
+        elif text[start] != "@":
+            parts.append(text[pos:start])
+            parts.append(_digits_mask(text, start, end))
+            pos = resume = end
+        else:
+            resume = start + 1  # a lone "@"
+        match = _TRIGGER.search(text, resume)
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def _digits_mask(text: str, start: int, end: int) -> str:
+    if (
+        end - start == 11
+        and (start == 0 or not _is_word_char(text[start - 1]))
+        and (end == len(text) or not _is_word_char(text[end]))
+        and is_valid_pesel(text[start:end])
+    ):
+        return PESEL_MASK
+    return PHONE_MASK
+
+
+class PIIStreamSanitizer:
+    """
+    Incremental sanitizer: feed() text or UTF-8 bytes as it arrives and get
+    back the sanitized prefix that is safe to emit; flush() returns the rest.
+
+    The held-back tail is the last whitespace-free token. A token longer
+    than max_pending characters is processed anyway, so memory stays bounded
+    (such a token could then be split across two scans).
+    """
+
+    def __init__(self, max_pending: int = 64 * 1024):
+        self.max_pending = max_pending
+        self._pending = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, chunk: Chunk) -> str:
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        if not chunk:
+            return ""
+        text = self._pending + chunk
+        cut = max(text.rfind(ch) for ch in _CUT_CHARS)
+        if cut >= 0:
+            split = cut + 1
+        elif len(text) > self.max_pending:
+            split = len(text)
+        else:
+            self._pending = text
+            return ""
+        self._pending = text[split:]
+        return sanitize_pii(text[:split])
+
+    def flush(self) -> str:
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        return sanitize_pii(text)
+
+
+def sanitize_pii_stream(chunks: Iterable[Chunk], max_pending: Optional[int] = None) -> Iterator[str]:
+    sanitizer = PIIStreamSanitizer(max_pending) if max_pending else PIIStreamSanitizer()
+    for chunk in chunks:
+        out = sanitizer.feed(chunk)
+        if out:
+            yield out
+    tail = sanitizer.flush()
+    if tail:
+        yield tail
+
+
+async def asanitize_pii_stream(chunks: AsyncIterable[Chunk], max_pending: Optional[int] = None) -> AsyncIterator[str]:
+    sanitizer = PIIStreamSanitizer(max_pending) if max_pending else PIIStreamSanitizer()
+    async for chunk in chunks:
+        out = sanitizer.feed(chunk)
+        if out:
+            yield out
+    tail = sanitizer.flush()
+    if tail:
+        yield tail
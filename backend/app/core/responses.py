@@ -0,0 +1,52 @@
+"""
+Response classes.
+"""
+
+from __future__ import annotations
+
+from starlette.responses import FileResponse
+from starlette.types import Send
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class SendfileResponse(FileResponse):
+    """
+    FileResponse (Range, If-Range, HEAD) that hands the file descriptor to the
+    server via the ASGI zero-copy send extension when the server offers it,
+    so the kernel copies file -> socket with sendfile(2) and the bytes never
+    pass through Python. Servers without the extension get the regular
+    chunked path, which reads off the event loop in 1 MB chunks.
+    """
+
+    chunk_size = 1024 * 1024
+
+    async def __call__(self, scope, receive, send) -> None:
+        self._zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        await super().__call__(scope, receive, send)
+
+    async def _sendfile(self, send: Send, offset: int, count: int) -> None:
+        with open(self.path, "rb") as file:
+            await send({
+                "type": ZEROCOPY_EXTENSION,
+                "file": file,
+                "offset": offset,
+                "count": count,
+                "more_body": False,
+            })
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if send_header_only or not self._zerocopy:
+            return await super()._handle_simple(send, send_header_only)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await self._sendfile(send, 0, int(self.headers["content-length"]))
+
+    async def _handle_single_range(
+        self, send: Send, start: int, end: int, file_size: int, send_header_only: bool
+    ) -> None:
+        if send_header_only or not self._zerocopy:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        await self._sendfile(send, start, end - start)
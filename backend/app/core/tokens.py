@@ -0,0 +1,25 @@
+"""
+Approximate token counting for prompt budgeting.
+
+Gemini bills SentencePiece tokens; no tokenizer ships with the backend, so
+we use the usual ~4 characters per token estimate. It tends to overcount
+English slightly and undercount Polish slightly, which is fine for
+budgets that only need to bound prompt size, not match invoices.
+"""
+
+from typing import Any, Dict, Iterable
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4  # role and framing per contents[] entry
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    parts: Iterable[Any] = message.get("parts", [])
+    text_tokens = sum(estimate_tokens(p if isinstance(p, str) else p.get("text", "")) for p in parts)
+    return MESSAGE_OVERHEAD_TOKENS + text_tokens
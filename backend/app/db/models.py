@@ -3,11 +3,13 @@ import uuid
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, Text, LargeBinary
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, LargeBinary, event, update
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
+from app.core.encryption import encryption_service
+
 class Base(DeclarativeBase):
     pass
 
@@ -39,14 +41,47 @@ class UserProfile(Base):
     user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("user.id"), unique=True, nullable=False)
     
     # Encrypted fields
-    first_name_enc: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    last_name_enc: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    pesel_enc: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    address_enc: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    phone_enc: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    first_name_enc: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    last_name_enc: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    pesel_enc: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    address_enc: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    phone_enc: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+
+    # Blind indexes (keyed HMAC of the normalized value) for exact-match lookups
+    pesel_bidx: Mapped[Optional[bytes]] = mapped_column(LargeBinary(32), nullable=True, index=True)
+    phone_bidx: Mapped[Optional[bytes]] = mapped_column(LargeBinary(32), nullable=True, index=True)
 
     user: Mapped["User"] = relationship("User", back_populates="profile")
 
+    BLIND_INDEXED_FIELDS = ("pesel", "phone")
+
+    def set_field(self, field: str, value: Optional[str]) -> None:
+        """Encrypt `value` into `<field>_enc`, keeping its blind index in step."""
+        setattr(self, f"{field}_enc", encryption_service.encrypt(value))
+        if field in self.BLIND_INDEXED_FIELDS:
+            setattr(self, f"{field}_bidx", encryption_service.blind_index(field, value))
+
+    # Decrypted views used by the API schemas
+    @property
+    def first_name(self) -> Optional[str]:
+        return encryption_service.decrypt(self.first_name_enc)
+
+    @property
+    def last_name(self) -> Optional[str]:
+        return encryption_service.decrypt(self.last_name_enc)
+
+    @property
+    def pesel(self) -> Optional[str]:
+        return encryption_service.decrypt(self.pesel_enc)
+
+    @property
+    def address(self) -> Optional[str]:
+        return encryption_service.decrypt(self.address_enc)
+
+    @property
+    def phone(self) -> Optional[str]:
+        return encryption_service.decrypt(self.phone_enc)
+
 class Case(Base):
     __tablename__ = "case"
 
@@ -54,12 +89,19 @@ class Case(Base):
     user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
     title: Mapped[str] = mapped_column(String, nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    description_enc: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
     status: Mapped[str] = mapped_column(String, default="open")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     user: Mapped["User"] = relationship("User", back_populates="cases")
     documents: Mapped[List["Document"]] = relationship("Document", back_populates="case", cascade="all, delete-orphan")
 
+    # Keyset pagination on (created_at, id): all cases (admins) or one user's
+    __table_args__ = (
+        Index("ix_case_created_id", "created_at", "id"),
+        Index("ix_case_user_created_id", "user_id", "created_at", "id"),
+    )
+
 class Document(Base):
     __tablename__ = "document"
 
@@ -67,10 +109,68 @@ class Document(Base):
     case_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("case.id"), nullable=False)
     filename: Mapped[str] = mapped_column(String, nullable=False)
     file_url: Mapped[str] = mapped_column(String, nullable=False)
+    content_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), ForeignKey("blob.sha256"), nullable=True, index=True)  # SHA-256 hex
+    size_bytes: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     case: Mapped["Case"] = relationship("Case", back_populates="documents")
 
+
+class DocumentAnalysis(Base):
+    """AI analysis of a Document (app.services.document_analysis), one row per document."""
+    __tablename__ = "document_analysis"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("document.id", ondelete="CASCADE"), unique=True, nullable=False)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)  # lets identical uploads reuse the result
+    model: Mapped[str] = mapped_column(String, nullable=False)
+    status: Mapped[str] = mapped_column(String, default="PENDING", nullable=False)  # PENDING | RUNNING | COMPLETED | FAILED
+    chunks_total: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    chunks_done: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    summary_enc: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class DocumentChunk(Base):
+    """Retrieval passage of a Document; `vector_row` is its row in the case's vector index (app.services.vector_index)."""
+    __tablename__ = "document_chunk"
+    __table_args__ = (
+        Index("ix_document_chunk_case_row", "case_id", "vector_row", unique=True),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("document.id", ondelete="CASCADE"), nullable=False, index=True)
+    case_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("case.id", ondelete="CASCADE"), nullable=False)
+    ordinal: Mapped[int] = mapped_column(Integer, nullable=False)
+    vector_row: Mapped[int] = mapped_column(Integer, nullable=False)
+    text_enc: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)  # PII-sanitized, then encrypted
+
+
+class Blob(Base):
+    """Content-addressed file on disk, shared by every Document with the same SHA-256."""
+    __tablename__ = "blob"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+@event.listens_for(Document, "after_delete")
+def _release_blob(mapper, connection, target):
+    # Runs in the deleting transaction, so the count can never drift from the rows
+    if target.content_hash:
+        connection.execute(
+            update(Blob)
+            .where(Blob.sha256 == target.content_hash)
+            .values(ref_count=Blob.ref_count - 1, updated_at=func.now())
+        )
+
 class Notification(Base):
     __tablename__ = "notification"
 
@@ -94,15 +194,35 @@ class AuditLog(Base):
 
     actor: Mapped[Optional["User"]] = relationship("User", back_populates="audit_logs")
 
+    # Keyset pagination on (timestamp, id), optionally narrowed by action/actor
+    __table_args__ = (
+        Index("ix_audit_log_timestamp_id", "timestamp", "id"),
+        Index("ix_audit_log_action_timestamp_id", "action", "timestamp", "id"),
+        Index("ix_audit_log_actor_timestamp_id", "actor_id", "timestamp", "id"),
+    )
+
 class Message(Base):
     __tablename__ = "message"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     sender_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
     recipient_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
-    content_enc: Mapped[str] = mapped_column(Text, nullable=False)
+    content_enc: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
     is_read: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     sender: Mapped["User"] = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     recipient: Mapped["User"] = relationship("User", foreign_keys=[recipient_id], back_populates="received_messages")
+
+
+class KeyRotationCheckpoint(Base):
+    """Progress of the bulk re-encryption job (app.jobs.reencrypt), one row per table."""
+    __tablename__ = "key_rotation_checkpoint"
+
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    key_id: Mapped[int] = mapped_column(Integer, nullable=False)  # target (active) key id
+    last_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+    rows_scanned: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    rows_updated: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,5 +1,5 @@
 import ssl
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
@@ -34,3 +34,9 @@ AsyncSessionLocal = async_sessionmaker(
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def get_session_factory() -> Callable[[], AsyncSession]:
+    # For work that outlives the request-scoped session, e.g. streaming
+    # responses (get_db's session is closed before the body is sent)
+    return AsyncSessionLocal
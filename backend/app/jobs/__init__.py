@@ -0,0 +1,3 @@
+"""
+Batch jobs, runnable as `python -m app.jobs.<name>`.
+"""
@@ -0,0 +1,112 @@
+"""
+Backfill the PESEL / phone blind indexes on user_profile.
+
+    python -m app.jobs.blind_index [--all] [--batch-size 1000]
+
+By default only rows that have an encrypted value but no index are
+touched, so the job is naturally resumable. --all recomputes every row
+(needed after changing BLIND_INDEX_KEY).
+
+Like the re-encryption job, each UPDATE only applies if the encrypted
+columns still hold what was read. A profile edited meanwhile keeps the
+index update_user_me wrote for it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.encryption import EncryptionService, encryption_service
+from app.db.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+FIELDS = UserProfile.BLIND_INDEXED_FIELDS
+
+
+def _compute(service: EncryptionService, rows: Sequence[Tuple]) -> List[Dict]:
+    params = []
+    for row in rows:
+        item = {"b_id": row[0]}
+        for field, token in zip(FIELDS, row[1:]):
+            item[f"old_{field}"] = token
+            plaintext = service.decrypt(token) or service.legacy_plaintext(token)
+            item[f"bidx_{field}"] = service.blind_index(field, plaintext)
+        params.append(item)
+    return params
+
+
+def _backfill_statement():
+    table = UserProfile.__table__
+    return (
+        update(table)
+        .where(
+            and_(
+                table.c.id == bindparam("b_id"),
+                *(table.c[f"{field}_enc"].is_not_distinct_from(bindparam(f"old_{field}")) for field in FIELDS),
+            )
+        )
+        .values({f"{field}_bidx": bindparam(f"bidx_{field}") for field in FIELDS})
+    )
+
+
+async def backfill_blind_indexes(
+    session_factory: Callable[[], AsyncSession],
+    service: EncryptionService = encryption_service,
+    batch_size: int = 1000,
+    recompute_all: bool = False,
+) -> Dict[str, int]:
+    stats = {"rows_indexed": 0}
+    stmt = _backfill_statement()
+    columns = [getattr(UserProfile, f"{field}_enc") for field in FIELDS]
+    missing = or_(*(
+        and_(getattr(UserProfile, f"{field}_enc").is_not(None), getattr(UserProfile, f"{field}_bidx").is_(None))
+        for field in FIELDS
+    ))
+
+    last_id = None
+    async with session_factory() as session:
+        while True:
+            query = select(UserProfile.id, *columns).order_by(UserProfile.id).limit(batch_size)
+            if not recompute_all:
+                query = query.where(missing)
+            if last_id is not None:
+                query = query.where(UserProfile.id > last_id)
+            rows = (await session.execute(query)).all()
+            if not rows:
+                break
+
+            params = await asyncio.to_thread(_compute, service, rows)
+            await session.execute(stmt, params)
+            await session.commit()
+            last_id = rows[-1][0]
+            stats["rows_indexed"] += len(rows)
+
+    return stats
+
+
+def main() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Backfill PESEL / phone blind indexes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--all", action="store_true", help="recompute every row, not only missing indexes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    stats = asyncio.run(
+        backfill_blind_indexes(AsyncSessionLocal, batch_size=args.batch_size, recompute_all=args.all)
+    )
+    logger.info(f"Blind-index backfill finished in {time.perf_counter() - started:.1f}s: {stats}")
+
+
+if __name__ == "__main__":
+    main()
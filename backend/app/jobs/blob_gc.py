@@ -0,0 +1,190 @@
+"""
+Garbage-collect orphaned document blobs.
+
+    python -m app.jobs.blob_gc [--grace-seconds 3600] [--dry-run]
+
+Removes:
+- Blob rows whose ref_count dropped to zero (and that no Document still
+  references), together with their files
+- files in the blob store that have no Blob row (e.g. the DB commit
+  failed after the file was written), including stale .part temp files
+
+Only things untouched for `grace_seconds` are collected. Uploads are
+serialized against the collector through the Blob row: an upload takes
+its reference (acquire_blob_ref) before it looks for an existing file, and
+the collector only unlinks a file while it holds that row's lock, i.e.
+inside the transaction that deletes the row (or, for a file without a
+row, that inserts a placeholder row to claim it). An upload racing the
+collector waits for that transaction and then finds the file gone and
+writes it again.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Blob, Document
+from app.services.storage import BlobStore, blob_store
+
+logger = logging.getLogger(__name__)
+
+_SHA256_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _scan_files(root: str, cutoff: float) -> List[str]:
+    paths = []
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    paths.append(path)
+            except FileNotFoundError:
+                continue
+    return paths
+
+
+async def _remove_orphans(session: AsyncSession, paths: List[str]) -> int:
+    """
+    Unlink blob files that have no Blob row. Each one is claimed first by
+    inserting a placeholder row: if an upload referenced it meanwhile the
+    insert conflicts (or waits for that upload to commit) and the file is
+    kept. Non-blob files (stale .part temp files) are just removed.
+    """
+    blobs = {os.path.basename(p): p for p in paths if _SHA256_NAME.match(os.path.basename(p))}
+    removed = 0
+    for path in paths:
+        if os.path.basename(path) not in blobs and await asyncio.to_thread(_remove, path):
+            removed += 1
+    if not blobs:
+        return removed
+
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    result = await session.execute(
+        insert(Blob)
+        .values([{"sha256": sha256, "size_bytes": 0, "ref_count": 0} for sha256 in blobs])
+        .on_conflict_do_nothing(index_elements=[Blob.sha256])
+        .returning(Blob.sha256)
+    )
+    claimed = result.scalars().all()
+    for sha256 in claimed:
+        if await asyncio.to_thread(_remove, blobs[sha256]):
+            removed += 1
+    await session.execute(delete(Blob).where(Blob.sha256.in_(claimed)))
+    await session.commit()
+    return removed
+
+
+async def collect_garbage(
+    session_factory: Callable[[], AsyncSession],
+    store: BlobStore = blob_store,
+    grace_seconds: int = 3600,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    stats = {"rows_deleted": 0, "files_deleted": 0, "orphan_files_deleted": 0}
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+
+    # 1. Unreferenced Blob rows
+    async with session_factory() as session:
+        while True:
+            result = await session.execute(
+                select(Blob.sha256)
+                .where(
+                    Blob.ref_count <= 0,
+                    Blob.updated_at < cutoff,
+                    ~exists().where(Document.content_hash == Blob.sha256),
+                )
+                .limit(batch_size)
+            )
+            hashes = result.scalars().all()
+            if not hashes:
+                break
+            if dry_run:
+                stats["rows_deleted"] += len(hashes)
+                break
+            # Re-checked under the row locks; only rows actually deleted
+            # come back, and their files go before the locks are released
+            result = await session.execute(
+                delete(Blob)
+                .where(
+                    Blob.sha256.in_(hashes),
+                    Blob.ref_count <= 0,
+                    Blob.updated_at < cutoff,
+                    ~exists().where(Document.content_hash == Blob.sha256),
+                )
+                .returning(Blob.sha256)
+            )
+            deleted = result.scalars().all()
+            for sha256 in deleted:
+                if await asyncio.to_thread(_remove, store.path_for(sha256)):
+                    stats["files_deleted"] += 1
+            await session.commit()
+            stats["rows_deleted"] += len(deleted)
+            if len(hashes) < batch_size:
+                break
+
+    # 2. Files on disk without a row
+    if os.path.isdir(store.root):
+        candidates = await asyncio.to_thread(_scan_files, store.root, cutoff.timestamp())
+        async with session_factory() as session:
+            for start in range(0, len(candidates), batch_size):
+                batch = candidates[start:start + batch_size]
+                names = {os.path.basename(p) for p in batch}
+                result = await session.execute(select(Blob.sha256).where(Blob.sha256.in_(names)))
+                known = set(result.scalars().all())
+                orphans = [p for p in batch if os.path.basename(p) not in known]
+                if dry_run:
+                    stats["orphan_files_deleted"] += len(orphans)
+                    continue
+                stats["orphan_files_deleted"] += await _remove_orphans(session, orphans)
+
+    return stats
+
+
+def main() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Garbage-collect orphaned document blobs")
+    parser.add_argument("--grace-seconds", type=int, default=3600)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    stats = asyncio.run(
+        collect_garbage(
+            AsyncSessionLocal,
+            grace_seconds=args.grace_seconds,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    )
+    logger.info(f"Blob GC finished in {time.perf_counter() - started:.1f}s: {stats}")
+
+
+if __name__ == "__main__":
+    main()
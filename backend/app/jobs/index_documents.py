@@ -0,0 +1,81 @@
+"""
+Build the per-case vector indexes used for AI retrieval.
+
+    python -m app.jobs.index_documents [--rebuild] [--case <uuid>]
+
+By default only documents with no stored passages are indexed, so the job
+is resumable and safe to run after deploying retrieval. --rebuild drops
+the selected cases' indexes and re-embeds everything (needed after
+changing EMBEDDING_BACKEND / EMBEDDING_DIM).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Document, DocumentChunk
+from app.services.document_analysis import DocumentAnalysisError
+from app.services.document_index import DocumentIndexer, document_indexer
+
+logger = logging.getLogger(__name__)
+
+
+async def index_documents(
+    session_factory: Callable[[], AsyncSession],
+    indexer: DocumentIndexer = document_indexer,
+    case_id: Optional[uuid.UUID] = None,
+    rebuild: bool = False,
+) -> Dict[str, int]:
+    stats = {"documents_indexed": 0, "passages": 0, "skipped": 0}
+
+    async with session_factory() as session:
+        query = select(Document).order_by(Document.case_id, Document.created_at)
+        if case_id is not None:
+            query = query.where(Document.case_id == case_id)
+        if rebuild:
+            case_query = select(Document.case_id).distinct()
+            if case_id is not None:
+                case_query = case_query.where(Document.case_id == case_id)
+            case_ids = (await session.execute(case_query)).scalars().all()
+            for cid in case_ids:
+                indexer.store.drop(str(cid))
+            await session.execute(delete(DocumentChunk).where(DocumentChunk.case_id.in_(case_ids)))
+            await session.commit()
+        else:
+            query = query.where(~exists().where(DocumentChunk.document_id == Document.id))
+        documents = (await session.execute(query)).scalars().all()
+
+    for document in documents:
+        try:
+            stats["passages"] += await indexer.index_document(session_factory, document)
+            stats["documents_indexed"] += 1
+        except (DocumentAnalysisError, OSError) as e:
+            stats["skipped"] += 1
+            logger.info(f"Skipping document {document.id}: {e}")
+    return stats
+
+
+def main() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Build per-case vector indexes for AI retrieval")
+    parser.add_argument("--case", type=uuid.UUID, default=None, help="only this case")
+    parser.add_argument("--rebuild", action="store_true", help="drop and re-embed instead of filling gaps")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    stats = asyncio.run(index_documents(AsyncSessionLocal, case_id=args.case, rebuild=args.rebuild))
+    logger.info(f"Document indexing finished in {time.perf_counter() - started:.1f}s: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Re-encrypt PII columns under the active encryption key.
+
+    python -m app.jobs.reencrypt [--tables message,user_profile,case] [--reset]
+
+Walks each table in primary-key order, in batches. Each batch is
+decrypted and re-encrypted in a thread pool and written back with one
+executemany UPDATE. Progress is checkpointed in key_rotation_checkpoint,
+so an interrupted run resumes where it stopped. Plaintext left in the
+*_enc columns by the original profile endpoint is encrypted as well; a
+table whose checkpoint already completed needs --reset to pick it up.
+
+The application keeps serving while the job runs: every key in the
+keyring stays readable, and each UPDATE only applies if the row still
+holds the ciphertext that was read. A concurrent write from the app
+(which always uses the active key) is never overwritten.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.encryption import EncryptionService, encryption_service
+from app.db.models import Case, DocumentAnalysis, DocumentChunk, KeyRotationCheckpoint, Message, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# table name -> (model, encrypted columns)
+ENCRYPTED_COLUMNS: Dict[str, Tuple[Any, Tuple[str, ...]]] = {
+    "message": (Message, ("content_enc",)),
+    "user_profile": (
+        UserProfile,
+        ("first_name_enc", "last_name_enc", "pesel_enc", "address_enc", "phone_enc"),
+    ),
+    "case": (Case, ("description_enc",)),
+    "document_analysis": (DocumentAnalysis, ("summary_enc",)),
+    "document_chunk": (DocumentChunk, ("text_enc",)),
+}
+
+Row = Tuple[Any, ...]
+
+
+def _reencrypt_rows(service: EncryptionService, rows: Sequence[Row]) -> List[Tuple[Row, Row]]:
+    # (original row, re-encrypted values) for rows that actually change
+    changed = []
+    for row in rows:
+        values = tuple(service.reencrypt(value) for value in row[1:])
+        if values != tuple(row[1:]):
+            changed.append((row, values))
+    return changed
+
+
+def _compare_and_set(model: Any, columns: Sequence[str]):
+    table = model.__table__
+    return (
+        update(table)
+        .where(
+            and_(
+                table.c.id == bindparam("b_id"),
+                *(table.c[col].is_not_distinct_from(bindparam(f"old_{col}")) for col in columns),
+            )
+        )
+        .values({col: bindparam(f"new_{col}") for col in columns})
+    )
+
+
+async def _load_checkpoint(session: AsyncSession, table_name: str, key_id: int, reset: bool) -> KeyRotationCheckpoint:
+    checkpoint = await session.get(KeyRotationCheckpoint, table_name)
+    if checkpoint is None:
+        checkpoint = KeyRotationCheckpoint(table_name=table_name, key_id=key_id)
+        session.add(checkpoint)
+    if reset or checkpoint.key_id != key_id:
+        # New target key: everything has to be looked at again
+        checkpoint.key_id = key_id
+        checkpoint.last_id = None
+        checkpoint.completed_at = None
+    if checkpoint.completed_at is None and checkpoint.last_id is None:
+        checkpoint.rows_scanned = 0
+        checkpoint.rows_updated = 0
+    await session.commit()
+    return checkpoint
+
+
+async def reencrypt_table(
+    session_factory: Callable[[], AsyncSession],
+    table_name: str,
+    service: EncryptionService = encryption_service,
+    batch_size: int = 500,
+    workers: int = 2,
+    max_rows_per_second: int = 0,
+    reset: bool = False,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> Dict[str, int]:
+    model, columns = ENCRYPTED_COLUMNS[table_name]
+    stmt = _compare_and_set(model, columns)
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reencrypt")
+    stats = {"rows_scanned": 0, "rows_updated": 0}
+
+    try:
+        async with session_factory() as session:
+            checkpoint = await _load_checkpoint(session, table_name, service.active_key_id, reset)
+            if checkpoint.completed_at is not None:
+                return stats
+
+            while True:
+                started = time.monotonic()
+                query = select(model.id, *(getattr(model, col) for col in columns)).order_by(model.id).limit(batch_size)
+                if checkpoint.last_id is not None:
+                    query = query.where(model.id > checkpoint.last_id)
+                rows = (await session.execute(query)).all()
+                if not rows:
+                    checkpoint.completed_at = datetime.now(timezone.utc)
+                    await session.commit()
+                    break
+
+                step = -(-len(rows) // workers)
+                parts = await asyncio.gather(*(
+                    loop.run_in_executor(executor, _reencrypt_rows, service, rows[i:i + step])
+                    for i in range(0, len(rows), step)
+                ))
+                changed = [item for part in parts for item in part]
+                if changed:
+                    await session.execute(stmt, [
+                        {
+                            "b_id": row[0],
+                            **{f"old_{col}": old for col, old in zip(columns, row[1:])},
+                            **{f"new_{col}": new for col, new in zip(columns, values)},
+                        }
+                        for row, values in changed
+                    ])
+
+                # Same transaction as the UPDATE: the checkpoint never runs ahead of the data
+                checkpoint.last_id = rows[-1][0]
+                checkpoint.rows_scanned += len(rows)
+                checkpoint.rows_updated += len(changed)
+                await session.commit()
+                stats["rows_scanned"] += len(rows)
+                stats["rows_updated"] += len(changed)
+
+                if max_rows_per_second:
+                    delay = len(rows) / max_rows_per_second - (time.monotonic() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+
+    return stats
+
+
+async def reencrypt_all(
+    session_factory: Callable[[], AsyncSession],
+    tables: Sequence[str] = tuple(ENCRYPTED_COLUMNS),
+    service: EncryptionService = encryption_service,
+    batch_size: int = settings.key_rotation_batch_size,
+    workers: int = settings.key_rotation_workers,
+    max_rows_per_second: int = settings.key_rotation_max_rows_per_second,
+    reset: bool = False,
+) -> Dict[str, Dict[str, int]]:
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reencrypt") as executor:
+        for table_name in tables:
+            results[table_name] = await reencrypt_table(
+                session_factory,
+                table_name,
+                service=service,
+                batch_size=batch_size,
+                workers=workers,
+                max_rows_per_second=max_rows_per_second,
+                reset=reset,
+                executor=executor,
+            )
+            logger.info(f"Re-encrypted {table_name}: {results[table_name]}")
+    return results
+
+
+def main() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Re-encrypt PII columns under the active encryption key")
+    parser.add_argument("--tables", default=",".join(ENCRYPTED_COLUMNS))
+    parser.add_argument("--batch-size", type=int, default=settings.key_rotation_batch_size)
+    parser.add_argument("--workers", type=int, default=settings.key_rotation_workers)
+    parser.add_argument("--max-rows-per-second", type=int, default=settings.key_rotation_max_rows_per_second)
+    parser.add_argument("--reset", action="store_true", help="ignore checkpoints and rescan every row")
+    args = parser.parse_args()
+
+    tables = [name.strip() for name in args.tables.split(",") if name.strip()]
+    unknown = set(tables) - set(ENCRYPTED_COLUMNS)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    results = asyncio.run(
+        reencrypt_all(
+            AsyncSessionLocal,
+            tables=tables,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            max_rows_per_second=args.max_rows_per_second,
+            reset=args.reset,
+        )
+    )
+    logger.info(f"Key rotation to key {encryption_service.active_key_id} finished in {time.perf_counter() - started:.1f}s: {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,32 @@
 # No __future__ annotations - causes Pydantic ForwardRef issues
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi import _rate_limit_exceeded_handler
 import redis.asyncio as redis
 import asyncio
+import logging
 import socket
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from sqlalchemy.exc import OperationalError
 
 from app.core.config import settings
+from app.core.security import PasswordHasherBusy, password_hasher
+from app.middleware.body_limit import MULTIPART_OVERHEAD, BodySizeLimitMiddleware
 from app.middleware.ddos_protection import DDoSProtectionMiddleware
+from app.services.ai_quota import ai_quota
+from app.services.audit import audit_sink
+from app.services.context_store import context_store
+from app.services.context_summarizer import context_summarizer
+from app.services.document_analysis import document_analyzer
+from app.services.document_index import document_indexer
+from app.services.gemini import gemini_service
+from app.services.principal_cache import principal_cache
+from app.services.response_cache import response_cache
 
 
 # Initialize Rate Limiter
@@ -26,12 +39,35 @@ from app.schemas.document import Document, DocumentCreate
 from app.schemas.auth import Token, TokenData, UserBase
 
 # Now import routers
-from app.api.v1.endpoints import auth, cases, ai, notifications, messages, users, seed, audit
+from app.api.v1.endpoints import auth, cases, ai, notifications, messages, users, seed, audit, admin
 
 from contextlib import asynccontextmanager
 from app.db.session import engine
 from app.db.models import Base
 
+
+logger = logging.getLogger(__name__)
+
+
+def _create_missing_indexes(sync_conn):
+    # create_all skips tables that already exist, so new indexes on old
+    # tables have to be created explicitly. Columns added to old tables are
+    # not, so an index on a column the database lacks is skipped until the
+    # column has been added by hand.
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            missing = [column for column in index.columns if column.name not in existing]
+            if missing:
+                alter = ", ".join(
+                    f"ADD COLUMN {column.name} {column.type.compile(dialect=sync_conn.dialect)}" for column in missing
+                )
+                logger.warning(f"Skipping index {index.name}: run ALTER TABLE {table.name} {alter};")
+                continue
+            index.create(sync_conn, checkfirst=True)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Retry logic for database connection on startup
@@ -41,13 +77,27 @@ async def lifespan(app: FastAPI):
             if settings.environment != "TESTING":
                 async with engine.begin() as conn:
                     await conn.run_sync(Base.metadata.create_all)
+                    await conn.run_sync(_create_missing_indexes)
                     await conn.execute(text("SELECT 1"))
             break
         except (OperationalError, socket.gaierror) as e:
             retries -= 1
             print(f"Database error: {e}. Retrying...")
             await asyncio.sleep(5)
+    principal_cache.start()
+    audit_sink.start()
+    context_summarizer.start()
     yield
+    await context_summarizer.stop()
+    await document_analyzer.stop()
+    await document_indexer.stop()
+    await audit_sink.stop()
+    await principal_cache.stop()
+    await gemini_service.aclose()
+    await context_store.aclose()
+    await response_cache.aclose()
+    await ai_quota.aclose()
+    password_hasher.shutdown()
     await engine.dispose()
 
 # Create FastAPI app
@@ -62,6 +112,15 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication service is busy. Please try again shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # Redis client
 try:
     redis_client = redis.from_url(settings.redis_url, encoding="utf-8", decode_responses=True)
@@ -78,7 +137,13 @@ app.add_middleware(
     violation_window=settings.ddos_window_seconds
 )
 
-# 2. CORS Middleware
+# 2. Request body limit, enforced while the body is received
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.upload_max_bytes + MULTIPART_OVERHEAD,
+)
+
+# 3. CORS Middleware
 origins = [
     "https://test-production-bf56f.up.railway.app",
     "https://frontend-production-e011.up.railway.app",
@@ -90,7 +155,8 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 # Routers
@@ -102,6 +168,7 @@ app.include_router(messages.router, prefix="/api/v1/messages", tags=["messages"]
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(seed.router, prefix="/api/v1/dev", tags=["development"])
 app.include_router(audit.router, prefix="/api/v1/audit", tags=["audit"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
 
 
 @app.get("/")
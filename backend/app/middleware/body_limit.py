@@ -0,0 +1,87 @@
+"""
+Request body size limit.
+
+FastAPI parses multipart forms (UploadFile parameters) before the endpoint
+runs, spooling the whole body to a temporary file, so a size check inside
+the handler only happens after the client has sent everything. This
+middleware enforces the limit on the raw body as it arrives:
+
+- a Content-Length over the limit is answered with 413 before anything
+  is read
+- otherwise received bytes are counted on every receive(), and the
+  request fails with 413 as soon as the count passes the limit, so a
+  chunked or lying client is cut off after at most one extra chunk
+
+The limit raises a Starlette HTTPException from inside receive(), which
+FastAPI re-raises from body parsing unchanged, so the usual exception
+handlers render it.
+"""
+
+from __future__ import annotations
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class RequestTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request body exceeds the maximum size of {max_bytes} bytes",
+        )
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await self._reject(scope, receive, send)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise RequestTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestTooLarge:
+            # Read outside an exception handler (e.g. in a background task)
+            if response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        exc = RequestTooLarge(self.max_bytes)
+        response = JSONResponse(
+            status_code=exc.status_code,
+            content={"detail": exc.detail},
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
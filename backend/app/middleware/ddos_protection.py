@@ -6,6 +6,15 @@ Provides additional protection layer beyond basic rate limiting:
 - Suspicious pattern detection
 - Automatic temporary bans
 - Integration with Redis for distributed tracking
+
+Implemented as a plain ASGI callable: the verdict is reached from the
+connection scope alone, before any body is read, and allowed requests
+are handed to the app with the original receive/send, so request and
+response bodies (including streams) pass through untouched.
+
+With Redis, the ban check, violation count, window expiry and ban
+decision are one Lua script (EVALSHA), so each request costs at most one
+round trip and concurrent workers agree on the count.
 """
 
 from __future__ import annotations
@@ -13,138 +22,157 @@ from __future__ import annotations
 import logging
 from typing import Dict, Optional, List
 from datetime import datetime, timedelta, timezone
-from fastapi import Request, status
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 import redis.asyncio as redis
 
 # Set up logging
 logger = logging.getLogger("ddos_middleware")
 
-class DDoSProtectionMiddleware(BaseHTTPMiddleware):
+BANNED_DETAIL = "Your IP has been temporarily banned due to suspicious activity. Please try again later."
+TOO_MANY_VIOLATIONS_DETAIL = "Too many violations detected. Your IP has been temporarily banned."
+
+# Scanner probes, matched at the path root; our own routes (e.g. /api/v1/admin) never count
+SUSPICIOUS_PATHS = ("/admin", "/phpmyadmin", "/.env", "/wp-admin", "/.git")
+API_PREFIX = "/api/v1/"
+
+ALLOW, BANNED, NEWLY_BANNED = 0, 1, 2
+
+# KEYS: ban key, violations key
+# ARGV: suspicious (0/1), max violations, violation window s, ban duration s
+CHECK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return 1
+end
+if ARGV[1] == '0' then
+  return 0
+end
+local violations = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if violations >= tonumber(ARGV[2]) then
+  redis.call('SET', KEYS[1], '1', 'EX', ARGV[4])
+  return 2
+end
+return 0
+"""
+
+
+class DDoSProtectionMiddleware:
     """
     Advanced DDoS protection middleware with Redis safety
     """
-    
+
     def __init__(
-        self, 
-        app, 
+        self,
+        app: ASGIApp,
         redis_client: Optional[redis.Redis] = None,
         trusted_ips: Optional[List[str]] = None,
         max_violations: int = 5,
         ban_duration: int = 900,
         violation_window: int = 300
     ):
-        super().__init__(app)
+        self.app = app
         self.redis_client = redis_client
+        self._check_script = redis_client.register_script(CHECK_SCRIPT) if redis_client else None
         self.trusted_ips = set(trusted_ips or ["127.0.0.1", "::1"])
 
         # Configuration
         self.max_violations = max_violations
         self.ban_duration = timedelta(seconds=ban_duration)
         self.violation_window = timedelta(seconds=violation_window)
-        
+
         # In-memory fallback
         self.ip_violations: Dict[str, int] = {}
         self.banned_ips: Dict[str, datetime] = {}
-    
-    async def dispatch(self, request: Request, call_next):
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         try:
-            client_ip = self._get_client_ip(request)
-
-            # Check whitelist
-            if client_ip in self.trusted_ips:
-                return await call_next(request)
-            
-            # Check if IP is banned
-            if await self._is_banned(client_ip):
-                return JSONResponse(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    content={
-                        "detail": "Your IP has been temporarily banned due to suspicious activity. Please try again later."
-                    }
-                )
-            
-            # Check for suspicious patterns
-            if await self._detect_suspicious_pattern(request, client_ip):
-                await self._record_violation(client_ip)
-                
-                violations = await self._get_violations(client_ip)
-                if violations >= self.max_violations:
-                    await self._ban_ip(client_ip)
-                    return JSONResponse(
-                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                        content={
-                            "detail": "Too many violations detected. Your IP has been temporarily banned."
-                        }
-                    )
-            
-            return await call_next(request)
+            detail = await self._check(scope)
         except Exception as e:
-            # Critical safety: if middleware fails, LOG and PROCEED to the app
+            # Critical safety: if the check fails, LOG and PROCEED to the app
             # Better to have no DDoS protection for one request than 500 error
             logger.error(f"DDoS Middleware failure: {e}")
-            return await call_next(request)
-    
-    def _get_client_ip(self, request: Request) -> str:
-        forwarded = request.headers.get("X-Forwarded-For")
+            detail = None
+
+        if detail is not None:
+            response = JSONResponse(status_code=status.HTTP_429_TOO_MANY_REQUESTS, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _check(self, scope: Scope) -> Optional[str]:
+        """
+        The rejection message for this request, or None to let it through.
+        """
+        client_ip = self._get_client_ip(scope)
+
+        # Check whitelist
+        if client_ip in self.trusted_ips:
+            return None
+
+        suspicious = await self._detect_suspicious_pattern(scope["path"], client_ip)
+        verdict = await self._verdict(client_ip, suspicious)
+        if verdict == BANNED:
+            return BANNED_DETAIL
+        if verdict == NEWLY_BANNED:
+            return TOO_MANY_VIOLATIONS_DETAIL
+        return None
+
+    def _get_client_ip(self, scope: Scope) -> str:
+        # Raw ASGI headers: lower-cased byte names, no Headers object needed
+        forwarded = real_ip = None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for" and forwarded is None:
+                forwarded = value
+            elif name == b"x-real-ip" and real_ip is None:
+                real_ip = value
         if forwarded:
-            return forwarded.split(",")[0].strip()
-        real_ip = request.headers.get("X-Real-IP")
+            return forwarded.decode("latin-1").split(",")[0].strip()
         if real_ip:
-            return real_ip
-        return request.client.host if request.client else "unknown"
-    
-    async def _is_banned(self, ip: str) -> bool:
-        if self.redis_client:
+            return real_ip.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def _verdict(self, ip: str, suspicious: bool) -> int:
+        """
+        ALLOW, BANNED (already), or NEWLY_BANNED (this violation hit the limit).
+        """
+        if self._check_script is not None:
             try:
-                ban_key = f"ddos:ban:{ip}"
-                return bool(await self.redis_client.exists(ban_key))
+                return int(await self._check_script(
+                    keys=[f"ddos:ban:{ip}", f"ddos:violations:{ip}"],
+                    args=[
+                        int(suspicious),
+                        self.max_violations,
+                        int(self.violation_window.total_seconds()),
+                        int(self.ban_duration.total_seconds()),
+                    ],
+                ))
             except Exception as e:
-                logger.warning(f"Redis error in _is_banned: {e}")
+                logger.warning(f"Redis error in _verdict: {e}")
+        return self._local_verdict(ip, suspicious)
 
+    def _local_verdict(self, ip: str, suspicious: bool) -> int:
+        now = datetime.now(timezone.utc)
         if ip in self.banned_ips:
-            if datetime.now(timezone.utc) < self.banned_ips[ip]:
-                return True
+            if now < self.banned_ips[ip]:
+                return BANNED
             del self.banned_ips[ip]
-        return False
-    
-    async def _detect_suspicious_pattern(self, request: Request, ip: str) -> bool:
-        path = request.url.path.lower()
-        suspicious_paths = ["/admin", "/phpmyadmin", "/.env", "/wp-admin", "/.git"]
-        if any(susp in path for susp in suspicious_paths):
-            return True
-        return False
-    
-    async def _record_violation(self, ip: str):
-        if self.redis_client:
-            try:
-                violation_key = f"ddos:violations:{ip}"
-                await self.redis_client.incr(violation_key)
-                await self.redis_client.expire(violation_key, int(self.violation_window.total_seconds()))
-                return
-            except Exception as e:
-                logger.warning(f"Redis error in _record_violation: {e}")
-        
+        if not suspicious:
+            return ALLOW
         self.ip_violations[ip] = self.ip_violations.get(ip, 0) + 1
-    
-    async def _get_violations(self, ip: str) -> int:
-        if self.redis_client:
-            try:
-                violation_key = f"ddos:violations:{ip}"
-                v = await self.redis_client.get(violation_key)
-                return int(v) if v else 0
-            except Exception as e:
-                logger.warning(f"Redis error in _get_violations: {e}")
-        return self.ip_violations.get(ip, 0)
-    
-    async def _ban_ip(self, ip: str):
-        if self.redis_client:
-            try:
-                ban_key = f"ddos:ban:{ip}"
-                await self.redis_client.setex(ban_key, int(self.ban_duration.total_seconds()), "1")
-                return
-            except Exception as e:
-                logger.warning(f"Redis error in _ban_ip: {e}")
-        
-        self.banned_ips[ip] = datetime.now(timezone.utc) + self.ban_duration
+        if self.ip_violations[ip] >= self.max_violations:
+            self.banned_ips[ip] = now + self.ban_duration
+            return NEWLY_BANNED
+        return ALLOW
+
+    async def _detect_suspicious_pattern(self, path: str, ip: str) -> bool:
+        path = path.lower()
+        if path.startswith(API_PREFIX):
+            return False
+        return path.startswith(SUSPICIOUS_PATHS)
@@ -29,5 +29,9 @@ class CaseInDBBase(CaseBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CaseSummary(CaseInDBBase):
+    """A case without its documents (case list without include=documents)."""
+
+
 class Case(CaseInDBBase):
     documents: List[Document] = []
@@ -24,6 +24,9 @@ class DocumentUpdate(DocumentBase):
 class DocumentInDBBase(DocumentBase):
     id: uuid.UUID
     case_id: uuid.UUID
+    content_type: Optional[str] = None
+    content_hash: Optional[str] = None
+    size_bytes: Optional[int] = None
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
@@ -31,3 +34,16 @@ class DocumentInDBBase(DocumentBase):
 
 class Document(DocumentInDBBase):
     pass
+
+
+class DocumentAnalysis(BaseModel):
+    document_id: uuid.UUID
+    status: str
+    model: str
+    chunks_total: int
+    chunks_done: int
+    summary: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
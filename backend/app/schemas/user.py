@@ -4,6 +4,19 @@ from datetime import datetime
 import re
 import uuid
 
+
+def validate_e164_phone(v: Optional[str]) -> Optional[str]:
+    """
+    Validate international phone number in E.164 format
+    Format: +[country code][number] (e.g., +48123456789)
+    """
+    if v is None:
+        return v
+    # E.164 format: + followed by 1-15 digits
+    if not re.match(r'^\+[1-9]\d{1,14}$', v):
+        raise ValueError('Phone number must be in international E.164 format (e.g., +48123456789)')
+    return v
+
 class UserBase(BaseModel):
     email: EmailStr
     full_name: Optional[str] = None
@@ -53,16 +66,7 @@ class UserUpdate(BaseModel):
     @field_validator('phone')
     @classmethod
     def validate_phone(cls, v: Optional[str]) -> Optional[str]:
-        """
-        Validate international phone number in E.164 format
-        Format: +[country code][number] (e.g., +48123456789)
-        """
-        if v is None:
-            return v
-        # E.164 format: + followed by 1-15 digits
-        if not re.match(r'^\+[1-9]\d{1,14}$', v):
-            raise ValueError('Phone number must be in international E.164 format (e.g., +48123456789)')
-        return v
+        return validate_e164_phone(v)
     
     @field_validator('pesel')
     @classmethod
@@ -101,9 +105,15 @@ class UserProfileBase(BaseModel):
     last_name: Optional[str] = None
     pesel: Optional[str] = None
     address: Optional[str] = None
+    phone: Optional[str] = None
 
 class UserProfileUpdate(UserProfileBase):
-    pass
+    phone: Optional[str] = Field(None, description="International phone number in E.164 format (e.g., +48123456789)")
+
+    @field_validator('phone')
+    @classmethod
+    def validate_phone(cls, v: Optional[str]) -> Optional[str]:
+        return validate_e164_phone(v)
 
 class UserProfileResponse(UserProfileBase):
     user_id: uuid.UUID
@@ -0,0 +1,273 @@
+"""
+Per-user AI token quotas and usage accounting.
+
+Every AI request first reserves its estimated cost (context + prompt +
+AI_QUOTA_RESPONSE_RESERVE tokens for the answer) from two token buckets:
+the caller's own (signed-in user, or client IP when anonymous), sized by
+role, and an optional bucket shared by everyone with that role. Both are
+checked and debited by one Lua script, so concurrent workers cannot
+overspend, and a refusal comes with the exact wait until enough tokens
+have refilled. Once the real size of the answer is known the reservation
+is settled (refunded in full when the model was not called).
+
+Tokens used are added to per-day Redis hashes (ai:usage:YYYY-MM-DD),
+kept for AI_USAGE_RETENTION_DAYS. Without Redis both fall back to
+per-worker memory.
+"""
+
+import logging
+import math
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS_ROLE = "anonymous"
+DEFAULT_ROLE = "client"
+
+# KEYS: user bucket, role bucket (hashes {tokens, ts})
+# ARGV: cost, force, user capacity, user refill/min, role capacity, role refill/min
+# A capacity of 0 disables that bucket. Without `force` the cost (capped at
+# the capacity) is taken from every bucket only if all have enough; with it
+# the cost is always applied, so settling may go negative or refund.
+# Returns {allowed, retry_after_ms, user tokens left}.
+TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local force = ARGV[2] == '1'
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[1 + 2 * i])
+  if capacity > 0 then
+    local rate = tonumber(ARGV[2 + 2 * i]) / 60000
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    local need = math.min(cost, capacity)
+    if not force and tokens < need then
+      wait = math.max(wait, math.ceil((need - tokens) / rate))
+    end
+  end
+end
+local left = -1
+if wait == 0 then
+  for i, key in ipairs(KEYS) do
+    if levels[i] then
+      local capacity = tonumber(ARGV[1 + 2 * i])
+      local rate = tonumber(ARGV[2 + 2 * i]) / 60000
+      local tokens = math.min(capacity, levels[i] - cost)
+      redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+      -- A missing bucket reads as full, so it can go once it would have refilled
+      redis.call('PEXPIRE', key, math.ceil((capacity - tokens) / rate) + 1000)
+      if i == 1 then left = tokens end
+    end
+  end
+elseif levels[1] then
+  left = levels[1]
+end
+return {wait == 0 and 1 or 0, wait, math.floor(left)}
+"""
+
+
+@dataclass
+class QuotaSubject:
+    key: str  # "user:<id>" or "ip:<address>"
+    role: str
+
+
+@dataclass
+class QuotaDecision:
+    allowed: bool
+    retry_after: float = 0.0  # seconds
+    remaining: Optional[int] = None  # caller's tokens left, None if unlimited
+
+
+class AIQuota:
+    def __init__(
+        self,
+        redis_url: Optional[str],
+        enabled: bool = True,
+        user_limits: Optional[Dict[str, List[float]]] = None,
+        role_limits: Optional[Dict[str, List[float]]] = None,
+        response_reserve: int = 1000,
+        retention_days: int = 35,
+    ):
+        self.enabled = enabled
+        self.redis: Optional[redis.Redis] = None
+        if enabled and redis_url:
+            try:
+                self.redis = redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+            except Exception:
+                self.redis = None
+        self._take_script = self.redis.register_script(TAKE_SCRIPT) if self.redis else None
+        # role -> [capacity, refill per minute]
+        self.user_limits = user_limits or {}
+        self.role_limits = role_limits or {}
+        self.response_reserve = response_reserve
+        self.retention_days = retention_days
+
+        # Fallbacks when Redis is unavailable
+        self._local_buckets: Dict[str, List[float]] = {}
+        self._local_usage: Dict[str, Counter] = defaultdict(Counter)
+        self.stats: Dict[str, int] = {"allowed": 0, "rejected": 0}
+
+    def _limits(self, role: str) -> Tuple[float, float, float, float]:
+        user_cap, user_rate = self.user_limits.get(role) or self.user_limits.get(DEFAULT_ROLE) or (0, 0)
+        role_cap, role_rate = self.role_limits.get(role) or (0, 0)
+        return user_cap, user_rate, role_cap, role_rate
+
+    @staticmethod
+    def _bucket_keys(subject: QuotaSubject) -> List[str]:
+        return [f"ai:quota:{subject.key}", f"ai:quota:role:{subject.role}"]
+
+    def _local_take(self, keys: List[str], cost: int, force: bool, limits: Tuple[float, ...]) -> Tuple[int, int, int]:
+        # Same arithmetic as TAKE_SCRIPT, on this worker's clock
+        now = time.monotonic() * 1000
+        levels: Dict[int, float] = {}
+        wait = 0
+        for i, key in enumerate(keys):
+            capacity, rate = limits[2 * i], limits[2 * i + 1] / 60000
+            if capacity <= 0:
+                continue
+            tokens, ts = self._local_buckets.get(key, (capacity, now))
+            levels[i] = min(capacity, tokens + max(0.0, now - ts) * rate)
+            need = min(cost, capacity)
+            if not force and levels[i] < need:
+                wait = max(wait, math.ceil((need - levels[i]) / rate))
+        if wait:
+            return 0, wait, math.floor(levels.get(0, -1))
+        for i, tokens in levels.items():
+            levels[i] = min(limits[2 * i], tokens - cost)
+            self._local_buckets[keys[i]] = [levels[i], now]
+        return 1, 0, math.floor(levels.get(0, -1))
+
+    async def _take(self, subject: QuotaSubject, cost: int, force: bool) -> Tuple[int, int, int]:
+        keys = self._bucket_keys(subject)
+        limits = self._limits(subject.role)
+        if self._take_script is not None:
+            try:
+                allowed, wait_ms, left = await self._take_script(keys=keys, args=[cost, int(force), *limits])
+                return int(allowed), int(wait_ms), int(left)
+            except Exception as e:
+                logger.warning(f"Redis error in AIQuota.take: {e}")
+        return self._local_take(keys, cost, force, limits)
+
+    async def acquire(self, subject: QuotaSubject, cost: int) -> QuotaDecision:
+        """
+        Reserve `cost` tokens from the subject's buckets, or say how long
+        until they can be.
+        """
+        if not self.enabled:
+            return QuotaDecision(allowed=True)
+        allowed, wait_ms, left = await self._take(subject, cost, force=False)
+        self.stats["allowed" if allowed else "rejected"] += 1
+        return QuotaDecision(
+            allowed=bool(allowed),
+            retry_after=wait_ms / 1000,
+            remaining=max(left, 0) if self._limits(subject.role)[0] else None,
+        )
+
+    async def settle(self, subject: QuotaSubject, reserved: int, used: int) -> None:
+        """
+        Replace a reservation of `reserved` tokens by what was actually `used`.
+        """
+        if self.enabled and reserved != used:
+            await self._take(subject, used - reserved, force=True)
+
+    @staticmethod
+    def _usage_key(day: date) -> str:
+        return f"ai:usage:{day.isoformat()}"
+
+    async def record_usage(self, subject: QuotaSubject, prompt_tokens: int, response_tokens: int) -> None:
+        if not self.enabled:
+            return
+        # Anonymous callers only count towards their role, never by IP
+        scopes = ["all", f"role:{subject.role}"] + ([subject.key] if subject.role != ANONYMOUS_ROLE else [])
+        increments = {"requests": 1, "prompt_tokens": prompt_tokens, "response_tokens": response_tokens}
+        key = self._usage_key(datetime.now(timezone.utc).date())
+        if self.redis:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for scope in scopes:
+                        for name, amount in increments.items():
+                            pipe.hincrby(key, f"{scope}:{name}", amount)
+                    pipe.expire(key, self.retention_days * 86400)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Redis error in AIQuota.record_usage: {e}")
+        self._local_usage[key].update({f"{s}:{n}": a for s in scopes for n, a in increments.items()})
+
+    async def _usage_hashes(self, days: List[date]) -> List[Dict[str, int]]:
+        keys = [self._usage_key(d) for d in days]
+        if self.redis:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.hgetall(key)
+                    return [{f: int(v) for f, v in h.items()} for h in await pipe.execute()]
+            except Exception as e:
+                logger.warning(f"Redis error in AIQuota.usage: {e}")
+        return [dict(self._local_usage.get(key, {})) for key in keys]
+
+    async def usage(self, days: int = 7, top: int = 10) -> List[Dict[str, Any]]:
+        """
+        Per-day totals, newest first: overall, by role, and the top users by tokens.
+        """
+        today = datetime.now(timezone.utc).date()
+        dates = [today - timedelta(days=n) for n in range(days)]
+        report = []
+        for day, counters in zip(dates, await self._usage_hashes(dates)):
+            scopes: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "prompt_tokens": 0, "response_tokens": 0})
+            for field, value in counters.items():
+                scope, _, name = field.rpartition(":")
+                scopes[scope][name] = value
+            users = sorted(
+                ({"user": s[len("user:"):], **v} for s, v in scopes.items() if s.startswith("user:")),
+                key=lambda u: u["prompt_tokens"] + u["response_tokens"],
+                reverse=True,
+            )
+            report.append({
+                "date": day.isoformat(),
+                **scopes["all"],
+                "by_role": {s[len("role:"):]: v for s, v in scopes.items() if s.startswith("role:")},
+                "top_users": users[:top],
+            })
+        return report
+
+    async def remaining(self, subject: QuotaSubject) -> Optional[int]:
+        """
+        Tokens currently available to `subject`, None if unlimited.
+        """
+        if not self.enabled or not self._limits(subject.role)[0]:
+            return None
+        _, _, left = await self._take(subject, 0, force=False)
+        return max(left, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+    async def aclose(self) -> None:
+        if self.redis:
+            await self.redis.aclose()
+
+
+ai_quota = AIQuota(
+    settings.redis_url,
+    enabled=settings.ai_quota_enabled,
+    user_limits=settings.ai_quota_user_limits,
+    role_limits=settings.ai_quota_role_limits,
+    response_reserve=settings.ai_quota_response_reserve,
+    retention_days=settings.ai_usage_retention_days,
+)
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime
 import uuid
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select
 
+from app.core.config import settings
 from app.db.models import AuditLog
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
 
 
 async def create_audit_log(
@@ -38,3 +46,181 @@ async def create_audit_log(
     await db.commit()
     await db.refresh(audit_log)
     return audit_log
+
+
+class AuditSink:
+    """
+    Buffered audit-log writer.
+
+    Request handlers enqueue events and return immediately; a background
+    task writes them with a single multi-row INSERT per batch, flushing
+    whenever `batch_size` events are buffered or `flush_interval_ms` has
+    passed since the first event of the batch.
+
+    When the buffer is full, `overflow_policy` decides what happens:
+    - "block":       the caller waits for space (backpressure)
+    - "drop_newest": the new event is discarded
+    - "drop_oldest": the oldest buffered event is discarded
+
+    `stop` never interrupts a write: it signals the writer, which drains
+    the buffer and exits on its own.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        batch_size: int = 100,
+        flush_interval_ms: int = 200,
+        max_buffer: int = 10000,
+        overflow_policy: str = "block",
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {overflow_policy}")
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow_policy = overflow_policy
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.stats: Dict[str, int] = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "flushes": 0,
+        }
+
+    async def log(
+        self,
+        action: str,
+        actor_id: Optional[uuid.UUID] = None,
+        resource_id: Optional[uuid.UUID] = None,
+        ip_address: Optional[str] = None,
+    ) -> None:
+        """
+        Queue an audit event. Same arguments as create_audit_log.
+        """
+        row = {
+            "id": uuid.uuid4(),
+            "actor_id": actor_id,
+            "action": action,
+            "details": {"resource_id": str(resource_id)} if resource_id else None,
+            "ip_address": ip_address,
+            "timestamp": datetime.utcnow(),
+        }
+
+        if self.overflow_policy == "block":
+            await self._queue.put(row)
+        else:
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+                if self.overflow_policy == "drop_newest":
+                    return
+                self._queue.get_nowait()
+                self._queue.put_nowait(row)
+        self.stats["enqueued"] += 1
+
+    @property
+    def buffered(self) -> int:
+        return self._queue.qsize()
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(AuditLog), batch)
+                await session.commit()
+            self.stats["written"] += len(batch)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logger.error(f"Audit flush failed, {len(batch)} events lost: {e}")
+
+    async def _next(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        The next buffered event; None after `timeout`, or once stop() has
+        been called and the buffer is empty.
+        """
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        if self._stopping.is_set():
+            return None
+        getter = asyncio.ensure_future(self._queue.get())
+        stopper = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait({getter, stopper}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopper.cancel()
+            if not getter.done():
+                # Queue.get leaves the event buffered when cancelled
+                getter.cancel()
+        return getter.result() if getter.done() and not getter.cancelled() else None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._next()
+            if row is None:
+                return
+            batch = [row]
+            try:
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    row = await self._next(timeout)
+                    if row is None:
+                        break
+                    batch.append(row)
+            except asyncio.CancelledError:
+                # Cancelled mid-batch: persist what we already hold
+                await self._write(batch)
+                raise
+            await self._write(batch)
+
+    async def flush(self) -> None:
+        """
+        Write everything currently buffered, in batches.
+        """
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._write(batch)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Drain the buffer and stop the writer. It is cancelled only if it
+        has not finished after `timeout` seconds (e.g. a hung database).
+        """
+        if self._task is not None:
+            task, self._task = self._task, None
+            self._stopping.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Audit writer did not drain within {timeout}s, {self.buffered} events lost")
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                return
+            finally:
+                self._stopping.clear()
+        await self.flush()
+
+
+audit_sink = AuditSink(
+    batch_size=settings.audit_batch_size,
+    flush_interval_ms=settings.audit_flush_interval_ms,
+    max_buffer=settings.audit_buffer_size,
+    overflow_policy=settings.audit_overflow_policy,
+)
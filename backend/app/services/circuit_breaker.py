@@ -0,0 +1,178 @@
+"""
+Circuit breaker for an upstream dependency.
+
+    CLOSED     calls pass; each outcome goes into a window of the last
+               `window` calls. Once `min_calls` are in the window and the
+               failure rate or the slow-call rate reaches its threshold,
+               the breaker opens.
+    OPEN       calls are rejected with CircuitOpenError for `open_seconds`.
+    HALF_OPEN  up to `half_open_calls` probe calls go through; if they all
+               succeed quickly the breaker closes, any failure or slow
+               call opens it again.
+
+State is per worker. Latencies of successful calls are kept separately
+from the window so callers can derive a hedging deadline from them.
+"""
+
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = 50,
+        min_calls: int = 20,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        slow_call_rate: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        # (failed, slow) per call while closed
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.stats: Dict[str, Any] = {
+            "calls": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "rejected": 0,
+            "transitions": {f"{a}_to_{b}": 0 for a, b in ((CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN), (HALF_OPEN, CLOSED))},
+            "last_transition": None,
+        }
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, "open period elapsed")
+        return self._state
+
+    def _transition(self, state: str, reason: str) -> None:
+        previous, self._state = self._state, state
+        self.stats["transitions"][f"{previous}_to_{state}"] += 1
+        self.stats["last_transition"] = {
+            "from": previous,
+            "to": state,
+            "reason": reason,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit '{self.name}' {previous} -> {state}: {reason}")
+        self._probes = self._probe_successes = 0
+        if state == OPEN:
+            self._opened_at = self._clock()
+        elif state == CLOSED:
+            self._window.clear()
+
+    def acquire(self) -> None:
+        """
+        Call before each upstream call. Raises CircuitOpenError if the call
+        must not be made; otherwise the caller must report the outcome with
+        record_success, record_failure or release.
+        """
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and self._probes < self.half_open_calls:
+            self._probes += 1
+            return
+        self.stats["rejected"] += 1
+        retry_after = max(0.0, self._opened_at + self.open_seconds - self._clock()) if state == OPEN else 0.0
+        raise CircuitOpenError(self.name, retry_after)
+
+    def release(self) -> None:
+        """
+        The call ended without saying anything about upstream health
+        (cancelled, or rejected as a client error).
+        """
+        if self._state == HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def record_success(self, duration: float) -> None:
+        self._latencies.append(duration)
+        slow = duration >= self.slow_call_seconds
+        self._record(False, slow)
+
+    def record_failure(self) -> None:
+        self._record(True, False)
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        self.stats["calls"] += 1
+        self.stats["failures"] += failed
+        self.stats["slow_calls"] += slow
+        if self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if failed or slow:
+                self._transition(OPEN, "probe call failed" if failed else "probe call was slow")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._transition(CLOSED, f"{self._probe_successes} probe calls succeeded")
+        elif self._state == CLOSED:
+            self._window.append((failed, slow))
+            if len(self._window) < self.min_calls:
+                return
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.failure_rate:
+                self._transition(OPEN, f"failure rate {failure_rate:.0%} over {len(self._window)} calls")
+            elif slow_rate >= self.slow_call_rate:
+                self._transition(OPEN, f"slow-call rate {slow_rate:.0%} over {len(self._window)} calls")
+        # Calls started before the breaker opened and finishing now are only counted
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._window:
+            return 0.0, 0.0
+        n = len(self._window)
+        return sum(f for f, _ in self._window) / n, sum(s for _, s in self._window) / n
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """
+        Latency of recent successful calls at `percentile` (0-100), or None
+        until min_calls samples exist.
+        """
+        if len(self._latencies) < self.min_calls:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        failure_rate, slow_rate = self._rates()
+        p95 = self.latency_percentile(95)
+        return {
+            **self.stats,
+            "transitions": dict(self.stats["transitions"]),
+            "state": self.state,
+            "window_calls": len(self._window),
+            "failure_rate": round(failure_rate, 4),
+            "slow_call_rate": round(slow_rate, 4),
+            "p95_latency_seconds": round(p95, 4) if p95 is not None else None,
+        }
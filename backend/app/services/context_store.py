@@ -1,40 +1,176 @@
+"""
+Per-session AI conversation context, kept in a Redis list per session plus
+an optional running summary of turns that no longer fit the token budget
+(see app.services.context_summarizer).
+
+Entries use a compact binary encoding instead of JSON:
+
+    version (1 byte, 0x01) | role length (1 byte) | role | UTF-8 text
+
+Entries written by the old JSON format are still readable. Reads are one
+pipelined LRANGE + GET; appends push any number of turns with RPUSH +
+LTRIM + EXPIRE in a single MULTI/EXEC round trip.
+"""
+
 import json
-from typing import List, Dict, Any
-import redis
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.tokens import message_tokens
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 0x01
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+def encode_message(role: str, text: str) -> bytes:
+    role_bytes = role.encode()
+    return bytes((_FORMAT_VERSION, len(role_bytes))) + role_bytes + (text or "").encode()
+
+
+def decode_message(raw: bytes) -> Dict[str, Any]:
+    """
+    Decode to the {"role": ..., "parts": [text]} shape callers expect.
+    """
+    if raw[:1] == b"{":
+        return json.loads(raw)
+    if raw[0] != _FORMAT_VERSION:
+        raise ValueError(f"Unknown context entry format {raw[0]}")
+    role_end = 2 + raw[1]
+    return {"role": raw[2:role_end].decode(), "parts": [raw[role_end:].decode()]}
+
+
+@dataclass
+class ContextWindow:
+    messages: List[Dict[str, Any]]  # what to send upstream, oldest first
+    stored_tokens: int  # all raw turns currently stored, summary excluded
+
+
+def fit_to_budget(turns: List[Dict[str, Any]], summary: Optional[str], budget_tokens: int) -> ContextWindow:
+    """
+    The summary (if any) followed by the newest turns that fit in
+    `budget_tokens`. Turns are never split; one that doesn't fit ends the window.
+    """
+    head = [{"role": "user", "parts": [SUMMARY_PREFIX + summary]}] if summary else []
+    remaining = budget_tokens - sum(message_tokens(m) for m in head)
+    sizes = [message_tokens(t) for t in turns]
+
+    kept = []
+    for turn, size in zip(reversed(turns), reversed(sizes)):
+        if size > remaining:
+            break
+        kept.append(turn)
+        remaining -= size
+    return ContextWindow(messages=head + kept[::-1], stored_tokens=sum(sizes))
+
 
 class ContextStore:
-    def __init__(self, redis_url: str):
-        self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
-        self.ttl = 3600  # 1 hour context lifetime
-
-    def get_last_messages(self, session_id: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """
-        Get the last N messages for a session.
-        """
-        key = f"context:{session_id}"
-        # Redis list stores strings. We store JSON.
-        # lrange returns the whole list or range.
-        # We need last 'limit' items.
-        # Redis lists are left-pushed or right-pushed.
-        # Assuming we append to right (rpush), then lrange -limit -1 gives last N.
-        
-        # However, to be safe:
+    def __init__(
+        self,
+        redis_url: str,
+        ttl: int = 3600,
+        max_connections: int = 50,
+        budget_tokens: int = 3000,
+        max_turns: int = 50,
+    ):
+        # One client (and so one connection pool) per process, shared by all requests
+        self.redis = redis.from_url(redis_url, decode_responses=False, max_connections=max_connections)
+        self.ttl = ttl  # 1 hour context lifetime
+        self.budget_tokens = budget_tokens
+        self.max_turns = max_turns  # hard cap on raw turns if summarization falls behind
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"context:{session_id}"
+
+    @staticmethod
+    def _summary_key(session_id: str) -> str:
+        return f"context:{session_id}:summary"
+
+    async def load(self, session_id: str) -> Tuple[Optional[str], List[bytes]]:
+        """
+        The stored summary and all raw (still encoded) turns, in one round trip.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self._summary_key(session_id))
+            pipe.lrange(self._key(session_id), 0, -1)
+            summary, raw_messages = await pipe.execute()
+        return (summary.decode() if summary else None), raw_messages
+
+    async def get_context(self, session_id: str, budget_tokens: Optional[int] = None) -> ContextWindow:
+        """
+        Summary plus the newest turns within the token budget.
+        """
+        try:
+            summary, raw_messages = await self.load(session_id)
+            turns = [decode_message(m) for m in raw_messages]
+        except Exception as e:
+            logger.warning(f"Redis error in ContextStore.get_context: {e}")
+            return ContextWindow(messages=[], stored_tokens=0)
+        return fit_to_budget(turns, summary, budget_tokens or self.budget_tokens)
+
+    async def append_messages(
+        self, session_id: str, messages: Sequence[Tuple[str, str]], keep_last: Optional[int] = None
+    ) -> None:
+        """
+        Append (role, text) turns in one MULTI/EXEC round trip and trim the
+        session to its last `keep_last` entries.
+        """
+        if not messages:
+            return
+        key = self._key(session_id)
         try:
-            raw_messages = self.redis.lrange(key, -limit, -1)
-            return [json.loads(m) for m in raw_messages]
-        except Exception:
-            return []
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(key, *(encode_message(role, text) for role, text in messages))
+                pipe.ltrim(key, -(keep_last or self.max_turns), -1)
+                pipe.expire(key, self.ttl)
+                pipe.expire(self._summary_key(session_id), self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis error in ContextStore.append_messages: {e}")
 
-    def append_message(self, session_id: str, role: str, text: str, keep_last: int = 10):
+    async def append_message(self, session_id: str, role: str, text: str, keep_last: Optional[int] = None) -> None:
         """
         Append a message to the session context.
         """
-        key = f"context:{session_id}"
-        msg = json.dumps({"role": role, "parts": [text]})
-        
+        await self.append_messages(session_id, [(role, text)], keep_last=keep_last)
+
+    async def fold_into_summary(self, session_id: str, folded: List[bytes], summary: str) -> bool:
+        """
+        Replace the oldest turns with `summary`, provided they are still
+        exactly `folded` (appends may race; a concurrent trim aborts the
+        swap via WATCH). Returns whether the swap happened.
+        """
+        key = self._key(session_id)
         try:
-            self.redis.rpush(key, msg)
-            self.redis.ltrim(key, -keep_last, -1)
-            self.redis.expire(key, self.ttl)
-        except Exception:
-            pass
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                if await pipe.lrange(key, 0, len(folded) - 1) != folded:
+                    return False
+                pipe.multi()
+                pipe.ltrim(key, len(folded), -1)
+                pipe.set(self._summary_key(session_id), summary.encode(), ex=self.ttl)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+            return True
+        except redis.WatchError:
+            return False
+        except Exception as e:
+            logger.warning(f"Redis error in ContextStore.fold_into_summary: {e}")
+            return False
+
+    async def aclose(self) -> None:
+        await self.redis.aclose()
+
+
+context_store = ContextStore(
+    settings.redis_url,
+    budget_tokens=settings.ai_context_budget_tokens,
+    max_turns=settings.ai_context_max_turns,
+)
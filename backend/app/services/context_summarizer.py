@@ -0,0 +1,155 @@
+"""
+Background folding of old conversation turns into a running summary.
+
+Requests only read a budgeted window (ContextStore.get_context), so they
+never wait on summarization. After a request, ai.py calls
+`schedule_if_needed` with the session's stored size; once it exceeds the
+budget the session is queued, and a single worker task asks the model to
+merge the oldest turns into the stored summary, keeping the newest turns
+raw up to half the budget so a session isn't re-summarized every turn.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.tokens import CHARS_PER_TOKEN, message_tokens
+from app.services.context_store import ContextStore, context_store, decode_message
+from app.services.gemini import FALLBACK_REPLIES, GeminiService, gemini_service
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a lawyer and a legal assistant. "
+    "Merge the existing summary and the new turns below into one updated summary of at most "
+    "{words} words. Keep facts, dates, amounts, parties, legal bases and open questions; drop "
+    "pleasantries. Reply with the summary only."
+)
+
+
+def build_summary_prompt(summary: Optional[str], turns: List[Dict], max_tokens: int) -> str:
+    lines = [SUMMARY_INSTRUCTIONS.format(words=max_tokens * 3 // 4), ""]
+    lines.append(f"Existing summary: {summary or '(none)'}")
+    lines.append("")
+    lines.append("New turns:")
+    for turn in turns:
+        text = " ".join(p if isinstance(p, str) else p.get("text", "") for p in turn.get("parts", []))
+        lines.append(f"{turn.get('role', 'user')}: {text}")
+    return "\n".join(lines)
+
+
+class ContextSummarizer:
+    def __init__(
+        self,
+        store: ContextStore,
+        gemini: GeminiService,
+        budget_tokens: int = 3000,
+        summary_tokens: int = 400,
+        max_pending: int = 1000,
+    ):
+        self.store = store
+        self.gemini = gemini
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.max_pending = max_pending
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {
+            "scheduled": 0,
+            "summarized": 0,
+            "turns_folded": 0,
+            "skipped": 0,
+            "failed": 0,
+            "dropped": 0,
+        }
+
+    def schedule_if_needed(self, session_id: str, stored_tokens: int) -> bool:
+        """
+        Queue `session_id` for summarization if its raw turns exceed the
+        budget. Never blocks; a session already queued is not queued twice.
+        """
+        if stored_tokens <= self.budget_tokens or session_id in self._pending:
+            return False
+        if len(self._pending) >= self.max_pending:
+            self.stats["dropped"] += 1
+            return False
+        self._pending.add(session_id)
+        self._queue.put_nowait(session_id)
+        self.stats["scheduled"] += 1
+        return True
+
+    async def summarize(self, session_id: str) -> bool:
+        """
+        Fold the oldest turns of one session into its summary. Returns
+        whether the stored context changed.
+        """
+        summary, raw_messages = await self.store.load(session_id)
+        turns = [decode_message(m) for m in raw_messages]
+
+        # Keep the newest turns that fit in half the budget; fold the rest
+        keep_budget = self.budget_tokens // 2
+        keep = 0
+        for turn in reversed(turns):
+            keep_budget -= message_tokens(turn)
+            if keep_budget < 0:
+                break
+            keep += 1
+        fold = len(turns) - keep
+        if fold == 0:
+            self.stats["skipped"] += 1
+            return False
+
+        prompt = build_summary_prompt(summary, turns[:fold], self.summary_tokens)
+        new_summary = await self.gemini.generate(prompt)
+        if new_summary in FALLBACK_REPLIES:
+            self.stats["failed"] += 1
+            return False
+        # The model doesn't always respect the word limit
+        new_summary = new_summary.strip()[: self.summary_tokens * CHARS_PER_TOKEN]
+
+        if not await self.store.fold_into_summary(session_id, raw_messages[:fold], new_summary):
+            self.stats["skipped"] += 1
+            return False
+        self.stats["summarized"] += 1
+        self.stats["turns_folded"] += fold
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            session_id = await self._queue.get()
+            try:
+                await self.summarize(session_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Context summarization failed for session {session_id}: {e}")
+            finally:
+                self._pending.discard(session_id)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+context_summarizer = ContextSummarizer(
+    context_store,
+    gemini_service,
+    budget_tokens=settings.ai_context_budget_tokens,
+    summary_tokens=settings.ai_context_summary_tokens,
+)
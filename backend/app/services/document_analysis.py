@@ -0,0 +1,411 @@
+"""
+Map-reduce analysis of case documents.
+
+    extract text (threadpool) -> token-bounded chunks
+    -> map: every chunk summarised concurrently, bounded by a semaphore
+    -> reduce: partial summaries merged in groups that fit one prompt,
+       repeatedly, until a single final analysis remains
+
+Text is PII-sanitized before it leaves the backend. The result is stored
+encrypted on DocumentAnalysis, so repeat views cost nothing, and a
+document whose content hash was already analysed by the same model reuses
+that result without any model call.
+
+Jobs run as background tasks in the worker that accepted them and write
+progress (chunks_done / chunks_total) to the row, so any worker can answer
+polls. A job whose row stops moving for `stale_seconds` (e.g. its worker
+restarted) is started again on the next request.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import re
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, List, Optional
+from xml.etree import ElementTree
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.encryption import encryption_service
+from app.core.pii import sanitize_pii
+from app.core.tokens import CHARS_PER_TOKEN
+from app.db.models import Document, DocumentAnalysis
+from app.services.gemini import FALLBACK_REPLIES, GeminiService, gemini_service
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT = (
+    "You are assisting a Polish lawyer. Below is part {part} of {parts} of a legal document. "
+    "Summarise this part in the document's language: parties, claims and amounts, dates and "
+    "deadlines, legal bases cited, and anything unusual. Be concise; do not speculate about "
+    "other parts.\n\n{text}"
+)
+REDUCE_PROMPT = (
+    "Below are summaries of consecutive parts of one legal document. Merge them into a single "
+    "summary that keeps every party, amount, date, deadline and legal basis.\n\n{text}"
+)
+FINAL_PROMPT = (
+    "You are assisting a Polish lawyer. Using the document (or the summaries of its parts) "
+    "below, write an analysis in the document's language with these sections: Summary, "
+    "Parties, Key dates and deadlines, Legal basis, Risks and recommended actions.\n\n{text}"
+)
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+class DocumentAnalysisError(Exception):
+    pass
+
+
+def _pypdf_available() -> bool:
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _HTMLText(HTMLParser):
+    _SKIP = {"script", "style", "head"}
+    _BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skipping += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Older Polish documents are often Windows-1250
+        return data.decode("cp1250", errors="replace")
+
+
+def _docx_text(data: bytes, max_bytes: Optional[int] = None) -> str:
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            member = archive.getinfo("word/document.xml")
+            # A few KB of deflate can unpack to gigabytes; reads stop at the declared size
+            if max_bytes is not None and member.file_size > max_bytes:
+                raise DocumentAnalysisError(f"Document text exceeds {max_bytes} bytes unpacked")
+            root = ElementTree.fromstring(archive.read(member))
+    except (KeyError, zipfile.BadZipFile) as e:
+        raise DocumentAnalysisError(f"Not a valid .docx file: {e}")
+    paragraphs = ("".join(t.text or "" for t in p.iter(f"{_WORD_NS}t")) for p in root.iter(f"{_WORD_NS}p"))
+    return "\n\n".join(p for p in paragraphs if p.strip())
+
+
+def _pdf_text(data: bytes) -> str:
+    if not _pypdf_available():
+        raise DocumentAnalysisError("PDF analysis requires the optional `pypdf` package")
+    import pypdf
+
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def extract_text(path: str, content_type: Optional[str] = None, filename: str = "", max_bytes: Optional[int] = None) -> str:
+    """
+    Plain text of a stored document. Blocking; run it in the threadpool.
+
+    With `max_bytes`, a larger file (or .docx body once unpacked) is
+    rejected before it is read into memory.
+    """
+    if max_bytes is not None and os.path.getsize(path) > max_bytes:
+        raise DocumentAnalysisError(f"Document exceeds {max_bytes} bytes")
+    with open(path, "rb") as f:
+        data = f.read()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+    if content_type == "application/pdf" or extension == "pdf":
+        return _pdf_text(data)
+    if content_type.endswith("wordprocessingml.document") or extension == "docx":
+        return _docx_text(data, max_bytes)
+    if content_type == "text/html" or extension in ("html", "htm"):
+        parser = _HTMLText()
+        parser.feed(_decode(data))
+        return "".join(parser.parts)
+    if content_type.startswith("text/") or extension in ("txt", "md", "csv"):
+        return _decode(data)
+    raise DocumentAnalysisError(f"Unsupported document type: {content_type or extension or 'unknown'}")
+
+
+def _split_long(paragraph: str, max_chars: int) -> List[str]:
+    if len(paragraph) <= max_chars:
+        return [paragraph]
+    pieces: List[str] = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?;:])\s+", paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Pack paragraphs (then sentences, then raw slices for pathological
+    input) into chunks of at most `max_tokens` estimated tokens.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = re.sub(r"[ \t]+", " ", paragraph).strip()
+        if not paragraph:
+            continue
+        for piece in _split_long(paragraph, max_chars):
+            if current and size + 2 + len(piece) > max_chars:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _group(partials: List[str], max_chars: int) -> List[List[str]]:
+    # At least two per group so every reduce round shrinks the list
+    groups: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for partial in partials:
+        if len(current) >= 2 and size + len(partial) > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(partial)
+        size += len(partial) + 2
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+
+class DocumentAnalyzer:
+    def __init__(
+        self,
+        gemini: GeminiService,
+        chunk_tokens: int = 2000,
+        max_concurrency: int = 4,
+        max_chars: int = 2_000_000,
+        stale_seconds: int = 900,
+        max_bytes: Optional[int] = None,
+    ):
+        self.gemini = gemini
+        self.chunk_tokens = chunk_tokens
+        self.max_chars = max_chars
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        # Shared by all jobs in this worker, so analyses can't crowd out chat
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[uuid.UUID, asyncio.Task] = {}
+
+    async def _complete(self, prompt: str) -> str:
+        async with self._semaphore:
+            text = await self.gemini.generate(prompt)
+        if text in FALLBACK_REPLIES:
+            raise DocumentAnalysisError(text)
+        return text.strip()
+
+    async def analyze_text(self, text: str, on_progress: Optional[ProgressCallback] = None) -> str:
+        """
+        The map-reduce pipeline on already extracted text.
+        """
+        chunks = split_into_chunks(sanitize_pii(text), self.chunk_tokens)
+        if not chunks:
+            raise DocumentAnalysisError("Document contains no text")
+        if on_progress:
+            await on_progress(0, len(chunks))
+        if len(chunks) == 1:
+            analysis = await self._complete(FINAL_PROMPT.format(text=chunks[0]))
+            if on_progress:
+                await on_progress(1, 1)
+            return analysis
+
+        done = 0
+
+        async def map_chunk(i: int, chunk: str) -> str:
+            nonlocal done
+            summary = await self._complete(MAP_PROMPT.format(part=i + 1, parts=len(chunks), text=chunk))
+            done += 1
+            if on_progress:
+                await on_progress(done, len(chunks))
+            return summary
+
+        partials = list(await asyncio.gather(*(map_chunk(i, c) for i, c in enumerate(chunks))))
+
+        max_chars = self.chunk_tokens * CHARS_PER_TOKEN
+        while True:
+            groups = _group(partials, max_chars)
+            if len(groups) == 1:
+                return await self._complete(FINAL_PROMPT.format(text="\n\n".join(groups[0])))
+            partials = list(await asyncio.gather(
+                *(self._complete(REDUCE_PROMPT.format(text="\n\n".join(g))) for g in groups)
+            ))
+
+    async def _update(self, session_factory: Callable[[], AsyncSession], analysis_id: uuid.UUID, **values) -> None:
+        async with session_factory() as session:
+            await session.execute(update(DocumentAnalysis).where(DocumentAnalysis.id == analysis_id).values(**values))
+            await session.commit()
+
+    async def _run(self, session_factory: Callable[[], AsyncSession], analysis_id: uuid.UUID, document_id: uuid.UUID) -> None:
+        try:
+            async with session_factory() as session:
+                document = await session.get(Document, document_id)
+            if document is None:
+                raise DocumentAnalysisError("Document not found")
+            await self._update(session_factory, analysis_id, status="RUNNING")
+
+            text = await run_in_threadpool(
+                extract_text, document.file_url, document.content_type, document.filename, self.max_bytes
+            )
+            if len(text) > self.max_chars:
+                raise DocumentAnalysisError(f"Document text exceeds {self.max_chars} characters")
+
+            async def progress(done: int, total: int) -> None:
+                await self._update(session_factory, analysis_id, chunks_done=done, chunks_total=total)
+
+            analysis = await self.analyze_text(text, on_progress=progress)
+            await self._update(
+                session_factory,
+                analysis_id,
+                status="COMPLETED",
+                summary_enc=encryption_service.encrypt(analysis),
+                error=None,
+                completed_at=datetime.now(timezone.utc),
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Analysis of document {document_id} failed")
+            detail = str(e) if isinstance(e, (DocumentAnalysisError, OSError)) else type(e).__name__
+            await self._update(session_factory, analysis_id, status="FAILED", error=detail[:500])
+        finally:
+            self._tasks.pop(document_id, None)
+
+    def is_running(self, document_id: uuid.UUID) -> bool:
+        task = self._tasks.get(document_id)
+        return task is not None and not task.done()
+
+    def _is_stale(self, analysis: DocumentAnalysis) -> bool:
+        updated_at = analysis.updated_at or analysis.created_at
+        if updated_at is None:
+            return False
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - updated_at > timedelta(seconds=self.stale_seconds)
+
+    async def request(
+        self, db: AsyncSession, document: Document, session_factory: Callable[[], AsyncSession]
+    ) -> DocumentAnalysis:
+        """
+        Return the document's analysis, starting a background job when there
+        is no usable one. Never waits for the model.
+        """
+        result = await db.execute(select(DocumentAnalysis).where(DocumentAnalysis.document_id == document.id))
+        analysis = result.scalar_one_or_none()
+        if analysis is not None and analysis.model == self.gemini.model:
+            if analysis.status == "COMPLETED":
+                return analysis
+            if analysis.status in ("PENDING", "RUNNING") and (self.is_running(document.id) or not self._is_stale(analysis)):
+                return analysis
+
+        reusable = None
+        if document.content_hash:
+            result = await db.execute(
+                select(DocumentAnalysis)
+                .where(
+                    DocumentAnalysis.content_hash == document.content_hash,
+                    DocumentAnalysis.model == self.gemini.model,
+                    DocumentAnalysis.status == "COMPLETED",
+                )
+                .limit(1)
+            )
+            reusable = result.scalar_one_or_none()
+
+        if analysis is None:
+            analysis = DocumentAnalysis(document_id=document.id)
+            db.add(analysis)
+        analysis.content_hash = document.content_hash
+        analysis.model = self.gemini.model
+        analysis.error = None
+        if reusable is not None:
+            analysis.status = "COMPLETED"
+            analysis.summary_enc = reusable.summary_enc
+            analysis.chunks_total = analysis.chunks_done = reusable.chunks_total
+            analysis.completed_at = datetime.now(timezone.utc)
+        else:
+            analysis.status = "PENDING"
+            analysis.summary_enc = None
+            analysis.chunks_total = analysis.chunks_done = 0
+            analysis.completed_at = None
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Another request created the row first; report that one
+            await db.rollback()
+            result = await db.execute(select(DocumentAnalysis).where(DocumentAnalysis.document_id == document.id))
+            return result.scalar_one()
+        await db.refresh(analysis)
+
+        if analysis.status == "PENDING":
+            self._tasks[document.id] = asyncio.create_task(self._run(session_factory, analysis.id, document.id))
+        return analysis
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+document_analyzer = DocumentAnalyzer(
+    gemini_service,
+    chunk_tokens=settings.document_analysis_chunk_tokens,
+    max_concurrency=settings.document_analysis_concurrency,
+    max_chars=settings.document_analysis_max_chars,
+    stale_seconds=settings.document_analysis_stale_seconds,
+    max_bytes=settings.document_analysis_max_bytes,
+)
@@ -0,0 +1,178 @@
+"""
+Retrieval over a case's documents for grounded AI answers.
+
+Indexing runs in the background after an upload (or in bulk via
+`python -m app.jobs.index_documents`): extract text, PII-sanitize, split
+into ~RAG_CHUNK_TOKENS passages, embed, and append the vectors to the
+case's VectorIndex. Passage text goes to document_chunk, encrypted and
+keyed by vector row; re-indexing a document retires its old rows.
+Background indexing runs at most RAG_INDEX_CONCURRENCY documents at a
+time, and documents over the DOCUMENT_ANALYSIS_MAX_BYTES /
+DOCUMENT_ANALYSIS_MAX_CHARS limits are skipped.
+
+At query time the prompt is embedded, the case index searched in the
+threadpool, and the best passages above RAG_MIN_SCORE prepended to the
+prompt, so users can ask about their files instead of pasting them.
+"""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.encryption import encryption_service
+from app.core.pii import sanitize_pii
+from app.db.models import Document, DocumentChunk
+from app.services.document_analysis import DocumentAnalysisError, extract_text, split_into_chunks
+from app.services.embeddings import get_embedder
+from app.services.vector_index import VectorIndex, VectorIndexStore, vector_index_store
+
+logger = logging.getLogger(__name__)
+
+GROUNDING_PREAMBLE = (
+    "Excerpts from the user's case documents follow. Use them where relevant, cite them by "
+    "document name, and say so if they do not answer the question."
+)
+
+
+@dataclass
+class Passage:
+    document_id: uuid.UUID
+    filename: str
+    text: str
+    score: float
+
+
+def build_grounded_prompt(prompt: str, passages: List[Passage]) -> str:
+    if not passages:
+        return prompt
+    excerpts = "\n\n".join(f"[{i}] {p.filename}:\n{p.text}" for i, p in enumerate(passages, 1))
+    return f"{GROUNDING_PREAMBLE}\n\n{excerpts}\n\nQuestion: {prompt}"
+
+
+class DocumentIndexer:
+    def __init__(
+        self,
+        embedder,
+        store: VectorIndexStore,
+        chunk_tokens: int = 250,
+        top_k: int = 4,
+        min_score: float = 0.2,
+        max_concurrency: int = 2,
+        max_bytes: Optional[int] = None,
+        max_chars: Optional[int] = None,
+    ):
+        self.embedder = embedder
+        self.store = store
+        self.chunk_tokens = chunk_tokens
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        # Uploads queue here instead of each extracting and embedding at once
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[uuid.UUID, asyncio.Task] = {}
+
+    def index_for(self, case_id: uuid.UUID) -> VectorIndex:
+        return self.store.get(str(case_id), self.embedder.dim, self.embedder.name)
+
+    async def index_document(self, session_factory: Callable[[], AsyncSession], document: Document) -> int:
+        """
+        (Re)index one document; returns the number of passages stored.
+        """
+        if self.max_bytes is not None and (document.size_bytes or 0) > self.max_bytes:
+            raise DocumentAnalysisError(f"Document exceeds {self.max_bytes} bytes")
+        text = await run_in_threadpool(
+            extract_text, document.file_url, document.content_type, document.filename, self.max_bytes
+        )
+        if self.max_chars is not None and len(text) > self.max_chars:
+            raise DocumentAnalysisError(f"Document text exceeds {self.max_chars} characters")
+        passages = split_into_chunks(sanitize_pii(text), self.chunk_tokens)
+        index = self.index_for(document.case_id)
+        vectors = await self.embedder.embed(passages) if passages else None
+
+        async with session_factory() as session:
+            result = await session.execute(
+                select(DocumentChunk.vector_row).where(DocumentChunk.document_id == document.id)
+            )
+            old_rows = list(result.scalars().all())
+            rows = await run_in_threadpool(index.add, vectors) if passages else []
+            await session.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document.id))
+            session.add_all(
+                DocumentChunk(
+                    document_id=document.id,
+                    case_id=document.case_id,
+                    ordinal=i,
+                    vector_row=row,
+                    text_enc=encryption_service.encrypt(passage),
+                )
+                for i, (row, passage) in enumerate(zip(rows, passages))
+            )
+            await session.commit()
+        # Only retire the old rows once the new ones are committed
+        await run_in_threadpool(index.remove, old_rows)
+        return len(passages)
+
+    async def _run(self, session_factory: Callable[[], AsyncSession], document: Document) -> None:
+        try:
+            async with self._semaphore:
+                count = await self.index_document(session_factory, document)
+            logger.info(f"Indexed document {document.id}: {count} passages")
+        except DocumentAnalysisError as e:
+            logger.info(f"Document {document.id} not indexed: {e}")
+        except Exception:
+            logger.exception(f"Indexing document {document.id} failed")
+        finally:
+            self._tasks.pop(document.id, None)
+
+    def schedule(self, session_factory: Callable[[], AsyncSession], document: Document) -> None:
+        """
+        Index `document` in the background. Never waits.
+        """
+        self._tasks[document.id] = asyncio.create_task(self._run(session_factory, document))
+
+    async def retrieve(self, db: AsyncSession, case_id: uuid.UUID, query: str, k: Optional[int] = None) -> List[Passage]:
+        """
+        The case's passages most similar to `query`, best first.
+        """
+        index = self.index_for(case_id)
+        query_vector = (await self.embedder.embed([query]))[0]
+        hits = await run_in_threadpool(index.search, query_vector, k or self.top_k)
+        scores = {row: score for row, score in hits if score >= self.min_score}
+        if not scores:
+            return []
+
+        result = await db.execute(
+            select(DocumentChunk.vector_row, DocumentChunk.document_id, DocumentChunk.text_enc, Document.filename)
+            .join(Document, DocumentChunk.document_id == Document.id)
+            .where(DocumentChunk.case_id == case_id, DocumentChunk.vector_row.in_(list(scores)))
+        )
+        passages = [
+            Passage(document_id=document_id, filename=filename, text=encryption_service.decrypt(text_enc) or "", score=scores[row])
+            for row, document_id, text_enc, filename in result.all()
+        ]
+        return sorted(passages, key=lambda p: p.score, reverse=True)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+document_indexer = DocumentIndexer(
+    get_embedder(),
+    vector_index_store,
+    chunk_tokens=settings.rag_chunk_tokens,
+    top_k=settings.rag_top_k,
+    min_score=settings.rag_min_score,
+    max_concurrency=settings.rag_index_concurrency,
+    max_bytes=settings.document_analysis_max_bytes,
+    max_chars=settings.document_analysis_max_chars,
+)
@@ -0,0 +1,82 @@
+"""
+Text embedders for the document vector index.
+
+An embedder has a `name` (stored with each index, so vectors from
+different embedders are never mixed), a fixed `dim`, and an async
+`embed(texts)` returning a float32 (len(texts), dim) array with
+L2-normalised rows, so cosine similarity is a dot product.
+
+- "hashing": deterministic local feature hashing of word unigrams and
+  bigrams. No network, no model, stable across processes; lexical rather
+  than semantic. The default, and what tests use.
+- "gemini": the Gemini embedding API (text-embedding-004, 768 dims).
+"""
+
+import hashlib
+import re
+from typing import List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.gemini import GeminiService, gemini_service
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                # The sign bit keeps colliding features from only ever adding up
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return normalize_rows(vectors)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if len(texts) == 1:
+            return self.embed_sync(texts)
+        return await run_in_threadpool(self.embed_sync, texts)
+
+
+class GeminiEmbedder:
+    def __init__(self, gemini: GeminiService, model: str = "text-embedding-004", dim: int = 768, batch_size: int = 100):
+        self.gemini = gemini
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size  # API limit per batchEmbedContents call
+        self.name = f"gemini-{model}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(await self.gemini.embed(texts[start:start + self.batch_size], model=self.model))
+        if not vectors:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return normalize_rows(np.array(vectors, dtype=np.float32))
+
+
+def get_embedder(backend: Optional[str] = None):
+    backend = backend or settings.embedding_backend
+    if backend == "hashing":
+        return HashingEmbedder(settings.embedding_dim)
+    if backend == "gemini":
+        return GeminiEmbedder(gemini_service, model=settings.embedding_model)
+    raise ValueError(f"Unknown embedding backend: {backend}")
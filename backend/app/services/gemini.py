@@ -1,69 +1,362 @@
-import requests
+import asyncio
+import json
 import logging
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Returned by GeminiService.generate instead of raising; never worth caching
+NOT_CONFIGURED_REPLY = "Gemini API key is not configured."
+ERROR_REPLY = "Error calling Gemini API."
+EMPTY_REPLY = "No response generated."
+UNAVAILABLE_REPLY = "The AI service is temporarily unavailable. Please try again in a moment."
+FALLBACK_REPLIES = frozenset({NOT_CONFIGURED_REPLY, ERROR_REPLY, EMPTY_REPLY, UNAVAILABLE_REPLY})
+
+_STREAM_END = object()
+
+
+class GeminiError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_contents(prompt: str, context: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Convert ContextStore messages ({"role": ..., "parts": ["text", ...]}) plus
+    the new prompt into the API's `contents` list.
+    """
+    contents = []
+    for item in context or []:
+        parts = []
+        for p in item.get("parts", []):
+            if isinstance(p, str):
+                parts.append({"text": p})
+            elif isinstance(p, dict) and "text" in p:
+                parts.append(p)
+        role = item.get("role", "user")
+        if role == "assistant":
+            role = "model"
+        contents.append({"role": role, "parts": parts})
+    contents.append({"role": "user", "parts": [{"text": prompt}]})
+    return contents
+
+
+def extract_text(data: Dict[str, Any]) -> Optional[str]:
+    # candidates[0].content.parts[*].text
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return None
+    content = candidates[0].get("content") or {}
+    if "parts" not in content:
+        return None
+    return "".join(p.get("text", "") for p in content["parts"])
+
+
 class GeminiService:
-    def __init__(self, api_key: str):
+    """
+    Async Gemini client. One pooled httpx.AsyncClient per worker (HTTP/2
+    when `h2` is installed), a semaphore bounding in-flight requests, and
+    retries with full-jitter backoff on 429/5xx and transport errors.
+
+    Every attempt goes through a CircuitBreaker: while it is open, calls
+    fail fast with CircuitOpenError instead of queueing behind a degraded
+    upstream. With `hedge_percentile` set, a non-streaming attempt that has
+    not answered by that latency percentile gets a second, identical
+    request, and whichever answers first wins.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-1.5-flash",
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta",
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_concurrency: int = 16,
+        max_connections: int = 32,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        http2: bool = True,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_delay: float = 1.0,
+        stream_timeout: Optional[float] = 120.0,
+    ):
         self.api_key = api_key
-        # Default model
-        self.model = "gemini-1.5-flash" 
-        self.url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/models/{self.model}:generateContent"
+        self.stream_url = f"{self.base_url}/models/{self.model}:streamGenerateContent"
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.http2 = http2 and transport is None and _http2_available()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.breaker = breaker if breaker is not None else CircuitBreaker("gemini")
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.stream_timeout = stream_timeout
+        self.stats = {"hedged": 0, "hedge_wins": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self._transport,
+                headers={"Content-Type": "application/json"},
+            )
+        return self._client
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _backoff_or_raise(self, attempt: int, error: GeminiError, retry_after: Optional[str] = None) -> None:
+        if attempt == self.max_retries:
+            raise error
+        delay = self._backoff(attempt, retry_after)
+        logger.warning(f"Gemini request failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
 
-    def generate(self, prompt: str, context: list = None) -> str:
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        latency = self.breaker.latency_percentile(self.hedge_percentile)
+        return None if latency is None else max(latency, self.hedge_min_delay)
+
+    async def _send(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        """
+        One attempt, hedged once the deadline from recent latencies passes.
+        """
+        send = lambda: self.client.post(url, params={"key": self.api_key}, json=payload)  # noqa: E731
+        delay = self._hedge_delay()
+        if delay is None:
+            return await send()
+
+        primary = asyncio.ensure_future(send())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.stats["hedged"] += 1
+                tasks.add(asyncio.ensure_future(send()))
+            # First successful response wins; an error only counts once both have failed
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                if not pending:
+                    raise done.pop().exception()
+                tasks = pending
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _post(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POST `payload` and return the decoded body. Raises GeminiError once
+        retries are exhausted or on a non-retryable status, and
+        CircuitOpenError while the breaker is open.
+        """
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                self.breaker.acquire()
+                retry_after = None
+                started = time.monotonic()
+                try:
+                    response = await self._send(url, payload)
+                except httpx.TransportError as e:
+                    self.breaker.record_failure()
+                    error = GeminiError(f"{type(e).__name__}: {e}")
+                except BaseException:
+                    self.breaker.release()
+                    raise
+                else:
+                    if response.status_code < 400:
+                        self.breaker.record_success(time.monotonic() - started)
+                        return response.json()
+                    error = GeminiError(f"HTTP {response.status_code}", status_code=response.status_code)
+                    if response.status_code not in RETRYABLE_STATUS:
+                        self.breaker.release()
+                        raise error
+                    self.breaker.record_failure()
+                    retry_after = response.headers.get("Retry-After")
+                await self._backoff_or_raise(attempt, error, retry_after)
+
+    async def generate_content(self, contents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        POST :generateContent and return the decoded body.
+        """
+        return await self._post(self.url, {"contents": contents})
+
+    async def embed(self, texts: List[str], model: str = "text-embedding-004") -> List[List[float]]:
+        """
+        POST :batchEmbedContents; one vector per text, in order.
+        """
+        payload = {
+            "requests": [{"model": f"models/{model}", "content": {"parts": [{"text": t}]}} for t in texts]
+        }
+        data = await self._post(f"{self.base_url}/models/{model}:batchEmbedContents", payload)
+        return [e["values"] for e in data.get("embeddings", [])]
+
+    async def stream_generate_content(self, contents: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """
+        POST :streamGenerateContent?alt=sse and yield text deltas as they
+        arrive. Retries like generate_content, but only until the first
+        chunk has arrived; after that a failure raises GeminiError.
+        Time to the first chunk is what the breaker counts as latency.
+
+        The upstream response is read by a separate task into a buffer
+        (text only, a few KB), so the concurrency slot is held for as long
+        as upstream takes, at most `stream_timeout`, however slowly the
+        caller consumes the chunks.
+        """
+        chunks: asyncio.Queue = asyncio.Queue()
+        pump = asyncio.create_task(self._pump_stream(contents, chunks))
+        try:
+            while (chunk := await chunks.get()) is not _STREAM_END:
+                yield chunk
+            await pump
+        finally:
+            if not pump.done():
+                # Consumer went away: stop reading upstream and free the slot
+                pump.cancel()
+                await asyncio.gather(pump, return_exceptions=True)
+
+    async def _pump_stream(self, contents: List[Dict[str, Any]], chunks: asyncio.Queue) -> None:
+        try:
+            async with asyncio.timeout(self.stream_timeout):
+                await self._read_stream(contents, chunks)
+        except TimeoutError as e:
+            raise GeminiError(f"Stream did not finish within {self.stream_timeout}s") from e
+        finally:
+            chunks.put_nowait(_STREAM_END)
+
+    async def _read_stream(self, contents: List[Dict[str, Any]], chunks: asyncio.Queue) -> None:
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                self.breaker.acquire()
+                retry_after = None
+                started = time.monotonic()
+                first_chunk_after = None
+                try:
+                    async with self.client.stream(
+                        "POST", self.stream_url, params={"key": self.api_key, "alt": "sse"}, json={"contents": contents}
+                    ) as response:
+                        if response.status_code < 400:
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                text = extract_text(json.loads(line[5:]))
+                                if text:
+                                    if first_chunk_after is None:
+                                        first_chunk_after = time.monotonic() - started
+                                    chunks.put_nowait(text)
+                            self.breaker.record_success(
+                                first_chunk_after if first_chunk_after is not None else time.monotonic() - started
+                            )
+                            return
+                        error = GeminiError(f"HTTP {response.status_code}", status_code=response.status_code)
+                        if response.status_code not in RETRYABLE_STATUS:
+                            raise error
+                        retry_after = response.headers.get("Retry-After")
+                except (httpx.TransportError, ValueError) as e:
+                    # Connection dropped, or a data line that is not JSON
+                    self.breaker.record_failure()
+                    error = GeminiError(f"{type(e).__name__}: {e}")
+                    if first_chunk_after is not None:
+                        raise error from e
+                except BaseException:
+                    # Client errors, cancellation (consumer gone, stream timeout)
+                    self.breaker.release()
+                    raise
+                else:
+                    self.breaker.record_failure()
+                await self._backoff_or_raise(attempt, error, retry_after)
+
+    async def generate(self, prompt: str, context: list = None) -> str:
         if not self.api_key:
-            return "Gemini API key is not configured."
-
-        messages = []
-        if context:
-            # Context is expected to be list of {"role": "user"/"model", "parts": ["text"]}
-            # But the stored format in ContextStore is {"role": "...", "parts": ["..."]}
-            # We need to adapt if needed. Assuming context store saves compatible format.
-            # But wait, ContextStore saves `{"role": role, "parts": [text]}` which is not quite Google format (parts object list).
-            # Google format: `{"role": "user", "parts": [{"text": "Hello"}]}`.
-            # Let's fix ContextStore format in this service or assume simple format.
-            
-            # Let's adjust to be safe: context items are dictionaries.
-            for item in context:
-                # If item['parts'] is list of strings, convert to list of dicts for API
-                parts = []
-                for p in item.get('parts', []):
-                    if isinstance(p, str):
-                        parts.append({"text": p})
-                    elif isinstance(p, dict) and 'text' in p:
-                        parts.append(p)
-                
-                role = item.get('role', 'user')
-                # Map 'assistant' to 'model' just in case
-                if role == 'assistant':
-                    role = 'model'
-                    
-                messages.append({"role": role, "parts": parts})
-
-        # Add current prompt
-        messages.append({"role": "user", "parts": [{"text": prompt}]})
+            return NOT_CONFIGURED_REPLY
 
         try:
-            response = requests.post(
-                self.url,
-                headers={"Content-Type": "application/json"},
-                params={"key": self.api_key},
-                json={"contents": messages}
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extract text
-            # Response: candidates[0].content.parts[0].text
-            if 'candidates' in data and data['candidates']:
-                candidate = data['candidates'][0]
-                if 'content' in candidate and 'parts' in candidate['content']:
-                    parts = candidate['content']['parts']
-                    text = "".join([p.get('text', '') for p in parts])
-                    return text
-            
-            return "No response generated."
-
-        except Exception as e:
+            data = await self.generate_content(build_contents(prompt, context))
+        except CircuitOpenError as e:
+            logger.info(f"Gemini call skipped: {e}")
+            return UNAVAILABLE_REPLY
+        except (GeminiError, ValueError) as e:
             logger.error(f"Gemini API error: {e}")
-            return "Error calling Gemini API."
+            return ERROR_REPLY
+
+        text = extract_text(data)
+        return text if text is not None else EMPTY_REPLY
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.get_stats(), "hedging": dict(self.stats)}
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+gemini_service = GeminiService(
+    settings.gemini_api_key,
+    model=settings.gemini_model,
+    base_url=settings.gemini_base_url,
+    connect_timeout=settings.gemini_connect_timeout,
+    read_timeout=settings.gemini_read_timeout,
+    max_concurrency=settings.gemini_max_concurrency,
+    max_connections=settings.gemini_max_connections,
+    max_retries=settings.gemini_max_retries,
+    backoff_base=settings.gemini_backoff_base,
+    backoff_max=settings.gemini_backoff_max,
+    http2=settings.gemini_http2,
+    breaker=CircuitBreaker(
+        "gemini",
+        window=settings.gemini_breaker_window,
+        min_calls=settings.gemini_breaker_min_calls,
+        failure_rate=settings.gemini_breaker_failure_rate,
+        slow_call_seconds=settings.gemini_breaker_slow_call_seconds,
+        slow_call_rate=settings.gemini_breaker_slow_call_rate,
+        open_seconds=settings.gemini_breaker_open_seconds,
+        half_open_calls=settings.gemini_breaker_half_open_calls,
+    ),
+    hedge_percentile=settings.gemini_hedge_percentile,
+    hedge_min_delay=settings.gemini_hedge_min_delay,
+    stream_timeout=settings.gemini_stream_timeout,
+)
@@ -0,0 +1,352 @@
+"""
+Authenticated-principal cache used by deps.get_current_user.
+
+Two tiers keyed by user id:
+- in-process LRU with a short TTL (no I/O on the hot path)
+- Redis, shared by all workers
+
+Entries are plain column snapshots (never ORM instances) so they can be
+shared safely between requests. Writes that change a user call
+`invalidate`, which drops the local entry, deletes the Redis key and
+publishes the id so every other worker evicts its local copy too.
+
+A reader that misses takes `generation(user_id)` before loading the user
+and passes it to `set`. `invalidate` bumps the generation (a local counter
+and a Redis counter), so a snapshot read before an update can never be
+cached after that update's invalidation, in this worker or in Redis.
+
+After a Redis connection failure the shared tier is skipped for
+`redis_backoff` seconds instead of retrying (and logging) on every request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+from sqlalchemy import DateTime, LargeBinary
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.db.models import User, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Never cache credentials; change_password loads the hash explicitly.
+_EXCLUDED_USER_COLUMNS = {"password_hash"}
+
+# KEYS: entry key, generation key
+# ARGV: generation seen by the reader, ttl s, snapshot json
+SET_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[2])
+return 1
+"""
+
+
+def _dump_row(obj: Any, exclude: set = frozenset()) -> Dict[str, Any]:
+    data = {}
+    for column in obj.__table__.columns:
+        if column.key in exclude:
+            continue
+        value = getattr(obj, column.key)
+        if isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, bytes):
+            value = base64.b64encode(value).decode()
+        data[column.key] = value
+    return data
+
+
+def _load_row(model: Any, data: Dict[str, Any]) -> Any:
+    values = {}
+    for column in model.__table__.columns:
+        if column.key not in data:
+            continue
+        value = data[column.key]
+        if value is not None:
+            if isinstance(column.type, UUID):
+                value = uuid.UUID(value)
+            elif isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, LargeBinary):
+                value = base64.b64decode(value)
+        values[column.key] = value
+    obj = model(**values)
+    # Detached (not transient): session.add() issues UPDATEs, never INSERTs
+    make_transient_to_detached(obj)
+    return obj
+
+
+def snapshot_user(user: User) -> Dict[str, Any]:
+    profile = user.profile
+    return {
+        "user": _dump_row(user, exclude=_EXCLUDED_USER_COLUMNS),
+        "profile": _dump_row(profile) if profile is not None else None,
+    }
+
+
+def user_from_snapshot(snapshot: Dict[str, Any]) -> User:
+    user = _load_row(User, snapshot["user"])
+    profile = _load_row(UserProfile, snapshot["profile"]) if snapshot["profile"] else None
+    set_committed_value(user, "profile", profile)
+    if profile is not None:
+        set_committed_value(profile, "user", user)
+    return user
+
+
+class PrincipalCache:
+    def __init__(
+        self,
+        redis_url: Optional[str],
+        enabled: bool = True,
+        local_ttl: int = 30,
+        redis_ttl: int = 300,
+        max_entries: int = 10000,
+        channel: str = "principal:invalidate",
+        redis_backoff: int = 30,
+    ):
+        self.enabled = enabled
+        self.redis: Optional[redis.Redis] = None
+        if enabled and redis_url:
+            try:
+                self.redis = redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+            except Exception:
+                self.redis = None
+        self._set_script = self.redis.register_script(SET_SCRIPT) if self.redis else None
+        self.redis_backoff = redis_backoff
+        self._redis_retry_at = 0.0
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.max_entries = max_entries
+        self.channel = channel
+
+        self._local: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Per-key invalidation counters; the epoch bumps when they are dropped
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._listener: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+            "stale_sets": 0,
+            "redis_skipped": 0,
+        }
+
+    @staticmethod
+    def _key(user_id: Any) -> str:
+        return f"principal:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: Any) -> str:
+        return f"principal:gen:{user_id}"
+
+    def _redis_available(self) -> bool:
+        if not self.redis:
+            return False
+        if time.monotonic() < self._redis_retry_at:
+            self.stats["redis_skipped"] += 1
+            return False
+        return True
+
+    def _redis_failed(self, operation: str, e: Exception) -> None:
+        if isinstance(e, (RedisConnectionError, RedisTimeoutError, OSError)):
+            self._redis_retry_at = time.monotonic() + self.redis_backoff
+            logger.warning(
+                f"Redis unavailable in PrincipalCache.{operation} ({e}), "
+                f"using the local tier only for {self.redis_backoff}s"
+            )
+        else:
+            logger.warning(f"Redis error in PrincipalCache.{operation}: {e}")
+
+    def _bump_generation(self, key: str) -> None:
+        if len(self._generations) >= self.max_entries:
+            self._reset_generations()
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _reset_generations(self) -> None:
+        self._generations.clear()
+        self._epoch += 1
+
+    def _local_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if time.monotonic() >= expires_at:
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return snapshot
+
+    def _local_set(self, key: str, snapshot: Dict[str, Any]) -> None:
+        self._local[key] = (time.monotonic() + self.local_ttl, snapshot)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def get(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        key = self._key(user_id)
+        snapshot = self._local_get(key)
+        if snapshot is not None:
+            self.stats["local_hits"] += 1
+            return snapshot
+
+        if self._redis_available():
+            try:
+                raw = await self.redis.get(key)
+                if raw:
+                    snapshot = json.loads(raw)
+                    self._local_set(key, snapshot)
+                    self.stats["redis_hits"] += 1
+                    return snapshot
+            except Exception as e:
+                self._redis_failed("get", e)
+
+        self.stats["misses"] += 1
+        return None
+
+    def _local_generation(self, key: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(key, 0)
+
+    async def generation(self, user_id: Any) -> Tuple[int, int, int]:
+        """
+        Take before loading the user from the database; pass to `set`.
+        """
+        local = self._local_generation(self._key(user_id))
+        shared = 0
+        if self.enabled and self._redis_available():
+            try:
+                shared = int(await self.redis.get(self._generation_key(user_id)) or 0)
+            except Exception as e:
+                self._redis_failed("generation", e)
+        return (*local, shared)
+
+    async def set(
+        self,
+        user_id: Any,
+        snapshot: Dict[str, Any],
+        generation: Optional[Tuple[int, int, int]] = None,
+    ) -> None:
+        if not self.enabled:
+            return
+        key = self._key(user_id)
+        if generation is not None and generation[:2] != self._local_generation(key):
+            # Invalidated while the snapshot was being read
+            self.stats["stale_sets"] += 1
+            return
+        self._local_set(key, snapshot)
+        if self._redis_available():
+            try:
+                if generation is None:
+                    await self.redis.setex(key, self.redis_ttl, json.dumps(snapshot))
+                elif not await self._set_script(
+                    keys=[key, self._generation_key(user_id)],
+                    args=[generation[2], self.redis_ttl, json.dumps(snapshot)],
+                ):
+                    # Another worker invalidated it in the meantime
+                    self._local.pop(key, None)
+                    self.stats["stale_sets"] += 1
+            except Exception as e:
+                self._redis_failed("set", e)
+
+    async def invalidate(self, user_id: Any) -> None:
+        key = self._key(user_id)
+        self._local.pop(key, None)
+        self._bump_generation(key)
+        self.stats["invalidations"] += 1
+        if self.redis:
+            # Never skipped by the backoff: a missed delete leaves a stale entry
+            try:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.incr(self._generation_key(user_id))
+                    pipe.expire(self._generation_key(user_id), self.redis_ttl)
+                    pipe.delete(key)
+                    pipe.publish(self.channel, str(user_id))
+                    await pipe.execute()
+            except Exception as e:
+                self._redis_failed("invalidate", e)
+
+    def clear_local(self) -> None:
+        self._local.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats["local_hits"] + self.stats["redis_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self._local),
+        }
+
+    async def _listen(self) -> None:
+        # Evict local copies when another worker invalidates a principal
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    key = self._key(message["data"])
+                    self._bump_generation(key)
+                    if self._local.pop(key, None) is not None:
+                        self.stats["remote_invalidations"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"PrincipalCache listener error: {e}. Reconnecting...")
+                # Anything cached while disconnected may have missed an invalidation
+                self._local.clear()
+                self._reset_generations()
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def start(self) -> None:
+        if self.redis and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+principal_cache = PrincipalCache(
+    settings.redis_url,
+    enabled=settings.principal_cache_enabled,
+    local_ttl=settings.principal_cache_local_ttl,
+    redis_ttl=settings.principal_cache_redis_ttl,
+    max_entries=settings.principal_cache_max_entries,
+    redis_backoff=settings.principal_cache_redis_backoff,
+)
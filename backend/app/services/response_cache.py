@@ -0,0 +1,166 @@
+"""
+Exact-match cache for AI generations.
+
+Keys are a SHA-256 of (model, context window, sanitized prompt), so an
+answer is only reused for a byte-identical request. Values live in Redis
+with a TTL and are shared by all workers. Identical requests that arrive
+while the first is still waiting on the upstream are coalesced in-process
+onto that single call (single-flight), so a burst of the same FAQ prompt
+costs one Gemini request per worker. The shared call runs in its own task,
+so no single caller going away (client disconnect) cancels it for the
+others.
+
+Sessions can opt out (e.g. for privileged matters); their requests
+neither read nor populate the cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_OPT_OUT_TTL = 30 * 24 * 3600  # seconds
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # Every caller may have gone away; don't log the error as never retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+class ResponseCache:
+    def __init__(self, redis_url: Optional[str], enabled: bool = True, ttl: int = 86400):
+        self.enabled = enabled
+        self.redis: Optional[redis.Redis] = None
+        if enabled and redis_url:
+            try:
+                self.redis = redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+            except Exception:
+                self.redis = None
+        self.ttl = ttl
+
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "bypassed": 0,
+        }
+
+    @staticmethod
+    def make_key(model: str, prompt: str, context: Optional[List[Dict[str, Any]]] = None) -> str:
+        payload = json.dumps([model, context or [], prompt], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return "ai:response:" + hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _opt_out_key(session_id: str) -> str:
+        return f"ai:cache-optout:{session_id}"
+
+    async def lookup(self, key: str, session_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        Return (use_cache, cached_text) with one MGET: whether the session
+        allows caching, and the cached answer if there is one.
+        """
+        if not self.enabled:
+            return False, None
+        if not self.redis:
+            return True, None
+        try:
+            opted_out, cached = await self.redis.mget(self._opt_out_key(session_id), key)
+        except Exception as e:
+            logger.warning(f"Redis error in ResponseCache.lookup: {e}")
+            return True, None
+        if opted_out:
+            self.stats["bypassed"] += 1
+            return False, None
+        if cached is not None:
+            self.stats["hits"] += 1
+        return True, cached
+
+    async def store(self, key: str, text: str) -> None:
+        if self.redis:
+            try:
+                await self.redis.set(key, text, ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Redis error in ResponseCache.store: {e}")
+
+    async def get_or_generate(
+        self,
+        key: str,
+        session_id: str,
+        produce: Callable[[], Awaitable[str]],
+        cacheable: Callable[[str], bool] = lambda text: True,
+    ) -> str:
+        """
+        Serve `key` from the cache, join an identical in-flight call, or run
+        `produce` and cache its result when `cacheable(result)` holds.
+        """
+        use_cache, cached = await self.lookup(key, session_id)
+        if not use_cache:
+            return await produce()
+        if cached is not None:
+            return cached
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            pending = asyncio.create_task(self._produce(key, produce, cacheable))
+            pending.add_done_callback(_retrieve_exception)
+            self._in_flight[key] = pending
+        # Shielded: cancelling any caller, the first one included, leaves
+        # the shared call running for the rest
+        return await asyncio.shield(pending)
+
+    async def _produce(
+        self,
+        key: str,
+        produce: Callable[[], Awaitable[str]],
+        cacheable: Callable[[str], bool],
+    ) -> str:
+        try:
+            text = await produce()
+            if cacheable(text):
+                await self.store(key, text)
+            return text
+        finally:
+            del self._in_flight[key]
+
+    async def set_opt_out(self, session_id: str, opted_out: bool) -> None:
+        if not self.redis:
+            return
+        try:
+            if opted_out:
+                await self.redis.set(self._opt_out_key(session_id), "1", ex=_OPT_OUT_TTL)
+            else:
+                await self.redis.delete(self._opt_out_key(session_id))
+        except Exception as e:
+            logger.warning(f"Redis error in ResponseCache.set_opt_out: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "upstream_saved": self.stats["hits"] + self.stats["coalesced"],
+            "in_flight": len(self._in_flight),
+        }
+
+    async def aclose(self) -> None:
+        if self.redis:
+            await self.redis.aclose()
+
+
+response_cache = ResponseCache(
+    settings.redis_url,
+    enabled=settings.ai_cache_enabled,
+    ttl=settings.ai_cache_ttl,
+)
@@ -0,0 +1,173 @@
+"""
+Document storage helpers.
+
+Uploads are copied in fixed-size chunks, with disk writes and hashing
+running in the threadpool so the event loop keeps serving other requests.
+Each file is written to a temporary name and renamed into place, so
+readers never see a partially written file.
+
+Case documents live in a content-addressed BlobStore: one file per
+distinct SHA-256, sharded as <root>/ab/cd/<sha256>, with a Blob row
+counting how many Documents reference it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.models import Blob
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class StoredFile:
+    path: str
+    sha256: str
+    size: int
+
+
+def _write_chunk(fileobj: BinaryIO, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    fileobj.write(chunk)
+
+
+async def save_upload(
+    upload: UploadFile,
+    destination: str,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024,
+) -> StoredFile:
+    """
+    Stream `upload` to `destination`, computing SHA-256 and size on the fly.
+
+    Raises UploadTooLarge as soon as more than `max_bytes` have been read;
+    the partial file is removed and `destination` is left untouched.
+    """
+    directory = os.path.dirname(destination) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as fileobj:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                await run_in_threadpool(_write_chunk, fileobj, hasher, chunk)
+            await run_in_threadpool(os.fsync, fileobj.fileno())
+        os.replace(tmp_path, destination)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return StoredFile(path=destination, sha256=hasher.hexdigest(), size=size)
+
+
+@dataclass
+class StoredBlob(StoredFile):
+    created: bool = False  # False when the content was already on disk
+
+
+def _hash_fileobj(fileobj: BinaryIO, chunk_size: int, max_bytes: int) -> Tuple[str, int]:
+    hasher = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        hasher.update(chunk)
+    fileobj.seek(0)
+    return hasher.hexdigest(), size
+
+
+class BlobStore:
+    def __init__(self, root: str, chunk_size: int = 1024 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    async def digest(self, upload: UploadFile, max_bytes: int) -> Tuple[str, int]:
+        """
+        SHA-256 and size of the spooled upload, in one threadpool call.
+        """
+        return await run_in_threadpool(_hash_fileobj, upload.file, self.chunk_size, max_bytes)
+
+    async def put(
+        self,
+        upload: UploadFile,
+        max_bytes: int,
+        digest: Optional[Tuple[str, int]] = None,
+    ) -> StoredBlob:
+        """
+        Store `upload` under its SHA-256.
+
+        Content that is already stored costs no disk write at all. Callers
+        that record the blob take `digest` first, then the reference
+        (acquire_blob_ref), and only then call put with the digest: the
+        reference locks the Blob row, so the garbage collector cannot
+        remove an existing file between the check here and the commit.
+        """
+        sha256, size = digest or await self.digest(upload, max_bytes)
+        path = self.path_for(sha256)
+        if os.path.exists(path):
+            return StoredBlob(path=path, sha256=sha256, size=size, created=False)
+
+        stored = await save_upload(upload, path, max_bytes=max_bytes, chunk_size=self.chunk_size)
+        if stored.sha256 != sha256:
+            # The upload changed under us; never keep a blob under the wrong name
+            os.unlink(path)
+            raise ValueError("Upload content changed while it was being stored")
+        return StoredBlob(path=path, sha256=sha256, size=size, created=True)
+
+
+async def acquire_blob_ref(db: AsyncSession, sha256: str, size: int) -> None:
+    """
+    Insert the Blob row or bump its reference count, atomically. Runs in the
+    caller's transaction so the count commits together with the Document.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(Blob).values(sha256=sha256, size_bytes=size, ref_count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Blob.sha256],
+        set_={"ref_count": Blob.ref_count + 1, "updated_at": func.now()},
+    )
+    await db.execute(stmt)
+
+
+blob_store = BlobStore(
+    os.path.join(settings.upload_dir, "blobs"),
+    chunk_size=settings.upload_chunk_size,
+)
@@ -0,0 +1,190 @@
+"""
+Memory-mapped vector index, one per case.
+
+Each index is a directory under VECTOR_INDEX_DIR:
+
+    meta.json     {"embedder", "dim", "count", "capacity"}
+    vectors.f32   float32 (capacity, dim), rows L2-normalised
+    live.u8       uint8 (capacity,), 0 for removed rows
+
+Vectors are only appended; removing marks rows dead. Search is a single
+matrix-vector product over the mapped rows plus argpartition for top-k,
+so the OS page cache, not the Python heap, holds the data, and 100k
+rows x 256 dims is a few milliseconds. Writers take an flock on the
+directory so several workers can share an index; readers notice new rows
+when meta.json is replaced and remap.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import normalize_rows
+
+
+class IndexMismatch(Exception):
+    pass
+
+
+class VectorIndex:
+    def __init__(self, path: str, dim: int, embedder: str, initial_capacity: int = 1024):
+        self.path = path
+        self.dim = dim
+        self.embedder = embedder
+        self.initial_capacity = initial_capacity
+        self.count = 0
+        self.capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._live: Optional[np.memmap] = None
+        self._meta_version: Optional[Tuple[int, int]] = None
+        os.makedirs(path, exist_ok=True)
+        self._refresh()
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(os.path.join(self.path, "lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _map(self) -> None:
+        if self.capacity == 0:
+            self._vectors = self._live = None
+            return
+        self._vectors = np.memmap(
+            os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r+", shape=(self.capacity, self.dim)
+        )
+        self._live = np.memmap(os.path.join(self.path, "live.u8"), dtype=np.uint8, mode="r+", shape=(self.capacity,))
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self._meta_path)
+        except FileNotFoundError:
+            return
+        # meta.json is replaced, never rewritten, so a new inode means a new version
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._meta_version:
+            return
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        if meta["embedder"] != self.embedder or meta["dim"] != self.dim:
+            raise IndexMismatch(
+                f"Index at {self.path} was built with {meta['embedder']} ({meta['dim']} dims); "
+                "rebuild it with `python -m app.jobs.index_documents --rebuild`"
+            )
+        self.count, self._meta_version = meta["count"], version
+        if meta["capacity"] != self.capacity:
+            self.capacity = meta["capacity"]
+            self._map()
+
+    def _write_meta(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"embedder": self.embedder, "dim": self.dim, "count": self.count, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self._meta_path)
+        stat = os.stat(self._meta_path)
+        self._meta_version = (stat.st_ino, stat.st_mtime_ns)
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, self.capacity * 2, self.initial_capacity)
+        # Extending the files keeps existing rows in place; zero-filled tail
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("live.u8", 1)):
+            with open(os.path.join(self.path, name), "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self.capacity = capacity
+        self._map()
+
+    def add(self, vectors: np.ndarray) -> List[int]:
+        """
+        Append rows; returns their row numbers.
+        """
+        vectors = normalize_rows(np.atleast_2d(vectors))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+        with self._locked():
+            start, end = self.count, self.count + len(vectors)
+            if end > self.capacity:
+                self._grow(end)
+            self._vectors[start:end] = vectors
+            self._live[start:end] = 1
+            self._vectors.flush()
+            self._live.flush()
+            # Readers only see the rows once meta.json says so
+            self.count = end
+            self._write_meta()
+        return list(range(start, end))
+
+    def remove(self, rows: Sequence[int]) -> None:
+        if not rows:
+            return
+        with self._locked():
+            self._live[np.asarray(rows)] = 0
+            self._live.flush()
+            self._write_meta()
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Top-k live rows by cosine similarity, best first.
+        """
+        self._refresh()
+        count = self.count
+        if count == 0 or k <= 0:
+            return []
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(-1))
+        scores = self._vectors[:count] @ query
+        scores[self._live[:count] == 0] = -np.inf
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+    @property
+    def live_count(self) -> int:
+        self._refresh()
+        return int(self._live[:self.count].sum()) if self.count else 0
+
+
+class VectorIndexStore:
+    """
+    Open indexes by scope, least recently used closed first.
+    """
+
+    def __init__(self, root: str, max_open: int = 256):
+        self.root = root
+        self.max_open = max_open
+        self._open: "OrderedDict[str, VectorIndex]" = OrderedDict()
+
+    def get(self, scope: str, dim: int, embedder: str) -> VectorIndex:
+        index = self._open.get(scope)
+        if index is None or index.dim != dim or index.embedder != embedder:
+            index = VectorIndex(os.path.join(self.root, scope), dim, embedder)
+            self._open[scope] = index
+        self._open.move_to_end(scope)
+        while len(self._open) > self.max_open:
+            self._open.popitem(last=False)
+        return index
+
+    def drop(self, scope: str) -> None:
+        self._open.pop(scope, None)
+        path = os.path.join(self.root, scope)
+        if os.path.isdir(path):
+            for name in os.listdir(path):
+                os.remove(os.path.join(path, name))
+            os.rmdir(path)
+
+
+vector_index_store = VectorIndexStore(settings.vector_index_dir)
@@ -0,0 +1,92 @@
+"""
+In-memory stand-in for the subset of redis.asyncio used by the services:
+lists, strings, pipelines (queued commands, WATCH/MULTI with WatchError on
+a changed list). Counts round trips so tests can assert on batching.
+"""
+
+from redis.exceptions import WatchError
+
+
+class FakePipeline:
+    def __init__(self, redis, transaction):
+        self.redis = redis
+        self.transaction = transaction
+        self.commands = []
+        self.watched = None
+        self.queuing = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, key):
+        self.watched = (key, list(self.redis.lists.get(key, [])))
+        self.queuing = False
+
+    def multi(self):
+        self.queuing = True
+
+    def lrange(self, key, start, end):
+        if not self.queuing:
+            # Immediate-mode read between WATCH and MULTI
+            return self.redis.lrange(key, start, end)
+        self.commands.append(("lrange", key, start, end))
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, *args))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        self.redis.transactions.append(self.transaction)
+        if self.watched and self.redis.lists.get(self.watched[0], []) != self.watched[1]:
+            raise WatchError("watched key changed")
+        return [self.redis.apply(*command) for command in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.lists = {}
+        self.strings = {}
+        self.ttls = {}
+        self.round_trips = 0
+        self.transactions = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self, transaction)
+
+    async def lrange(self, key, start, end):
+        return self.apply("lrange", key, start, end)
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def mget(self, *keys):
+        return [self.strings.get(k) for k in keys]
+
+    async def set(self, key, value, ex=None):
+        self.apply("set", key, value)
+
+    async def delete(self, key):
+        self.apply("delete", key)
+
+    def apply(self, name, key, *args):
+        items = self.lists.get(key, [])
+        if name == "rpush":
+            self.lists[key] = items + list(args)
+        elif name == "ltrim":
+            start, end = args
+            self.lists[key] = items[start:len(items) + end + 1 if end < 0 else end + 1]
+        elif name == "lrange":
+            start, end = args
+            return items[start:len(items) + end + 1 if end < 0 else end + 1]
+        elif name == "expire":
+            self.ttls[key] = args[0]
+        elif name == "set":
+            self.strings[key] = args[0]
+        elif name == "get":
+            return self.strings.get(key)
+        elif name == "delete":
+            self.strings.pop(key, None)
+            self.lists.pop(key, None)
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the Gemini REST API, for tests and benchmarks.
+
+    python -m tests.gemini_stub [--port 8085] [--latency-ms 300]
+
+then point the backend at it with GEMINI_BASE_URL=http://127.0.0.1:8085/v1beta
+and any GEMINI_API_KEY. Implements :generateContent,
+:streamGenerateContent?alt=sse (the reply echoes the last user prompt) and
+:batchEmbedContents (small deterministic vectors).
+Failures can be injected per instance (see StubState).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+@dataclass
+class StubState:
+    latency: float = 0.05  # seconds before the (first) response byte
+    chunk_delay: float = 0.01  # between streamed chunks
+    chunks: int = 4
+    fail_status: int = 503
+    fail_times: int = 0  # the next N requests fail with fail_status
+    retry_after: str = ""
+    latencies: List[float] = field(default_factory=list)  # per-request overrides of `latency`, used up in order
+    requests: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    prompts: List[str] = field(default_factory=list)
+
+
+def _reply(text: str) -> dict:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+def create_stub_app(state: StubState = None) -> Starlette:
+    state = state or StubState()
+
+    async def handle(request: Request) -> Response:
+        model, _, method = request.path_params["target"].partition(":")
+        if method not in ("generateContent", "streamGenerateContent", "batchEmbedContents"):
+            return JSONResponse({"error": {"message": "unknown method"}}, status_code=404)
+        if not request.query_params.get("key"):
+            return JSONResponse({"error": {"message": "API key missing"}}, status_code=400)
+
+        body = await request.json()
+        if method == "batchEmbedContents":
+            state.requests += 1
+            return JSONResponse({"embeddings": [
+                {"values": list(hashlib.sha256(r["content"]["parts"][0]["text"].encode()).digest()[:8])}
+                for r in body["requests"]
+            ]})
+        prompt = body["contents"][-1]["parts"][0]["text"]
+        state.requests += 1
+        state.prompts.append(prompt)
+        state.in_flight += 1
+        state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            await asyncio.sleep(state.latencies.pop(0) if state.latencies else state.latency)
+            if state.fail_times > 0:
+                state.fail_times -= 1
+                headers = {"Retry-After": state.retry_after} if state.retry_after else None
+                return JSONResponse({"error": {"message": "injected"}}, status_code=state.fail_status, headers=headers)
+        finally:
+            state.in_flight -= 1
+
+        answer = f"[{model}] {prompt}"
+        if method == "generateContent":
+            # A buffered reply arrives only once the whole completion is generated
+            await asyncio.sleep(state.chunk_delay * (state.chunks - 1))
+            return JSONResponse(_reply(answer))
+
+        async def events():
+            size = max(1, -(-len(answer) // state.chunks))
+            for i in range(0, len(answer), size):
+                if i:
+                    await asyncio.sleep(state.chunk_delay)
+                yield f"data: {json.dumps(_reply(answer[i:i + size]))}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app = Starlette(routes=[Route("/v1beta/models/{target}", handle, methods=["POST"])])
+    app.state.stub = state
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Gemini API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency-ms", type=int, default=300)
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(StubState(latency=args.latency_ms / 1000)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,85 @@
+"""
+Time-to-first-token: buffered :generateContent vs streamed
+:streamGenerateContent, against the local stub over real sockets.
+
+    python tests/performance/bench_ai_stream.py [--first-ms 400] [--chunks 20] [--chunk-ms 80]
+
+The stub waits --first-ms before the first byte and --chunk-ms between
+chunks, roughly how a long completion arrives from the real API. The
+sanitized figure can trail the raw one by a chunk: text is held back
+until the token it ends in is complete.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import uvicorn  # noqa: E402
+
+from app.core.pii import PIIStreamSanitizer  # noqa: E402
+from app.services.gemini import GeminiService, build_contents  # noqa: E402
+from tests.gemini_stub import StubState, create_stub_app  # noqa: E402
+
+
+def start_stub(state: StubState) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_stub_app(state), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v1beta"
+
+
+async def run(base_url: str, rounds: int):
+    service = GeminiService("bench", base_url=base_url)
+    prompt = "Opisz procedurę odwołania od decyzji administracyjnej krok po kroku " * 4
+    contents = build_contents(prompt)
+    await service.generate("warm-up")
+
+    buffered, raw_first, first, total = [], [], [], []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await service.generate(prompt)
+        buffered.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        sanitizer = PIIStreamSanitizer()
+        raw_ttft = ttft = None
+        async for delta in service.stream_generate_content(contents):
+            if raw_ttft is None:
+                raw_ttft = time.perf_counter() - started
+            if sanitizer.feed(delta) and ttft is None:
+                ttft = time.perf_counter() - started
+        sanitizer.flush()
+        raw_first.append(raw_ttft)
+        first.append(ttft)
+        total.append(time.perf_counter() - started)
+    await service.aclose()
+    return [statistics.median(xs) for xs in (buffered, raw_first, first, total)]
+
+
+def main(args):
+    state = StubState(latency=args.first_ms / 1000, chunks=args.chunks, chunk_delay=args.chunk_ms / 1000)
+    base_url = start_stub(state)
+    buffered, raw_ttft, ttft, total = asyncio.run(run(base_url, args.rounds))
+    print(f"{'buffered generate':>26} first text after {buffered * 1000:7.1f} ms")
+    print(f"{'streamed, raw chunk':>26} first text after {raw_ttft * 1000:7.1f} ms")
+    print(f"{'streamed, PII-sanitized':>26} first text after {ttft * 1000:7.1f} ms, complete after {total * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-ms", type=int, default=400)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chunk-ms", type=int, default=80)
+    parser.add_argument("--rounds", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+"""
+Blind-index lookup latency as user_profile grows.
+
+    python tests/performance/bench_blind_index.py [--sizes 10000,100000,1000000] [--database-url URL]
+
+Fills user_profile (a throwaway SQLite file by default; pass a Postgres
+URL to measure there) and times exact PESEL lookups through the
+pesel_bidx index at each size. For comparison it also times the scan the
+index replaces: decrypting every pesel_enc in the table.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from app.core.encryption import encryption_service  # noqa: E402
+from app.db.models import User, UserProfile  # noqa: E402
+
+
+def pesel_for(i: int) -> str:
+    return f"{i:011d}"
+
+
+async def fill(conn, start: int, stop: int, chunk: int = 20000):
+    # One real ciphertext reused for filler rows; the index is what is measured
+    token = encryption_service.encrypt("00000000000")
+    for lo in range(start, stop, chunk):
+        users, profiles = [], []
+        for i in range(lo, min(lo + chunk, stop)):
+            user_id = uuid.uuid4()
+            users.append({"id": user_id, "email": f"bench{i}@example.com", "password_hash": "x"})
+            profiles.append({
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "pesel_enc": token,
+                "pesel_bidx": encryption_service.blind_index("pesel", pesel_for(i)),
+            })
+        await conn.execute(insert(User), users)
+        await conn.execute(insert(UserProfile), profiles)
+
+
+async def time_lookups(conn, size: int, probes: int):
+    samples = []
+    for n in range(probes):
+        index = encryption_service.blind_index("pesel", pesel_for((n * 7919) % size))
+        start = time.perf_counter()
+        found = (await conn.execute(select(UserProfile.user_id).where(UserProfile.pesel_bidx == index))).all()
+        samples.append(time.perf_counter() - start)
+        assert len(found) == 1
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+async def main(args):
+    url = args.database_url
+    if not url:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        url = f"sqlite+aiosqlite:///{path}"
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda c: UserProfile.__table__.drop(c, checkfirst=True))
+        await conn.run_sync(lambda c: User.__table__.drop(c, checkfirst=True))
+        await conn.run_sync(lambda c: User.__table__.create(c))
+        await conn.run_sync(lambda c: UserProfile.__table__.create(c))
+
+    tokens = [encryption_service.encrypt(pesel_for(i)) for i in range(10000)]
+    start = time.perf_counter()
+    encryption_service._decrypt_batch(tokens)
+    decrypt_rate = len(tokens) / (time.perf_counter() - start)
+
+    filled = 0
+    print(f"{'profiles':>10} {'p50 ms':>8} {'p99 ms':>8} {'decrypt-scan s (est.)':>22}")
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        async with engine.begin() as conn:
+            await fill(conn, filled, size)
+        filled = size
+        async with engine.connect() as conn:
+            await time_lookups(conn, size, 20)  # warm up
+            p50, p99 = await time_lookups(conn, size, args.probes)
+        print(f"{size:10d} {p50 * 1000:8.3f} {p99 * 1000:8.3f} {size / decrypt_rate:22.1f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--probes", type=int, default=500)
+    parser.add_argument("--database-url", default="")
+    asyncio.run(main(parser.parse_args()))
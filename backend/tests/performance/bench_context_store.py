@@ -0,0 +1,89 @@
+"""
+Context store payload size and per-request Redis cost.
+
+    python tests/performance/bench_context_store.py [--redis-url redis://localhost:6379/15] [--requests 2000]
+
+Always prints the encoded size of a typical turn (JSON vs the binary
+format). With a reachable Redis it also times one AI request's context
+work: the old blocking client (LRANGE + 2 x RPUSH/LTRIM/EXPIRE, seven
+round trips) against ContextStore (LRANGE + one MULTI/EXEC) run
+concurrently on the shared pool. Uses keys under bench:context:*.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import redis  # noqa: E402
+
+from app.services.context_store import ContextStore, encode_message  # noqa: E402
+
+PROMPT = "Proszę o analizę umowy najmu lokalu mieszkalnego, w szczególności zapisów o kaucji. " * 3
+ANSWER = "Zgodnie z art. 6 ustawy o ochronie praw lokatorów kaucja nie może przekraczać dwunastokrotności czynszu. " * 6
+
+
+def sizes():
+    for role, text in (("user", PROMPT), ("model", ANSWER)):
+        as_json = len(json.dumps({"role": role, "parts": [text]}).encode())
+        binary = len(encode_message(role, text))
+        print(f"{role:>6} turn: json {as_json:5d} B  binary {binary:5d} B  ({1 - binary / as_json:.0%} smaller)")
+
+
+def legacy(url: str, n: int) -> float:
+    client = redis.Redis.from_url(url, decode_responses=True)
+    started = time.perf_counter()
+    for i in range(n):
+        key = f"bench:context:legacy:{i % 100}"
+        [json.loads(m) for m in client.lrange(key, -5, -1)]
+        for role, text in (("user", PROMPT), ("model", ANSWER)):
+            client.rpush(key, json.dumps({"role": role, "parts": [text]}))
+            client.ltrim(key, -10, -1)
+            client.expire(key, 3600)
+    elapsed = time.perf_counter() - started
+    client.close()
+    return elapsed
+
+
+async def pooled(url: str, n: int, concurrency: int) -> float:
+    store = ContextStore(url)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            session_id = f"bench:{i % 100}"
+            await store.get_context(session_id)
+            await store.append_messages(session_id, [("user", PROMPT), ("model", ANSWER)], keep_last=10)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    await store.aclose()
+    return elapsed
+
+
+def main(args):
+    sizes()
+    try:
+        redis.Redis.from_url(args.redis_url).ping()
+    except redis.RedisError as e:
+        print(f"Redis at {args.redis_url} unavailable ({e}); skipping round-trip timings")
+        return
+
+    print(f"\n{args.requests} AI requests' worth of context reads/writes")
+    elapsed = legacy(args.redis_url, args.requests)
+    print(f"{'sync, 7 round trips':>28} {elapsed:7.2f}s {args.requests / elapsed:9.0f} req/s")
+    for concurrency in (1, 16, 64):
+        elapsed = asyncio.run(pooled(args.redis_url, args.requests, concurrency))
+        print(f"{f'async pipeline x{concurrency}':>28} {elapsed:7.2f}s {args.requests / elapsed:9.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--requests", type=int, default=2000)
+    main(parser.parse_args())
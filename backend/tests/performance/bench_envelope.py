@@ -0,0 +1,52 @@
+"""
+Storage and CPU cost of the AES-GCM envelope vs the legacy Fernet tokens.
+
+    python tests/performance/bench_envelope.py [--rows 20000] [--size 200]
+
+Prints bytes per row, encrypt/decrypt rows/sec for both formats and the
+ciphertext storage extrapolated to 1M messages.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.core.encryption import EncryptionService  # noqa: E402
+
+
+def rate(fn, items):
+    start = time.perf_counter()
+    out = [fn(item) for item in items]
+    return out, len(items) / (time.perf_counter() - start)
+
+
+def main(args):
+    service = EncryptionService(key=EncryptionService().key)
+    plaintexts = [os.urandom(args.size // 2).hex() for _ in range(args.rows)]
+
+    fernet_tokens, fernet_enc = rate(lambda p: service.cipher_suite.encrypt(p.encode()).decode(), plaintexts)
+    _, fernet_dec = rate(service.decrypt, fernet_tokens)
+    envelopes, env_enc = rate(service.encrypt, plaintexts)
+    _, env_dec = rate(service.decrypt, envelopes)
+
+    fernet_bytes = sum(len(t) for t in fernet_tokens) / args.rows
+    env_bytes = sum(len(t) for t in envelopes) / args.rows
+
+    print(f"plaintext {args.size} B, {args.rows} rows")
+    print(f"{'':10} {'bytes/row':>10} {'enc rows/s':>12} {'dec rows/s':>12} {'1M rows':>10}")
+    for name, size, enc, dec in (
+        ("fernet", fernet_bytes, fernet_enc, fernet_dec),
+        ("envelope", env_bytes, env_enc, env_dec),
+    ):
+        print(f"{name:10} {size:10.1f} {enc:12.0f} {dec:12.0f} {size * 1e6 / 2**20:8.1f}MB")
+    print(f"saved per 1M rows: {(fernet_bytes - env_bytes) * 1e6 / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=200)
+    main(parser.parse_args())
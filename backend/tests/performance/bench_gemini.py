@@ -0,0 +1,76 @@
+"""
+Gemini client throughput against the local stub over real sockets.
+
+    python tests/performance/bench_gemini.py [--calls 50] [--latency-ms 300]
+
+Compares the old blocking requests.post loop (what one worker could do
+while its event loop was stalled) with GeminiService at a few
+concurrency limits.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import requests  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app.services.gemini import GeminiService, build_contents  # noqa: E402
+from tests.gemini_stub import StubState, create_stub_app  # noqa: E402
+
+
+def start_stub(latency: float) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(
+        create_stub_app(StubState(latency=latency)), host="127.0.0.1", port=port, log_level="warning"
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v1beta"
+
+
+def blocking(base_url: str, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        requests.post(
+            f"{base_url}/models/gemini-1.5-flash:generateContent",
+            params={"key": "bench"},
+            json={"contents": build_contents(f"prompt {i}")},
+        ).raise_for_status()
+    return time.perf_counter() - started
+
+
+async def pooled(base_url: str, calls: int, concurrency: int) -> float:
+    service = GeminiService("bench", base_url=base_url, max_concurrency=concurrency, max_connections=concurrency)
+    await service.generate("warm-up")
+    started = time.perf_counter()
+    await asyncio.gather(*(service.generate(f"prompt {i}") for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    await service.aclose()
+    return elapsed
+
+
+def main(args):
+    base_url = start_stub(args.latency_ms / 1000)
+    print(f"{args.calls} generations, upstream latency {args.latency_ms} ms")
+    elapsed = blocking(base_url, args.calls)
+    print(f"{'requests.post loop':>24} {elapsed:7.2f}s {args.calls / elapsed:8.1f} req/s")
+    for concurrency in (4, 16, 50):
+        elapsed = asyncio.run(pooled(base_url, args.calls, concurrency))
+        print(f"{f'GeminiService x{concurrency}':>24} {elapsed:7.2f}s {args.calls / elapsed:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency-ms", type=int, default=300)
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+"""
+Benchmark: p99 latency of GET /api/v1/users/me while a login storm is running.
+
+Run against a live server (uvicorn, single worker) once on the old code and once
+with the hashing pool to compare:
+
+    python tests/performance/bench_login_latency.py \
+        --base-url http://localhost:8000 --email jan.kowalski@example.com \
+        --password password123 --logins 200 --concurrency 20
+
+The seeded users from /api/v1/dev/run can be used as credentials.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str):
+    return await client.post(
+        "/api/v1/auth/login", data={"username": email, "password": password}
+    )
+
+
+async def login_storm(client, email, password, total, concurrency, statuses):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            resp = await login(client, email, password)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    await asyncio.gather(*(one() for _ in range(total)))
+
+
+async def probe_me(client, headers, stop: asyncio.Event, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/v1/users/me", headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        resp = await login(client, args.email, args.password)
+        resp.raise_for_status()
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        # Baseline: /users/me with no concurrent logins
+        idle = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_me(client, headers, stop, idle))
+        await asyncio.sleep(2)
+        stop.set()
+        await probe
+
+        # Under load
+        loaded = []
+        statuses = {}
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_me(client, headers, stop, loaded))
+        start = time.perf_counter()
+        await login_storm(client, args.email, args.password, args.logins, args.concurrency, statuses)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    print(f"logins: {args.logins} in {elapsed:.2f}s ({args.logins / elapsed:.1f}/s), statuses={statuses}")
+    for label, samples in (("idle", idle), ("during logins", loaded)):
+        print(
+            f"/users/me {label:>14}: n={len(samples):5d} "
+            f"p50={statistics.median(samples):8.2f}ms "
+            f"p99={percentile(samples, 99):8.2f}ms "
+            f"max={max(samples):8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,142 @@
+"""
+Throughput through the middleware stack: DDoSProtectionMiddleware as a
+pure ASGI callable vs the previous BaseHTTPMiddleware version.
+
+    python tests/performance/bench_middleware.py [--requests 5000] [--concurrency 32] [--stream-chunks 50] [--chunk-ms 2]
+
+Both variants run the same checks in front of the same stack as app.main
+(DDoS -> CORS -> FastAPI). Measured per variant:
+  - small JSON GET and a 256 KiB POST echoed back, requests/s over an
+    in-process ASGI transport (middleware overhead without sockets)
+  - a streamed response of --stream-chunks chunks, --chunk-ms apart,
+    through uvicorn over a real socket: time to first chunk and total
+    (the in-process transport buffers whole responses)
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from fastapi.responses import JSONResponse, Response, StreamingResponse  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from app.middleware.ddos_protection import DDoSProtectionMiddleware  # noqa: E402
+
+
+class BaseHTTPDDoSProtectionMiddleware(BaseHTTPMiddleware):
+    """
+    The previous implementation's request path, sharing the checks.
+    """
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app)
+        self.guard = DDoSProtectionMiddleware(app, **kwargs)
+
+    async def dispatch(self, request: Request, call_next):
+        try:
+            detail = await self.guard._check(request.scope)
+            if detail is not None:
+                return JSONResponse(status_code=429, content={"detail": detail})
+            return await call_next(request)
+        except Exception:
+            return await call_next(request)
+
+
+def build_app(middleware, chunks: int, chunk_delay: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return Response(await request.body(), media_type="application/octet-stream")
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for i in range(chunks):
+                yield f"event: chunk\ndata: {i}\n\n".encode()
+                await asyncio.sleep(chunk_delay)
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    app.add_middleware(middleware, redis_client=None, trusted_ips=[])
+    app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:5173"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+    return app
+
+
+async def throughput(client: httpx.AsyncClient, n: int, concurrency: int, method: str, url: str, **kwargs) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Forwarded-For": "203.0.113.7", "Origin": "http://localhost:5173"}
+
+    async def one():
+        async with semaphore:
+            response = await client.request(method, url, headers=headers, **kwargs)
+            assert response.status_code == 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    return n / (time.perf_counter() - started)
+
+
+def start_server(app: FastAPI) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def streaming(base_url: str, rounds: int):
+    first, total = [], []
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            ttfb = None
+            async with client.stream("GET", "/stream", headers={"X-Forwarded-For": "203.0.113.7"}) as response:
+                async for _ in response.aiter_raw():
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - started
+            first.append(ttfb)
+            total.append(time.perf_counter() - started)
+    return statistics.median(first) * 1000, statistics.median(total) * 1000
+
+
+async def run(args):
+    payload = os.urandom(256 * 1024)
+    for name, middleware in (("BaseHTTPMiddleware", BaseHTTPDDoSProtectionMiddleware), ("pure ASGI", DDoSProtectionMiddleware)):
+        app = build_app(middleware, args.stream_chunks, args.chunk_ms / 1000)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            await throughput(client, 200, args.concurrency, "GET", "/ping")
+            small = await throughput(client, args.requests, args.concurrency, "GET", "/ping")
+            large = await throughput(client, args.requests // 10, args.concurrency, "POST", "/echo", content=payload)
+        ttfb, stream_total = await streaming(start_server(app), args.stream_rounds)
+        print(
+            f"{name:>18}: {small:7.0f} req/s small  {large:6.0f} req/s 256 KiB echo  "
+            f"stream first chunk {ttfb:6.2f} ms, total {stream_total:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream-chunks", type=int, default=50)
+    parser.add_argument("--chunk-ms", type=float, default=2.0)
+    parser.add_argument("--stream-rounds", type=int, default=30)
+    asyncio.run(run(parser.parse_args()))
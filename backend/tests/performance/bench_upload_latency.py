@@ -0,0 +1,111 @@
+"""
+Load test: API latency while several large document uploads run in parallel.
+
+Creates a case, then uploads `--uploads` files of `--size-mb` each
+concurrently while probing GET /api/v1/users/me. Run once against the old
+(blocking copyfileobj) code and once against the chunked writer:
+
+    python tests/performance/bench_upload_latency.py \
+        --base-url http://localhost:8000 --email jan.kowalski@example.com \
+        --password password123 --uploads 4 --size-mb 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def random_body(size_bytes: int, chunk_size: int = 1024 * 1024):
+    # Stream the multipart body instead of materialising it client-side
+    boundary = b"benchboundary"
+    yield (
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="filing.pdf"\r\n'
+        b"Content-Type: application/pdf\r\n\r\n"
+    )
+    block = os.urandom(chunk_size)
+    sent = 0
+    while sent < size_bytes:
+        n = min(chunk_size, size_bytes - sent)
+        yield block[:n]
+        sent += n
+    yield b"\r\n--" + boundary + b"--\r\n"
+
+
+async def upload(client, case_id, headers, size_bytes):
+    start = time.perf_counter()
+    resp = await client.post(
+        f"/api/v1/cases/{case_id}/documents",
+        content=random_body(size_bytes),
+        headers={**headers, "Content-Type": "multipart/form-data; boundary=benchboundary"},
+    )
+    return resp.status_code, time.perf_counter() - start
+
+
+async def probe_me(client, headers, stop: asyncio.Event, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/v1/users/me", headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=600) as client:
+        resp = await client.post(
+            "/api/v1/auth/login", data={"username": args.email, "password": args.password}
+        )
+        resp.raise_for_status()
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+        case = await client.post(
+            "/api/v1/cases/", json={"title": "Upload benchmark"}, headers=headers
+        )
+        case.raise_for_status()
+        case_id = case.json()["id"]
+
+        idle = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_me(client, headers, stop, idle))
+        await asyncio.sleep(2)
+        stop.set()
+        await probe
+
+        loaded = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_me(client, headers, stop, loaded))
+        size_bytes = args.size_mb * 1024 * 1024
+        results = await asyncio.gather(
+            *(upload(client, case_id, headers, size_bytes) for _ in range(args.uploads))
+        )
+        stop.set()
+        await probe
+
+    for status_code, elapsed in results:
+        print(f"upload {args.size_mb} MB -> {status_code} in {elapsed:.2f}s")
+    for label, samples in (("idle", idle), ("during uploads", loaded)):
+        print(
+            f"/users/me {label:>15}: n={len(samples):5d} "
+            f"p50={statistics.median(samples):8.2f}ms "
+            f"p99={percentile(samples, 99):8.2f}ms "
+            f"max={max(samples):8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
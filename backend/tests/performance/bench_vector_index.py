@@ -0,0 +1,51 @@
+"""
+Vector index search latency by index size.
+
+    python tests/performance/bench_vector_index.py [--dim 256] [--sizes 10000,100000,1000000] [--queries 200]
+
+Fills a throwaway VectorIndex with random unit vectors and times top-k
+search (one mapped matmul + argpartition). Numbers are for a warm page
+cache; the first query after opening a large index pays for reading it.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import numpy as np  # noqa: E402
+
+from app.services.vector_index import VectorIndex  # noqa: E402
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as path:
+            index = VectorIndex(path, args.dim, "bench", initial_capacity=size)
+            for start in range(0, size, 50_000):
+                index.add(rng.standard_normal((min(50_000, size - start), args.dim)).astype(np.float32))
+            index.search(queries[0], k=args.k)
+
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                index.search(query, k=args.k)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{size:>9} rows x {args.dim}: median {statistics.median(timings):7.2f} ms  p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4)
+    main(parser.parse_args())
@@ -0,0 +1,120 @@
+import json
+
+import httpx
+import pytest
+from httpx import AsyncClient
+
+from app.services.context_store import fit_to_budget
+from app.services.gemini import GeminiService
+from app.services.response_cache import ResponseCache
+from tests.fake_redis import FakeRedis
+from tests.gemini_stub import StubState, create_stub_app
+
+
+class MemoryContextStore:
+    def __init__(self):
+        self.messages = {}
+
+    async def get_context(self, session_id):
+        return fit_to_budget(self.messages.get(session_id, []), None, 3000)
+
+    async def append_messages(self, session_id, messages, keep_last=None):
+        for role, text in messages:
+            self.messages.setdefault(session_id, []).append({"role": role, "parts": [text]})
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def ai_backend(monkeypatch):
+    from app.api.v1.endpoints import ai
+
+    state = StubState(latency=0, chunks=6)
+    service = GeminiService("test-key", base_url="http://stub/v1beta", transport=httpx.ASGITransport(app=create_stub_app(state)))
+    store = MemoryContextStore()
+    cache = ResponseCache(None)
+    cache.redis = FakeRedis()
+    monkeypatch.setattr(ai, "_gemini", service)
+    monkeypatch.setattr(ai, "_context_store", store)
+    monkeypatch.setattr(ai, "_response_cache", cache)
+    return state, store
+
+
+@pytest.mark.asyncio
+async def test_generate_stream_sse(client: AsyncClient, ai_backend):
+    state, store = ai_backend
+    response = await client.post(
+        "/api/v1/ai/generate/stream",
+        json={"prompt": "Mój PESEL to 44051401359, co dalej?", "session_id": "s1"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert [name for name, _ in events[:-1]] == ["chunk"] * (len(events) - 1)
+    assert events[-1][0] == "done"
+    streamed = "".join(data["text"] for _, data in events[:-1])
+    assert streamed == events[-1][1]["text"]
+    # The prompt is sanitized before it leaves, and the echoed answer is sanitized on the way back
+    assert "44051401359" not in state.prompts[0]
+    assert "44051401359" not in streamed and "[PESEL REMOVED]" in streamed
+
+    assert [m["role"] for m in store.messages["s1"]] == ["user", "model"]
+    assert store.messages["s1"][1]["parts"] == [streamed]
+
+
+@pytest.mark.asyncio
+async def test_generate_stream_error_event_skips_context(client: AsyncClient, ai_backend):
+    state, store = ai_backend
+    state.fail_status, state.fail_times = 400, 1
+    response = await client.post("/api/v1/ai/generate/stream", json={"prompt": "hi", "session_id": "s2"})
+    events = parse_events(response.text)
+    assert events == [("error", {"detail": "AI generation failed: GeminiError"})]
+    assert "s2" not in store.messages
+
+
+@pytest.mark.asyncio
+async def test_identical_prompt_served_from_cache(client: AsyncClient, ai_backend):
+    state, store = ai_backend
+    first = await client.post("/api/v1/ai/generate", json={"prompt": "Termin przedawnienia?", "session_id": "a"})
+    second = await client.post("/api/v1/ai/generate/stream", json={"prompt": "Termin przedawnienia?", "session_id": "b"})
+    assert first.json()["text"] == "[gemini-1.5-flash] Termin przedawnienia?"
+    assert parse_events(second.text)[-1] == ("done", {"text": first.json()["text"]})
+    assert state.requests == 1
+    assert store.messages["b"][1]["parts"] == [first.json()["text"]]
+
+
+@pytest.mark.asyncio
+async def test_session_cache_opt_out(client: AsyncClient, ai_backend, auth_headers, other_auth_headers):
+    state, _ = ai_backend
+    response = await client.put("/api/v1/ai/sessions/private/cache", json={"enabled": False})
+    assert response.status_code in (401, 403)
+
+    response = await client.put("/api/v1/ai/sessions/private/cache", json={"enabled": False}, headers=auth_headers)
+    assert response.json() == {"enabled": False}
+    for _ in range(2):
+        await client.post("/api/v1/ai/generate", json={"prompt": "Termin?", "session_id": "private"}, headers=auth_headers)
+    assert state.requests == 2
+
+    # The same session id of another user, or anonymous, is unaffected
+    from app.api.v1.endpoints import ai
+    assert ai._response_cache.stats["bypassed"] == 2
+    for headers in (other_auth_headers, {}):
+        await client.post("/api/v1/ai/generate", json={"prompt": "Termin?", "session_id": "private"}, headers=headers)
+    assert ai._response_cache.stats["bypassed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_stats_require_admin(client: AsyncClient, auth_headers, other_auth_headers, test_user, db_session):
+    test_user.role = "ADMIN"
+    await db_session.commit()
+    response = await client.get("/api/v1/ai/cache/stats", headers=auth_headers)
+    assert response.status_code == 200
+    assert {"hits", "misses", "coalesced", "bypassed", "hit_rate"} <= response.json().keys()
+    assert (await client.get("/api/v1/ai/cache/stats", headers=other_auth_headers)).status_code == 403
@@ -0,0 +1,150 @@
+import json
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+
+from app.core.tokens import estimate_tokens, message_tokens
+from app.db.models import User
+from app.services.ai_quota import AIQuota, QuotaSubject
+from app.services.context_store import ContextWindow
+from app.services.gemini import GeminiService
+from app.services.response_cache import ResponseCache
+from tests.gemini_stub import StubState, create_stub_app
+
+ALICE = QuotaSubject("user:alice", "client")
+BOB = QuotaSubject("user:bob", "client")
+
+
+@pytest.mark.asyncio
+async def test_bucket_reserve_settle_and_retry_after():
+    quota = AIQuota(None, user_limits={"client": [100, 60]})  # 1 token/s
+
+    decision = await quota.acquire(ALICE, 80)
+    assert decision.allowed and decision.remaining == 20
+    decision = await quota.acquire(ALICE, 50)
+    assert not decision.allowed
+    assert 29.9 <= decision.retry_after <= 30.0
+
+    await quota.settle(ALICE, reserved=80, used=10)
+    assert 90 <= await quota.remaining(ALICE) <= 91
+    # A request bigger than the bucket needs a full bucket, then overdraws it
+    assert (await quota.acquire(BOB, 500)).allowed
+    assert (await quota.acquire(BOB, 1)).retry_after > 400
+
+
+@pytest.mark.asyncio
+async def test_role_bucket_is_shared():
+    quota = AIQuota(None, user_limits={"client": [100, 60]}, role_limits={"client": [150, 60]})
+    assert (await quota.acquire(ALICE, 100)).allowed
+    decision = await quota.acquire(BOB, 100)
+    assert not decision.allowed and decision.remaining == 100
+    assert (await quota.acquire(BOB, 50)).allowed
+    assert await quota.remaining(QuotaSubject("user:carol", "lawyer")) == 100  # falls back to client limits
+
+
+@pytest.mark.asyncio
+async def test_usage_counters_by_day_role_and_user():
+    quota = AIQuota(None)
+    await quota.record_usage(ALICE, 100, 50)
+    await quota.record_usage(ALICE, 10, 5)
+    await quota.record_usage(BOB, 1, 1)
+    await quota.record_usage(QuotaSubject("ip:10.0.0.1", "anonymous"), 7, 3)
+
+    today, yesterday = await quota.usage(days=2)
+    assert (today["requests"], today["prompt_tokens"], today["response_tokens"]) == (4, 118, 59)
+    assert today["by_role"]["anonymous"] == {"requests": 1, "prompt_tokens": 7, "response_tokens": 3}
+    assert [u["user"] for u in today["top_users"]] == ["alice", "bob"]
+    assert yesterday["requests"] == 0 and yesterday["top_users"] == []
+
+
+@pytest.fixture
+def quota_backend(monkeypatch):
+    from app.api.v1.endpoints import ai
+    from tests.fake_redis import FakeRedis
+
+    state = StubState(latency=0, chunks=2)
+    cache = ResponseCache(None)
+    cache.redis = FakeRedis()
+    quota = AIQuota(None, user_limits={"anonymous": [1100, 60], "client": [5000, 60]}, response_reserve=1000)
+    monkeypatch.setattr(ai, "_gemini", GeminiService("k", base_url="http://stub/v1beta", transport=httpx.ASGITransport(app=create_stub_app(state))))
+    monkeypatch.setattr(ai, "_response_cache", cache)
+    monkeypatch.setattr(ai, "_quota", quota)
+    return state, quota
+
+
+@pytest.mark.asyncio
+async def test_generate_enforces_quota_and_records_usage(
+    client: AsyncClient, auth_headers, other_auth_headers, second_test_user, db_session, quota_backend
+):
+    state, quota = quota_backend
+    await quota.acquire(QuotaSubject("ip:127.0.0.1", "anonymous"), 1100)
+    response = await client.post("/api/v1/ai/generate", json={"prompt": "Termin?", "session_id": "q1"})
+    assert response.status_code == 429
+    assert 1000 <= int(response.headers["Retry-After"]) <= 1010
+    response = await client.post("/api/v1/ai/generate/stream", json={"prompt": "Termin?", "session_id": "q1"})
+    assert response.status_code == 429
+    assert state.requests == 0
+
+    for _ in range(2):  # the second answer comes from the cache and costs nothing
+        response = await client.post("/api/v1/ai/generate", json={"prompt": "Ile wynosi kaucja?", "session_id": "q2"}, headers=auth_headers)
+        assert response.status_code == 200
+    response = await client.post("/api/v1/ai/generate/stream", json={"prompt": "Inne pytanie", "session_id": "q3"}, headers=auth_headers)
+    assert "event: done" in response.text
+    assert state.requests == 2
+
+    await db_session.execute(update(User).where(User.id == second_test_user.id).values(role="ADMIN"))
+    await db_session.commit()
+    assert (await client.get("/api/v1/ai/usage", headers=auth_headers)).status_code == 403
+    response = await client.get(
+        "/api/v1/ai/usage", params={"days": 1, "user_id": (await client.get("/api/v1/users/me", headers=auth_headers)).json()["id"]},
+        headers=other_auth_headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    today = body["days"][0]
+    assert today["requests"] == 2 and today["by_role"]["client"]["requests"] == 2
+    assert today["top_users"][0]["prompt_tokens"] == today["prompt_tokens"] > 0
+    # Reservations were settled down to the tokens actually used
+    used = today["prompt_tokens"] + today["response_tokens"]
+    assert 5000 - used <= body["user"]["remaining_tokens"] <= 5000 - used + 1
+    assert body["quota"] == {"allowed": 4, "rejected": 2}  # incl. the pre-drain above
+
+
+@pytest.mark.asyncio
+async def test_stream_charges_sent_window_and_partial_answer(client: AsyncClient, auth_headers, quota_backend, monkeypatch):
+    from app.api.v1.endpoints import ai
+    from app.services.gemini import GeminiError
+
+    _, quota = quota_backend
+    history = [{"role": "user", "parts": ["x" * 40]}]
+
+    class SummarizedContextStore:
+        async def get_context(self, session_id):
+            # Long conversation: most stored turns were folded into the summary
+            return ContextWindow(messages=history, stored_tokens=50_000)
+
+        async def append_messages(self, session_id, messages, keep_last=None):
+            pass
+
+    class FailingGemini:
+        model = "gemini-test"
+        api_key = "k"
+
+        async def stream_generate_content(self, contents):
+            yield "Kaucja wynosi trzy czynsze. "
+            yield "Zwrot następuje "
+            raise GeminiError("connection reset")
+
+    monkeypatch.setattr(ai, "_context_store", SummarizedContextStore())
+    monkeypatch.setattr(ai, "_gemini", FailingGemini())
+
+    response = await client.post("/api/v1/ai/generate/stream", json={"prompt": "Kaucja?", "session_id": "q4"}, headers=auth_headers)
+    assert "event: chunk" in response.text and "event: error" in response.text
+
+    today = (await quota.usage(days=1))[0]
+    assert today["requests"] == 1
+    assert today["prompt_tokens"] == message_tokens(history[0]) + estimate_tokens("Kaucja?")
+    sent = "".join(json.loads(line[len("data: "):])["text"] for line in response.text.splitlines() if line.startswith("data: {\"text\""))
+    assert today["response_tokens"] == estimate_tokens(sent) > 0
@@ -0,0 +1,106 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db.models import AuditLog
+
+
+def test_cursor_roundtrip():
+    ts = datetime(2024, 5, 1, 12, 30)
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(ts, row_id)) == (ts, row_id)
+
+
+@pytest.mark.asyncio
+async def test_audit_logs_invalid_cursor(client: AsyncClient):
+    response = await client.get("/api/v1/audit/logs?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_audit_logs_keyset_pagination_and_filters(client: AsyncClient, db_session, test_user):
+    action = f"keyset_{uuid.uuid4().hex[:6]}"
+    base = datetime(2024, 1, 1)
+    db_session.add_all([
+        AuditLog(
+            action=action,
+            actor_id=test_user.id if i % 2 else None,
+            timestamp=base + timedelta(minutes=i // 2),  # duplicate timestamps on purpose
+        )
+        for i in range(7)
+    ])
+    await db_session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"action": action, "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/v1/audit/logs", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+
+    response = await client.get(
+        "/api/v1/audit/logs",
+        params={"action": action, "actor_id": str(test_user.id), "since": (base + timedelta(minutes=1)).isoformat()},
+    )
+    items = response.json()["items"]
+    assert len(items) == 2  # i = 3, 5
+    assert all(item["actor_id"] == str(test_user.id) for item in items)
+
+
+@pytest.mark.asyncio
+async def test_audit_export_requires_admin(client: AsyncClient, auth_headers):
+    response = await client.get("/api/v1/audit/export", headers=auth_headers)
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_audit_export_streams_and_resumes(client: AsyncClient, db_session, test_user, auth_headers):
+    import json
+    from app.db.session import get_session_factory
+    from app.main import app
+    from tests.conftest import TestingSessionLocal
+
+    test_user.role = "ADMIN"
+    action = f"export_{uuid.uuid4().hex[:6]}"
+    db_session.add_all([
+        AuditLog(action=action, timestamp=datetime(2024, 2, 1) + timedelta(seconds=i))
+        for i in range(5)
+    ])
+    await db_session.commit()
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+
+    response = await client.get(
+        "/api/v1/audit/export", params={"action": action, "chunk_rows": 2}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == 5
+    assert records == sorted(records, key=lambda r: r["timestamp"])
+
+    resumed = await client.get(
+        "/api/v1/audit/export",
+        params={"action": action, "cursor": records[1]["cursor"]},
+        headers=auth_headers,
+    )
+    assert [json.loads(line)["id"] for line in resumed.text.splitlines()] == [r["id"] for r in records[2:]]
+
+    as_csv = await client.get(
+        "/api/v1/audit/export", params={"action": action, "format": "csv"}, headers=auth_headers
+    )
+    lines = as_csv.text.splitlines()
+    assert lines[0].startswith("id,timestamp,action")
+    assert len(lines) == 6
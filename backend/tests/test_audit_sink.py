@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.services.audit import AuditSink
+
+
+class FakeSession:
+    def __init__(self, batches):
+        self.batches = batches
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows):
+        self.batches.append(list(rows))
+
+    async def commit(self):
+        pass
+
+
+class SlowSession(FakeSession):
+    async def execute(self, statement, rows):
+        await asyncio.sleep(0.05)
+        self.batches.append(list(rows))
+
+
+def make_sink(batches, **kwargs):
+    return AuditSink(session_factory=lambda: FakeSession(batches), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_sink_flushes_full_batches():
+    batches = []
+    sink = make_sink(batches, batch_size=3, flush_interval_ms=1000)
+    sink.start()
+    for _ in range(6):
+        await sink.log(action="user_login")
+    await asyncio.sleep(0.05)
+    assert [len(b) for b in batches] == [3, 3]
+    await sink.stop()
+
+
+@pytest.mark.asyncio
+async def test_sink_flushes_on_interval():
+    batches = []
+    sink = make_sink(batches, batch_size=100, flush_interval_ms=20)
+    sink.start()
+    await sink.log(action="user_login")
+    await asyncio.sleep(0.1)
+    assert len(batches) == 1
+    assert batches[0][0]["action"] == "user_login"
+    await sink.stop()
+
+
+@pytest.mark.asyncio
+async def test_sink_stop_flushes_buffer():
+    batches = []
+    sink = make_sink(batches, batch_size=2, flush_interval_ms=1000)
+    for _ in range(5):
+        await sink.log(action="user_registered")
+    await sink.stop()
+    assert sum(len(b) for b in batches) == 5
+    assert sink.stats["written"] == 5
+
+
+@pytest.mark.asyncio
+async def test_sink_stop_waits_for_write_in_progress():
+    batches = []
+    sink = AuditSink(session_factory=lambda: SlowSession(batches), batch_size=2, flush_interval_ms=1000)
+    sink.start()
+    for _ in range(5):
+        await sink.log(action="case_created")
+    await asyncio.sleep(0.01)  # first batch is being written
+    await sink.stop()
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert sink.stats["written"] == 5 and sink.stats["failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_sink_overflow_policies():
+    newest = make_sink([], max_buffer=2, overflow_policy="drop_newest")
+    oldest = make_sink([], max_buffer=2, overflow_policy="drop_oldest")
+    for action in ("a", "b", "c"):
+        await newest.log(action=action)
+        await oldest.log(action=action)
+
+    assert newest.stats["dropped"] == 1
+    assert [newest._queue.get_nowait()["action"] for _ in range(2)] == ["a", "b"]
+    assert oldest.stats["dropped"] == 1
+    assert [oldest._queue.get_nowait()["action"] for _ in range(2)] == ["b", "c"]
+
+
+def test_sink_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        AuditSink(overflow_policy="spill_to_disk")
@@ -0,0 +1,75 @@
+import os
+import random
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.core.encryption import EncryptionService, encryption_service
+from app.db.models import UserProfile
+from app.jobs.blind_index import backfill_blind_indexes
+
+
+def random_pesel() -> str:
+    return "".join(random.choice("0123456789") for _ in range(11))
+
+
+def test_blind_index_normalizes_and_separates_fields():
+    index = encryption_service.blind_index
+    assert index("phone", "+48 123-456-789") == index("phone", "+48123456789")
+    assert index("phone", "44051401359") != index("pesel", "44051401359")
+    assert index("pesel", None) is None and len(index("pesel", "44051401359")) == 32
+
+
+def test_blind_index_survives_key_rotation():
+    rotated = EncryptionService(key=encryption_service.key, keyring={2: os.urandom(32)}, active_key_id=2)
+    assert rotated.blind_index("pesel", "44051401359") == encryption_service.blind_index("pesel", "44051401359")
+
+
+@pytest.mark.asyncio
+async def test_lookup_by_pesel_and_phone(
+    client: AsyncClient, db_session, test_user, auth_headers, second_test_user, other_auth_headers
+):
+    pesel, phone = random_pesel(), f"+48{random.randint(10**8, 10**9 - 1)}"
+    response = await client.patch("/api/v1/users/me", json={"pesel": pesel, "phone": phone}, headers=other_auth_headers)
+    assert response.status_code == 200
+
+    response = await client.get("/api/v1/users/lookup", params={"pesel": pesel}, headers=other_auth_headers)
+    assert response.status_code == 403
+
+    test_user.role = "ADMIN"
+    await db_session.commit()
+
+    response = await client.get("/api/v1/users/lookup", params={"pesel": pesel}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [u["id"] for u in response.json()] == [str(second_test_user.id)]
+
+    spaced = f"{phone[:3]} {phone[3:6]}-{phone[6:9]}-{phone[9:]}"
+    response = await client.get("/api/v1/users/lookup", params={"phone": spaced}, headers=auth_headers)
+    assert [u["id"] for u in response.json()] == [str(second_test_user.id)]
+
+    response = await client.get("/api/v1/users/lookup", params={"pesel": random_pesel()}, headers=auth_headers)
+    assert response.json() == []
+
+    response = await client.get("/api/v1/users/lookup", params={"pesel": pesel, "phone": phone}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_backfill_indexes_existing_profiles(db_session, test_user):
+    from tests.conftest import TestingSessionLocal
+
+    pesel = random_pesel()
+    profile = UserProfile(user_id=test_user.id, pesel_enc=encryption_service.encrypt(pesel))
+    db_session.add(profile)
+    await db_session.commit()
+    assert profile.pesel_bidx is None
+
+    stats = await backfill_blind_indexes(TestingSessionLocal, batch_size=2)
+    assert stats["rows_indexed"] >= 1
+
+    found = await db_session.scalar(
+        select(UserProfile.id).where(UserProfile.pesel_bidx == encryption_service.blind_index("pesel", pesel))
+    )
+    assert found == profile.id
+    assert (await backfill_blind_indexes(TestingSessionLocal)) == {"rows_indexed": 0}
@@ -69,3 +69,55 @@ async def test_read_cases_pagination(client: AsyncClient, auth_headers):
     data = response.json()
     assert isinstance(data, list)
     assert len(data) <= 2
+
+@pytest.mark.asyncio
+async def test_read_cases_keyset_pagination(client: AsyncClient, db_session, second_test_user, other_auth_headers):
+    from datetime import datetime, timedelta
+    from app.db.models import Case
+
+    # Explicit timestamps (with duplicates, to exercise the id tie-break);
+    # SQLite's CURRENT_TIMESTAMP text does not compare correctly with bound datetimes
+    base = datetime(2024, 1, 1)
+    db_session.add_all([
+        Case(user_id=second_test_user.id, title=f"Keyset {i}", created_at=base + timedelta(minutes=i // 2))
+        for i in range(5)
+    ])
+    await db_session.commit()
+
+    seen = []
+    params = {"limit": 2, "count": "exact"}
+    for _ in range(5):
+        response = await client.get("/api/v1/cases/", params=params, headers=other_auth_headers)
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "5"
+        seen.extend(case["id"] for case in response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        params["cursor"] = next_cursor
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+@pytest.mark.asyncio
+async def test_read_cases_documents_are_opt_in(client: AsyncClient, auth_headers, tmp_path, monkeypatch):
+    from app.services import storage
+    monkeypatch.setattr(storage.blob_store, "root", str(tmp_path))
+
+    created = await client.post("/api/v1/cases/", json={"title": "With docs"}, headers=auth_headers)
+    case_id = created.json()["id"]
+    upload = await client.post(
+        f"/api/v1/cases/{case_id}/documents",
+        files={"file": ("brief.pdf", b"%PDF-1.4 brief", "application/pdf")},
+        headers=auth_headers,
+    )
+    assert upload.status_code == 200
+
+    response = await client.get("/api/v1/cases/", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() and all("documents" not in case for case in response.json())
+
+    response = await client.get("/api/v1/cases/?include=documents", headers=auth_headers)
+    assert response.status_code == 200
+    case = next(case for case in response.json() if case["id"] == case_id)
+    assert [(d["id"], d["filename"]) for d in case["documents"]] == [(upload.json()["id"], "brief.pdf")]
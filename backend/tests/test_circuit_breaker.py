@@ -0,0 +1,88 @@
+import pytest
+
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock, **kwargs):
+    kwargs.setdefault("window", 10)
+    kwargs.setdefault("min_calls", 4)
+    return CircuitBreaker("test", open_seconds=30, half_open_calls=2, slow_call_seconds=5, clock=clock, **kwargs)
+
+
+def call(breaker, failed=False, duration=0.1):
+    breaker.acquire()
+    if failed:
+        breaker.record_failure()
+    else:
+        breaker.record_success(duration)
+
+
+def test_opens_on_failure_rate_and_fails_fast():
+    clock = Clock()
+    breaker = make_breaker(clock)
+    for failed in (True, False, True):
+        call(breaker, failed)
+    assert breaker.state == CLOSED  # below min_calls
+
+    call(breaker, failed=True)
+    assert breaker.state == OPEN
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.acquire()
+    assert exc.value.retry_after == pytest.approx(20)
+
+    stats = breaker.get_stats()
+    assert stats["rejected"] == 1 and stats["transitions"]["closed_to_open"] == 1
+    assert stats["last_transition"]["reason"] == "failure rate 75% over 4 calls"
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = make_breaker(Clock())
+    for duration in (6, 0.1, 7, 8):
+        call(breaker, duration=duration)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probes_close_or_reopen():
+    clock = Clock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        call(breaker, failed=True)
+
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+    breaker.acquire()
+    breaker.acquire()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()  # only two probes at a time
+    breaker.release()
+    breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    call(breaker)
+    assert breaker.state == HALF_OPEN
+    call(breaker)
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["window_calls"] == 0
+    assert breaker.get_stats()["transitions"] == {
+        "closed_to_open": 1, "open_to_half_open": 2, "half_open_to_open": 1, "half_open_to_closed": 1,
+    }
+
+
+def test_latency_percentile_needs_samples():
+    breaker = make_breaker(Clock())
+    assert breaker.latency_percentile(95) is None
+    for duration in (0.1, 0.2, 0.3, 4.0):
+        call(breaker, duration=duration)
+    assert breaker.latency_percentile(50) == 0.3
+    assert breaker.latency_percentile(95) == 4.0
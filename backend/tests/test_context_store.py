@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from app.services.context_store import SUMMARY_PREFIX, ContextStore, decode_message, encode_message, fit_to_budget
+from tests.fake_redis import FakeRedis
+
+
+class BrokenRedis:
+    def pipeline(self, transaction=True):
+        raise ConnectionError("connection refused")
+
+
+def make_store(redis) -> ContextStore:
+    store = ContextStore("redis://localhost:6379/0")
+    store.redis = redis
+    return store
+
+
+def test_encoding_round_trip_and_size():
+    for role, text in [("user", "Zażółć gęślą jaźń"), ("model", ""), ("summary", "x" * 1000)]:
+        raw = encode_message(role, text)
+        assert decode_message(raw) == {"role": role, "parts": [text]}
+        assert len(raw) < len(json.dumps({"role": role, "parts": [text]}).encode())
+
+
+def test_legacy_json_entries_still_decode():
+    legacy = json.dumps({"role": "model", "parts": ["old answer"]}).encode()
+    assert decode_message(legacy) == {"role": "model", "parts": ["old answer"]}
+
+
+def test_unknown_format_version_is_rejected():
+    with pytest.raises(ValueError):
+        decode_message(b"\x07\x04user hi")
+
+
+def test_window_keeps_newest_turns_within_budget():
+    turns = [{"role": "user", "parts": ["x" * 400]} for _ in range(10)]  # 104 tokens each
+    window = fit_to_budget(turns, None, 350)
+    assert len(window.messages) == 3
+    assert window.stored_tokens == 1040
+
+    window = fit_to_budget(turns, "s" * 200, 350)
+    assert window.messages[0] == {"role": "user", "parts": [SUMMARY_PREFIX + "s" * 200]}
+    assert len(window.messages) == 3  # the summary displaced one turn
+
+    # A turn that doesn't fit ends the window even if older ones would
+    assert fit_to_budget(turns[:2] + [{"role": "user", "parts": ["y" * 4000]}], None, 350).messages == []
+
+
+@pytest.mark.asyncio
+async def test_turns_appended_in_one_transaction():
+    redis = FakeRedis()
+    store = make_store(redis)
+
+    await store.append_messages("s1", [("user", "question"), ("model", "answer")])
+
+    assert redis.round_trips == 1
+    assert redis.transactions == [True]
+    assert redis.ttls["context:s1"] == 3600
+    window = await store.get_context("s1")
+    assert window.messages == [
+        {"role": "user", "parts": ["question"]},
+        {"role": "model", "parts": ["answer"]},
+    ]
+    assert redis.round_trips == 2
+
+
+@pytest.mark.asyncio
+async def test_context_is_capped_and_mixed_formats_read():
+    redis = FakeRedis()
+    redis.lists["context:s1"] = [json.dumps({"role": "user", "parts": ["legacy"]}).encode()]
+    store = make_store(redis)
+
+    for i in range(3):
+        await store.append_messages("s1", [("user", f"q{i}"), ("model", f"a{i}")], keep_last=5)
+
+    messages = (await store.get_context("s1")).messages
+    assert len(messages) == 5
+    assert messages[-1] == {"role": "model", "parts": ["a2"]}
+
+    redis.lists["context:s2"] = [redis.lists["context:s1"][0], json.dumps({"role": "model", "parts": ["old"]}).encode()]
+    assert [m["parts"][0] for m in (await store.get_context("s2")).messages] == ["a0", "old"]
+
+
+@pytest.mark.asyncio
+async def test_fold_replaces_oldest_turns_with_summary():
+    redis = FakeRedis()
+    store = make_store(redis)
+    await store.append_messages("s1", [("user", "q0"), ("model", "a0"), ("user", "q1"), ("model", "a1")])
+
+    summary, raw = await store.load("s1")
+    assert summary is None
+    assert await store.fold_into_summary("s1", raw[:2], "asked q0, got a0")
+
+    window = await store.get_context("s1")
+    assert [m["parts"][0] for m in window.messages] == [SUMMARY_PREFIX + "asked q0, got a0", "q1", "a1"]
+
+    # The head changed since it was read: nothing is dropped
+    assert not await store.fold_into_summary("s1", raw[:2], "stale")
+    assert len(redis.lists["context:s1"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_degrade_to_empty_context():
+    store = make_store(BrokenRedis())
+    await store.append_messages("s1", [("user", "q")])
+    window = await store.get_context("s1")
+    assert window.messages == [] and window.stored_tokens == 0
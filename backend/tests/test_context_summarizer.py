@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.core.tokens import message_tokens
+from app.services.context_store import SUMMARY_PREFIX, ContextStore
+from app.services.context_summarizer import ContextSummarizer
+from tests.fake_redis import FakeRedis
+
+
+class FakeGemini:
+    def __init__(self, reply="summary"):
+        self.reply = reply
+        self.prompts = []
+
+    async def generate(self, prompt, context=None):
+        self.prompts.append(prompt)
+        return self.reply
+
+
+def make_summarizer(budget_tokens=1000, reply="summary"):
+    store = ContextStore("redis://localhost:6379/0", budget_tokens=budget_tokens)
+    store.redis = FakeRedis()
+    gemini = FakeGemini(reply)
+    return ContextSummarizer(store, gemini, budget_tokens=budget_tokens, summary_tokens=100), store, gemini
+
+
+def test_schedules_only_over_budget_and_once():
+    summarizer, _, _ = make_summarizer(budget_tokens=1000)
+    assert not summarizer.schedule_if_needed("s1", 1000)
+    assert summarizer.schedule_if_needed("s1", 1001)
+    assert not summarizer.schedule_if_needed("s1", 5000)
+    assert summarizer.pending == 1
+
+
+@pytest.mark.asyncio
+async def test_oldest_turns_folded_newest_kept_raw():
+    summarizer, store, gemini = make_summarizer(budget_tokens=1000)
+    turns = [("user" if i % 2 == 0 else "model", f"turn {i} " + "x" * 800) for i in range(8)]  # ~206 tokens each
+    await store.append_messages("s1", turns)
+
+    assert await summarizer.summarize("s1")
+    summary, raw = await store.load("s1")
+    assert summary == "summary"
+    assert len(raw) == 2  # 2 x 206 <= 500, half the budget
+    assert "turn 0" in gemini.prompts[0] and "turn 5" in gemini.prompts[0] and "turn 6" not in gemini.prompts[0]
+    assert "Existing summary: (none)" in gemini.prompts[0]
+
+    window = await store.get_context("s1")
+    assert window.messages[0]["parts"][0] == SUMMARY_PREFIX + "summary"
+    assert [m["parts"][0][:6] for m in window.messages[1:]] == ["turn 6", "turn 7"]
+
+    # Nothing left to fold
+    assert not await summarizer.summarize("s1")
+    assert summarizer.stats["summarized"] == 1 and summarizer.stats["turns_folded"] == 6
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_leaves_context_untouched():
+    summarizer, store, _ = make_summarizer(budget_tokens=100, reply="Error calling Gemini API.")
+    await store.append_messages("s1", [("user", "x" * 400), ("model", "y" * 400)])
+    assert not await summarizer.summarize("s1")
+    summary, raw = await store.load("s1")
+    assert summary is None and len(raw) == 2
+    assert summarizer.stats["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_long_session_stays_within_budget():
+    summarizer, store, gemini = make_summarizer(budget_tokens=1000, reply="s" * 2000)
+    summarizer.start()
+    for i in range(40):
+        window = await store.get_context("s1")
+        assert sum(message_tokens(m) for m in window.messages) <= 1000
+        await store.append_messages("s1", [("user", "q" * 1200), ("model", "a" * 1200)])
+        summarizer.schedule_if_needed("s1", window.stored_tokens + 600)
+        while summarizer.pending:
+            await asyncio.sleep(0)
+    await summarizer.stop()
+
+    summary, raw = await store.load("s1")
+    assert len(summary) == 100 * 4  # capped to summary_tokens
+    assert len(raw) <= 4
+    assert "Existing summary: sss" in gemini.prompts[-1]
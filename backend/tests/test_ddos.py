@@ -75,3 +75,122 @@ async def test_ddos_whitelist_works(client: AsyncClient):
     # Should still be able to access valid endpoint
     response = await client.get("/api/v1/auth/register", headers=headers) # Method not allowed maybe (GET on POST endpoint), but not 429
     assert response.status_code != 429
+
+
+def make_scope(ip="10.9.9.9", path="/api/v1/health", scope_type="http"):
+    return {"type": scope_type, "path": path, "headers": [(b"x-forwarded-for", ip.encode())], "client": ("127.0.0.1", 5000)}
+
+
+async def call_asgi(middleware, scope):
+    sent = []
+
+    async def receive():
+        raise AssertionError("request body must not be read")
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_ddos_banned_ip_rejected_before_body_is_read():
+    from app.middleware.ddos_protection import DDoSProtectionMiddleware
+
+    async def app(scope, receive, send):
+        raise AssertionError("app must not be called for a banned IP")
+
+    middleware = DDoSProtectionMiddleware(app, trusted_ips=[])
+    middleware.banned_ips["10.9.9.9"] = datetime.now(timezone.utc) + timedelta(minutes=5)
+    sent = await call_asgi(middleware, make_scope())
+    assert sent[0]["status"] == 429
+    assert b"banned" in sent[1]["body"]
+
+
+@pytest.mark.asyncio
+async def test_ddos_passes_messages_through_and_calls_app_once():
+    from app.middleware.ddos_protection import DDoSProtectionMiddleware
+
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["type"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in (b"a", b"b", b""):
+            await send({"type": "http.response.body", "body": chunk, "more_body": bool(chunk)})
+
+    middleware = DDoSProtectionMiddleware(app, trusted_ips=[])
+    sent = await call_asgi(middleware, make_scope())
+    assert [m.get("body") for m in sent] == [None, b"a", b"b", b""]
+
+    # A failing check lets the request through exactly once
+    async def broken(ip, suspicious):
+        raise RuntimeError("boom")
+
+    middleware._verdict = broken
+    await call_asgi(middleware, make_scope())
+    await call_asgi(middleware, make_scope(scope_type="websocket"))
+    assert calls == ["http", "http", "websocket"]
+
+
+class ScriptRedis:
+    """
+    Records EVALSHA-style script calls and answers with queued verdicts.
+    """
+
+    def __init__(self, verdicts):
+        self.verdicts = list(verdicts)
+        self.calls = []
+
+    def register_script(self, source):
+        async def run(keys, args):
+            self.calls.append((keys, args))
+            return self.verdicts.pop(0)
+        return run
+
+
+@pytest.mark.asyncio
+async def test_ddos_one_script_call_per_request():
+    from app.middleware.ddos_protection import DDoSProtectionMiddleware
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    redis_client = ScriptRedis([0, 2, 1])
+    middleware = DDoSProtectionMiddleware(app, redis_client=redis_client, trusted_ips=[], max_violations=3)
+    assert (await call_asgi(middleware, make_scope()))[0]["status"] == 204
+    assert b"Too many violations" in (await call_asgi(middleware, make_scope(path="/.env")))[1]["body"]
+    assert b"temporarily banned due to" in (await call_asgi(middleware, make_scope()))[1]["body"]
+
+    assert redis_client.calls == [
+        (["ddos:ban:10.9.9.9", "ddos:violations:10.9.9.9"], [0, 3, 300, 900]),
+        (["ddos:ban:10.9.9.9", "ddos:violations:10.9.9.9"], [1, 3, 300, 900]),
+        (["ddos:ban:10.9.9.9", "ddos:violations:10.9.9.9"], [0, 3, 300, 900]),
+    ]
+
+    # Without Redis the in-memory fallback keeps the same rules
+    redis_client.verdicts = []
+    middleware.redis_client = None
+    middleware._check_script = None
+    for _ in range(2):
+        assert (await call_asgi(middleware, make_scope(ip="10.1.1.1", path="/wp-admin")))[0]["status"] == 204
+    assert (await call_asgi(middleware, make_scope(ip="10.1.1.1", path="/wp-admin")))[0]["status"] == 429
+    assert (await call_asgi(middleware, make_scope(ip="10.1.1.1")))[0]["status"] == 429
+
+
+@pytest.mark.asyncio
+async def test_ddos_admin_api_is_not_a_suspicious_path(client: AsyncClient):
+    headers = {"X-Forwarded-For": "10.0.0.9"}
+    for _ in range(10):
+        response = await client.get("/api/v1/admin/key-rotation", headers=headers)
+        assert response.status_code != 429
+    assert (await client.get("/api/v1/cases/", headers=headers)).status_code != 429
+
+    from app.middleware.ddos_protection import DDoSProtectionMiddleware
+
+    middleware = DDoSProtectionMiddleware(None, redis_client=None, trusted_ips=[])
+    assert await middleware._detect_suspicious_pattern("/wp-admin/install.php", "10.0.0.9")
+    assert await middleware._detect_suspicious_pattern("/.ENV", "10.0.0.9")
+    assert not await middleware._detect_suspicious_pattern("/api/v1/admin/key-rotation", "10.0.0.9")
@@ -0,0 +1,163 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from httpx import AsyncClient
+
+from app.db.session import get_session_factory
+from app.main import app
+from app.services import storage
+from app.services.document_analysis import DocumentAnalysisError, DocumentAnalyzer, extract_text, split_into_chunks, document_analyzer
+from app.services.vector_index import vector_index_store
+from tests.conftest import TestingSessionLocal
+
+
+class FakeGemini:
+    model = "fake-model"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, prompt, context=None):
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return f"summary #{len(self.prompts)}"
+
+
+def test_chunks_respect_budget_and_keep_text():
+    paragraphs = [f"Paragraf {i}. " + "Zdanie o umowie. " * (i % 7 + 1) for i in range(200)]
+    paragraphs.append("Bardzo długie zdanie bez kropki " * 200)
+    text = "\n\n".join(paragraphs)
+
+    chunks = split_into_chunks(text, max_tokens=100)
+    assert all(len(c) <= 400 for c in chunks)
+    assert "".join(chunks).replace(" ", "").replace("\n", "") == text.replace(" ", "").replace("\n", "")
+    assert split_into_chunks("  \n\n \n", max_tokens=100) == []
+
+
+def test_extract_text_formats(tmp_path):
+    docx = io.BytesIO()
+    with zipfile.ZipFile(docx, "w") as archive:
+        ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+        archive.writestr(
+            "word/document.xml",
+            f'<w:document xmlns:w="{ns}"><w:body><w:p><w:r><w:t>Nakaz </w:t></w:r><w:r><w:t>zapłaty</w:t></w:r></w:p>'
+            f"<w:p><w:r><w:t>Sąd Rejonowy</w:t></w:r></w:p></w:body></w:document>",
+        )
+    (tmp_path / "a.docx").write_bytes(docx.getvalue())
+    assert extract_text(str(tmp_path / "a.docx"), None, "a.docx") == "Nakaz zapłaty\n\nSąd Rejonowy"
+
+    (tmp_path / "a.html").write_text("<html><head><title>x</title></head><body><p>Pozew</p><script>1</script></body></html>")
+    assert extract_text(str(tmp_path / "a.html"), "text/html").strip() == "Pozew"
+
+    (tmp_path / "a.txt").write_bytes("Wezwanie do zapłaty".encode("cp1250"))
+    assert extract_text(str(tmp_path / "a.txt"), "text/plain") == "Wezwanie do zapłaty"
+
+
+def test_extract_text_rejects_oversized_input(tmp_path):
+    (tmp_path / "big.txt").write_bytes(b"a" * 2048)
+    with pytest.raises(DocumentAnalysisError, match="exceeds 1024 bytes"):
+        extract_text(str(tmp_path / "big.txt"), "text/plain", max_bytes=1024)
+
+    # Small on disk, large once unpacked
+    bomb = io.BytesIO()
+    with zipfile.ZipFile(bomb, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", "<w:document>" + " " * 100_000 + "</w:document>")
+    (tmp_path / "bomb.docx").write_bytes(bomb.getvalue())
+    assert len(bomb.getvalue()) < 1024
+    with pytest.raises(DocumentAnalysisError, match="unpacked"):
+        extract_text(str(tmp_path / "bomb.docx"), None, "bomb.docx", max_bytes=1024)
+
+    (tmp_path / "broken.docx").write_bytes(b"not a zip")
+    with pytest.raises(DocumentAnalysisError, match="valid .docx"):
+        extract_text(str(tmp_path / "broken.docx"), None, "broken.docx")
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_is_concurrent_and_bounded():
+    gemini = FakeGemini(delay=0.01)
+    analyzer = DocumentAnalyzer(gemini, chunk_tokens=50, max_concurrency=3)
+    progress = []
+
+    async def on_progress(done, total):
+        progress.append((done, total))
+
+    text = "\n\n".join(f"Akapit {i}: " + "x" * 150 for i in range(20))
+    result = await analyzer.analyze_text(text, on_progress=on_progress)
+
+    map_calls = sum("part" in p and "of 20" in p for p in gemini.prompts)
+    assert map_calls == 20
+    assert gemini.max_in_flight == 3
+    assert progress[0] == (0, 20) and progress[-1] == (20, 20)
+    assert "Risks and recommended actions" in gemini.prompts[-1]
+    assert result == f"summary #{len(gemini.prompts)}"
+
+
+@pytest.mark.asyncio
+async def test_single_chunk_needs_one_call():
+    gemini = FakeGemini()
+    analyzer = DocumentAnalyzer(gemini)
+    await analyzer.analyze_text("Krótki dokument, PESEL 02270803624.")
+    assert len(gemini.prompts) == 1
+    assert "02270803624" not in gemini.prompts[0]
+
+
+@pytest.fixture
+def analysis_backend(tmp_path, monkeypatch):
+    gemini = FakeGemini()
+    monkeypatch.setattr(storage.blob_store, "root", str(tmp_path))
+    monkeypatch.setattr(vector_index_store, "root", str(tmp_path / "index"))
+    monkeypatch.setattr(document_analyzer, "gemini", gemini)
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    yield gemini
+    app.dependency_overrides.pop(get_session_factory, None)
+
+
+async def upload_text(client: AsyncClient, headers, payload: bytes):
+    case = await client.post("/api/v1/cases/", json={"title": "Analiza"}, headers=headers)
+    case_id = case.json()["id"]
+    response = await client.post(
+        f"/api/v1/cases/{case_id}/documents",
+        files={"file": ("pismo.txt", payload, "text/plain")},
+        headers=headers,
+    )
+    return f"/api/v1/cases/{case_id}/documents/{response.json()['id']}/analysis"
+
+
+@pytest.mark.asyncio
+async def test_analysis_job_and_reuse(client: AsyncClient, auth_headers, other_auth_headers, analysis_backend):
+    gemini = analysis_backend
+    url = await upload_text(client, auth_headers, b"Nakaz zaplaty na kwote 1000 zl.")
+
+    assert (await client.get(url, headers=auth_headers)).status_code == 404
+    response = await client.post(url, headers=auth_headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "PENDING"
+
+    for _ in range(100):
+        body = (await client.get(url, headers=auth_headers)).json()
+        if body["status"] not in ("PENDING", "RUNNING"):
+            break
+        await asyncio.sleep(0.01)
+    assert body["status"] == "COMPLETED", body
+    assert body["summary"] == "summary #1"
+    assert body["chunks_done"] == body["chunks_total"] == 1
+
+    # Repeat requests and identical uploads are served without model calls
+    assert (await client.post(url, headers=auth_headers)).status_code == 200
+    copy_url = await upload_text(client, auth_headers, b"Nakaz zaplaty na kwote 1000 zl.")
+    response = await client.post(copy_url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["summary"] == "summary #1"
+    assert len(gemini.prompts) == 1
+
+    assert (await client.get(url, headers=other_auth_headers)).status_code == 403
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from httpx import ASGITransport, AsyncClient
+
+from app.middleware.body_limit import BodySizeLimitMiddleware
+from app.services import storage
+
+
+@pytest.fixture
+def blob_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.blob_store, "root", str(tmp_path))
+    return tmp_path
+
+
+async def upload(client: AsyncClient, headers, payload: bytes):
+    case = await client.post("/api/v1/cases/", json={"title": "Docs"}, headers=headers)
+    case_id = case.json()["id"]
+    response = await client.post(
+        f"/api/v1/cases/{case_id}/documents",
+        files={"file": ("filing.pdf", payload, "application/pdf")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    return case_id, response.json()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_uploads_share_one_blob(client: AsyncClient, auth_headers, blob_root):
+    payload = os.urandom(10_000)
+    _, first = await upload(client, auth_headers, payload)
+    _, second = await upload(client, auth_headers, payload)
+
+    assert first["content_hash"] == second["content_hash"]
+    assert first["file_url"] == second["file_url"]
+    stored = [f for _, _, files in os.walk(blob_root) for f in files]
+    assert stored == [first["content_hash"]]
+
+
+@pytest.mark.asyncio
+async def test_download_range_and_etag(client: AsyncClient, auth_headers, blob_root):
+    payload = os.urandom(10_000)
+    case_id, document = await upload(client, auth_headers, payload)
+    url = f"/api/v1/cases/{case_id}/documents/{document['id']}"
+
+    full = await client.get(url, headers=auth_headers)
+    assert full.status_code == 200
+    assert full.content == payload
+    assert full.headers["etag"] == f'"{document["content_hash"]}"'
+
+    partial = await client.get(url, headers={**auth_headers, "Range": "bytes=0-1023"})
+    assert partial.status_code == 206
+    assert partial.content == payload[:1024]
+    assert partial.headers["content-range"] == f"bytes 0-1023/{len(payload)}"
+
+    cached = await client.get(url, headers={**auth_headers, "If-None-Match": full.headers["etag"]})
+    assert cached.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_download_requires_case_access(client: AsyncClient, auth_headers, other_auth_headers, blob_root):
+    case_id, document = await upload(client, auth_headers, b"%PDF-1.7 private")
+    response = await client.get(
+        f"/api/v1/cases/{case_id}/documents/{document['id']}", headers=other_auth_headers
+    )
+    assert response.status_code == 403
+
+
+def limited_upload_app(calls):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def receive_upload(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        return {"size": file.size}
+
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=4096)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_body_limit_rejects_before_the_form_is_parsed():
+    calls = []
+    app = limited_upload_app(calls)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        ok = await client.post("/upload", files={"file": ("a.pdf", b"x" * 1000)})
+        assert ok.status_code == 200
+
+        declared = await client.post("/upload", files={"file": ("b.pdf", b"x" * 10_000)})
+        assert declared.status_code == 413
+
+        received = []
+
+        async def chunked():
+            # No Content-Length: the limit has to be enforced while reading
+            yield b'--limit\r\nContent-Disposition: form-data; name="file"; filename="c.pdf"\r\n\r\n'
+            for _ in range(100):
+                received.append(1024)
+                yield b"x" * 1024
+
+        streamed = await client.post(
+            "/upload",
+            content=chunked(),
+            headers={"Content-Type": "multipart/form-data; boundary=limit"},
+        )
+        assert streamed.status_code == 413
+        assert sum(received) <= 4096 + 1024
+
+    assert calls == ["a.pdf"]
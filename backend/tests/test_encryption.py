@@ -0,0 +1,86 @@
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.core.encryption import ENVELOPE_VERSION, EncryptionService
+
+
+@pytest.fixture
+def key():
+    return Fernet.generate_key()
+
+
+@pytest.fixture
+def service(key):
+    return EncryptionService(key=key, offload_threshold=4)
+
+
+def test_envelope_format(service):
+    token = service.encrypt("Jan Kowalski")
+    assert isinstance(token, bytes)
+    assert token[0] == ENVELOPE_VERSION and token[1] == service.active_key_id
+    # header + nonce + ciphertext + tag, no base64
+    assert len(token) == 2 + 12 + len("Jan Kowalski") + 16
+    assert service.decrypt(token) == "Jan Kowalski"
+
+
+def test_legacy_fernet_tokens_still_readable(service, key):
+    legacy = Fernet(key).encrypt("stara wiadomość".encode())
+    assert service.decrypt(legacy.decode()) == "stara wiadomość"  # TEXT column
+    assert service.decrypt(legacy) == "stara wiadomość"  # after conversion to bytea
+    assert service.needs_reencrypt(legacy)
+
+    upgraded = service.reencrypt(legacy)
+    assert upgraded[0] == ENVELOPE_VERSION
+    assert service.decrypt(upgraded) == "stara wiadomość"
+    assert not service.needs_reencrypt(upgraded)
+
+
+def test_key_rotation_reads_both_generations(key):
+    old = EncryptionService(key=key)
+    token = old.encrypt("PESEL 44051401359")
+
+    rotated = EncryptionService(key=key, keyring={2: os.urandom(32)}, active_key_id=2)
+    assert rotated.decrypt(token) == "PESEL 44051401359"
+    assert rotated.needs_reencrypt(token)
+    assert rotated.reencrypt(token)[1] == 2
+
+
+def test_reencrypt_migrates_legacy_plaintext(service):
+    # Written unencrypted by the original profile endpoint
+    for value in (b"ul. Prosta 1, Warszawa", "ul. Prosta 1, Warszawa"):
+        assert service.legacy_plaintext(value) == "ul. Prosta 1, Warszawa"
+        assert service.needs_reencrypt(value)
+        upgraded = service.reencrypt(value)
+        assert upgraded[0] == ENVELOPE_VERSION
+        assert service.decrypt(upgraded) == "ul. Prosta 1, Warszawa"
+
+
+def test_reencrypt_keeps_undecryptable_ciphertext(service):
+    other = EncryptionService(key=Fernet.generate_key(), keyring={7: os.urandom(32)}, active_key_id=7)
+    foreign_envelope = other.encrypt("x")
+    foreign_fernet = other.cipher_suite.encrypt(b"x")
+    for token in (foreign_envelope, foreign_fernet, foreign_fernet.decode(), b"\xff\xfe" + bytes(38)):
+        assert service.legacy_plaintext(token) is None
+        assert service.reencrypt(token) == token
+
+
+@pytest.mark.asyncio
+async def test_batches_preserve_order(service):
+    plaintexts = [f"wiadomość {i}" for i in range(10)]
+
+    tokens = await service.encrypt_many(plaintexts)
+    assert await service.decrypt_many(tokens[:2]) == plaintexts[:2]  # inline path
+    assert await service.decrypt_many(tokens) == plaintexts  # threadpool path
+    assert await service.encrypt_many(["", None]) == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_invalid_tokens_map_to_none(service):
+    other = EncryptionService(key=Fernet.generate_key(), keyring={1: os.urandom(32)})
+    good = service.encrypt("ok")
+    tampered = good[:-1] + bytes([good[-1] ^ 1])
+
+    results = await service.decrypt_many([good, None, b"", "garbage", other.encrypt("x"), tampered])
+    assert results == ["ok", None, None, None, None, None]
@@ -0,0 +1,191 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.gemini import ERROR_REPLY, UNAVAILABLE_REPLY, GeminiError, GeminiService, build_contents
+from tests.gemini_stub import StubState, create_stub_app
+
+
+def make_service(state: StubState, **kwargs) -> GeminiService:
+    kwargs.setdefault("backoff_base", 0.001)
+    return GeminiService(
+        "test-key",
+        base_url="http://stub/v1beta",
+        transport=httpx.ASGITransport(app=create_stub_app(state)),
+        **kwargs,
+    )
+
+
+def test_build_contents_adapts_context():
+    contents = build_contents("hi", [{"role": "assistant", "parts": ["earlier"]}])
+    assert contents == [
+        {"role": "model", "parts": [{"text": "earlier"}]},
+        {"role": "user", "parts": [{"text": "hi"}]},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fifty_concurrent_generations():
+    state = StubState(latency=0.2)
+    service = make_service(state, max_concurrency=50)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(service.generate(f"prompt {i}") for i in range(50)))
+    elapsed = time.perf_counter() - started
+    await service.aclose()
+
+    assert results == [f"[gemini-1.5-flash] prompt {i}" for i in range(50)]
+    assert state.max_in_flight == 50
+    assert elapsed < 2.0  # 50 x 0.2 s = 10 s if the calls were serialized
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    state = StubState(latency=0.02)
+    service = make_service(state, max_concurrency=5)
+    await asyncio.gather(*(service.generate("x") for _ in range(20)))
+    await service.aclose()
+    assert state.max_in_flight == 5
+
+
+@pytest.mark.asyncio
+async def test_retries_on_429_and_5xx():
+    state = StubState(latency=0, fail_status=429, fail_times=2, retry_after="0")
+    service = make_service(state, max_retries=3)
+    assert await service.generate("again") == "[gemini-1.5-flash] again"
+    assert state.requests == 3
+
+    state.fail_status, state.fail_times = 503, 5
+    assert await service.generate("give up") == "Error calling Gemini API."
+    assert state.requests == 3 + 4  # first try + 3 retries
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    state = StubState(latency=0, fail_status=400, fail_times=5)
+    service = make_service(state)
+    assert await service.generate("bad") == "Error calling Gemini API."
+    assert state.requests == 1
+    await service.aclose()
+
+
+def test_backoff_honours_retry_after_and_cap():
+    service = GeminiService("k", backoff_base=1, backoff_max=4)
+    assert service._backoff(0, "2") == 2
+    assert service._backoff(0, "120") == 4
+    assert all(0 <= service._backoff(10) <= 4 for _ in range(100))
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_chunks_in_order():
+    state = StubState(latency=0, chunks=4)
+    service = make_service(state)
+    chunks = [c async for c in service.stream_generate_content(build_contents("stream me please"))]
+    await service.aclose()
+    assert len(chunks) == 4
+    assert "".join(chunks) == "[gemini-1.5-flash] stream me please"
+
+
+@pytest.mark.asyncio
+async def test_stream_retries_before_first_chunk():
+    state = StubState(latency=0, fail_status=503, fail_times=1)
+    service = make_service(state)
+    chunks = [c async for c in service.stream_generate_content(build_contents("x"))]
+    await service.aclose()
+    assert "".join(chunks) == "[gemini-1.5-flash] x"
+    assert state.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_reader_does_not_hold_a_slot():
+    state = StubState(latency=0, chunks=4)
+    service = make_service(state, max_concurrency=1)
+    stream = service.stream_generate_content(build_contents("slow reader"))
+    first = await stream.__anext__()
+
+    # The reader has stalled after one chunk; the only slot is free again
+    assert await asyncio.wait_for(service.generate("next"), 1) == "[gemini-1.5-flash] next"
+    rest = [c async for c in stream]
+    await service.aclose()
+    assert first + "".join(rest) == "[gemini-1.5-flash] slow reader"
+
+
+@pytest.mark.asyncio
+async def test_stream_timeout_bounds_upstream():
+    state = StubState(latency=0, chunks=4, chunk_delay=0.2)
+    service = make_service(state, stream_timeout=0.1)
+    with pytest.raises(GeminiError, match="did not finish"):
+        [c async for c in service.stream_generate_content(build_contents("trickle"))]
+    await service.aclose()
+    assert service.breaker.get_stats()["calls"] == 0  # released, not counted
+
+
+@pytest.mark.asyncio
+async def test_malformed_stream_data_is_a_gemini_error():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        good = 'data: {"candidates": [{"content": {"parts": [{"text": "Kaucja"}]}}]}\r\n\r\n'
+        body = (good if len(requests) > 2 else "") + "data: {not json\r\n\r\n"
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    service = GeminiService(
+        "test-key", base_url="http://stub/v1beta", transport=httpx.MockTransport(handler), backoff_base=0.001, max_retries=2
+    )
+    # Before the first chunk the attempt is retried, after it the stream fails
+    chunks = []
+    with pytest.raises(GeminiError, match="JSONDecodeError"):
+        async for chunk in service.stream_generate_content(build_contents("x")):
+            chunks.append(chunk)
+    await service.aclose()
+    assert chunks == ["Kaucja"] and len(requests) == 3
+    assert service.breaker.get_stats()["failures"] == 3
+
+
+@pytest.mark.asyncio
+async def test_embed_batches_in_order():
+    state = StubState(latency=0)
+    service = make_service(state)
+    vectors = await service.embed(["a", "b", "a"])
+    await service.aclose()
+    assert len(vectors) == 3 and len(vectors[0]) == 8
+    assert vectors[0] == vectors[2] != vectors[1]
+    assert state.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast():
+    state = StubState(latency=0, fail_times=100)
+    breaker = CircuitBreaker("gemini", window=10, min_calls=4, open_seconds=60)
+    service = make_service(state, max_retries=1, breaker=breaker)
+    for _ in range(2):
+        assert await service.generate("x") == ERROR_REPLY
+    assert breaker.state == "open"
+
+    requests = state.requests
+    assert await service.generate("x") == UNAVAILABLE_REPLY
+    with pytest.raises(CircuitOpenError):
+        [c async for c in service.stream_generate_content(build_contents("x"))]
+    assert state.requests == requests
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_attempt_is_hedged():
+    state = StubState(latency=0.01, chunks=1)
+    service = make_service(state, breaker=CircuitBreaker("gemini", min_calls=5), hedge_percentile=95, hedge_min_delay=0.05)
+    for _ in range(5):
+        await service.generate("warm up")
+
+    state.latencies = [2.0]
+    started = time.perf_counter()
+    assert await service.generate("slow") == "[gemini-1.5-flash] slow"
+    assert time.perf_counter() - started < 1.0
+    assert state.requests == 7
+    assert service.get_stats()["hedging"] == {"hedged": 1, "hedge_wins": 1}
+    await service.aclose()
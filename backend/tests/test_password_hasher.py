@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.core import security
+from app.core.security import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.mark.asyncio
+async def test_hasher_roundtrip():
+    hasher = PasswordHasher(max_workers=2, max_pending=4)
+    try:
+        hashed = await hasher.hash("Password123!")
+        assert await hasher.verify("Password123!", hashed)
+        assert not await hasher.verify("WrongPassword123!", hashed)
+        assert hasher.pending == 0
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hasher_rejects_when_queue_full():
+    hasher = PasswordHasher(max_workers=1, max_pending=2, retry_after=3)
+    try:
+        results = await asyncio.gather(
+            *(hasher.hash("Password123!") for _ in range(4)),
+            return_exceptions=True,
+        )
+        busy = [r for r in results if isinstance(r, PasswordHasherBusy)]
+        assert len(busy) == 2
+        assert busy[0].retry_after == 3
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_login_returns_503_when_hasher_saturated(client: AsyncClient, test_user, monkeypatch):
+    monkeypatch.setattr(security.password_hasher, "max_pending", 0)
+    response = await client.post(
+        "/api/v1/auth/login",
+        data={"username": test_user.email, "password": "Password123!"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(security.password_hasher.retry_after)
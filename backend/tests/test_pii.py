@@ -0,0 +1,74 @@
+import random
+import re
+
+import pytest
+
+from app.core.pii import (
+    EMAIL_MASK,
+    PESEL_MASK,
+    PHONE_MASK,
+    PIIStreamSanitizer,
+    asanitize_pii_stream,
+    is_valid_pesel,
+    sanitize_pii,
+    sanitize_pii_stream,
+)
+
+
+def legacy_sanitize(text):
+    # The three-pass implementation this module replaced
+    text = re.sub(r'[\w\.-]+@[\w\.-]+', '[EMAIL PROTECTED]', text)
+    text = re.sub(r'\+?\d{9,15}', '[PHONE REMOVED]', text)
+    return re.sub(r'\b\d{11}\b', '[PESEL REMOVED]', text)
+
+
+def test_is_valid_pesel():
+    assert is_valid_pesel("44051401359")
+    assert is_valid_pesel("02270803624")  # born 2002 (month + 20)
+    assert not is_valid_pesel("44051401358")  # bad checksum
+    assert not is_valid_pesel("12345678901")
+    assert not is_valid_pesel("4405140135")
+
+
+def test_sanitize_masks_each_kind():
+    text = "Jan, PESEL 44051401359, tel. +48123456789, mail jan.kowalski@example.pl"
+    assert sanitize_pii(text) == f"Jan, PESEL {PESEL_MASK}, tel. {PHONE_MASK}, mail {EMAIL_MASK}"
+    # 11 digits that fail the checksum are still masked, just not labelled PESEL
+    assert sanitize_pii("nr 12345678901") == f"nr {PHONE_MASK}"
+    assert sanitize_pii("") == "" and sanitize_pii(None) is None
+
+
+def test_sanitize_matches_legacy_masking():
+    rnd = random.Random(7)
+    alphabet = "0123456789" * 3 + "ab.-_@+ \nż"
+    for _ in range(2000):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 60)))
+        assert sanitize_pii(text).replace(PESEL_MASK, PHONE_MASK) == legacy_sanitize(text)
+
+
+def test_stream_matches_one_shot_for_any_chunking():
+    text = "Klient jan@example.pl, PESEL 44051401359 i telefon +48 600 123 456 lub 600123456.\nżółć " * 20
+    expected = sanitize_pii(text)
+    rnd = random.Random(3)
+    for _ in range(50):
+        data = text.encode()
+        cuts = sorted(rnd.sample(range(1, len(data)), 15))
+        chunks = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]  # may split UTF-8 sequences
+        assert "".join(sanitize_pii_stream(chunks)) == expected
+
+
+def test_stream_bounds_pending_text():
+    sanitizer = PIIStreamSanitizer(max_pending=100)
+    assert sanitizer.feed("x" * 60) == ""
+    assert sanitizer.feed("x" * 60) == "x" * 120
+    assert sanitizer.feed("tail 44051401359") == "tail "
+    assert sanitizer.flush() == PESEL_MASK
+
+
+@pytest.mark.asyncio
+async def test_async_stream():
+    async def chunks():
+        for part in ("napisz do jan", "@example.pl albo zadzwoń 60012", "3456"):
+            yield part
+
+    assert "".join([c async for c in asanitize_pii_stream(chunks())]) == f"napisz do {EMAIL_MASK} albo zadzwoń {PHONE_MASK}"
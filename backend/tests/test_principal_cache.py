@@ -0,0 +1,98 @@
+import pytest
+from httpx import AsyncClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.services.principal_cache import PrincipalCache, snapshot_user, user_from_snapshot
+
+
+@pytest.mark.asyncio
+async def test_local_tier_hit_miss_and_invalidate():
+    cache = PrincipalCache(None, local_ttl=60)
+    assert await cache.get("u1") is None
+    await cache.set("u1", {"user": {"email": "a@example.com"}, "profile": None})
+    assert (await cache.get("u1"))["user"]["email"] == "a@example.com"
+
+    await cache.invalidate("u1")
+    assert await cache.get("u1") is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_local_tier_evicts_lru_and_expired():
+    cache = PrincipalCache(None, local_ttl=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        await cache.set(key, {"user": {}, "profile": None})
+    assert await cache.get("a") is None
+    assert await cache.get("c") is not None
+
+    expired = PrincipalCache(None, local_ttl=0)
+    await expired.set("a", {"user": {}, "profile": None})
+    assert await expired.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_set_refused_after_invalidation_since_read():
+    cache = PrincipalCache(None, local_ttl=60)
+    generation = await cache.generation("u1")
+    # An update commits and invalidates while the old row is being read
+    await cache.invalidate("u1")
+    await cache.set("u1", {"user": {"email": "old@example.com"}, "profile": None}, generation)
+    assert await cache.get("u1") is None
+    assert cache.get_stats()["stale_sets"] == 1
+
+    generation = await cache.generation("u1")
+    await cache.set("u1", {"user": {"email": "new@example.com"}, "profile": None}, generation)
+    assert (await cache.get("u1"))["user"]["email"] == "new@example.com"
+
+
+class DownRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def register_script(self, script):
+        return None
+
+    async def get(self, key):
+        self.calls += 1
+        raise RedisConnectionError("Connection refused")
+
+
+@pytest.mark.asyncio
+async def test_redis_connection_failure_backs_off():
+    cache = PrincipalCache(None, local_ttl=60, redis_backoff=30)
+    cache.redis = DownRedis()
+    for _ in range(5):
+        assert await cache.get("u1") is None
+    assert cache.redis.calls == 1
+    assert cache.get_stats()["redis_skipped"] == 4
+
+    cache._redis_retry_at = 0.0
+    await cache.get("u1")
+    assert cache.redis.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_snapshot_roundtrip_excludes_password_hash(test_user):
+    snapshot = snapshot_user(test_user)
+    assert "password_hash" not in snapshot["user"]
+
+    user = user_from_snapshot(snapshot)
+    assert user.id == test_user.id
+    assert user.email == test_user.email
+    assert user.created_at == test_user.created_at
+
+
+@pytest.mark.asyncio
+async def test_profile_update_invalidates_cached_principal(client: AsyncClient, auth_headers, test_user):
+    from app.services.principal_cache import principal_cache
+
+    await client.get("/api/v1/users/me", headers=auth_headers)
+    assert await principal_cache.get(test_user.id) is not None
+
+    response = await client.patch("/api/v1/users/me", json={"first_name": "Jan"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert await principal_cache.get(test_user.id) is None
@@ -0,0 +1,145 @@
+import asyncio
+import os
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.core.encryption import EncryptionService, encryption_service
+from app.db.models import Case, KeyRotationCheckpoint, Message, UserProfile
+from app.jobs.reencrypt import ENCRYPTED_COLUMNS, _compare_and_set, reencrypt_all
+
+
+def legacy(plaintext: str) -> bytes:
+    return encryption_service.cipher_suite.encrypt(plaintext.encode())
+
+
+@pytest.mark.asyncio
+async def test_reencrypt_upgrades_all_tables_and_resumes(db_session, test_user):
+    from tests.conftest import TestingSessionLocal
+
+    rotated = EncryptionService(key=encryption_service.key, keyring={2: os.urandom(32)}, active_key_id=2)
+    messages = [
+        Message(sender_id=test_user.id, recipient_id=test_user.id, content_enc=legacy(f"wiadomość {i}"))
+        for i in range(7)
+    ]
+    current = Message(sender_id=test_user.id, recipient_id=test_user.id, content_enc=rotated.encrypt("już nowa"))
+    profile = UserProfile(user_id=test_user.id, pesel_enc=encryption_service.encrypt("44051401359"), phone_enc=None)
+    case = Case(user_id=test_user.id, title="Sprawa", description_enc=legacy("opis"))
+    db_session.add_all([*messages, current, profile, case])
+    await db_session.commit()
+
+    results = await reencrypt_all(TestingSessionLocal, service=rotated, batch_size=3, workers=2, max_rows_per_second=0, reset=True)
+    assert results["message"]["rows_scanned"] >= 8
+    assert results["message"]["rows_updated"] >= 7
+
+    async with TestingSessionLocal() as session:
+        rows = dict((await session.execute(select(Message.id, Message.content_enc))).all())
+        assert all(not rotated.needs_reencrypt(v) for v in rows.values())
+        assert [rotated.decrypt(rows[m.id]) for m in messages] == [f"wiadomość {i}" for i in range(7)]
+        assert rows[current.id] == current.content_enc
+
+        pesel, phone = (await session.execute(
+            select(UserProfile.pesel_enc, UserProfile.phone_enc).where(UserProfile.id == profile.id)
+        )).one()
+        assert rotated.decrypt(pesel) == "44051401359" and phone is None
+        description = await session.scalar(select(Case.description_enc).where(Case.id == case.id))
+        assert rotated.decrypt(description) == "opis"
+
+        checkpoints = (await session.execute(select(KeyRotationCheckpoint))).scalars().all()
+        assert {c.table_name for c in checkpoints} == set(ENCRYPTED_COLUMNS)
+        assert all(c.key_id == 2 and c.completed_at is not None for c in checkpoints)
+
+    # Completed checkpoints make a rerun a no-op
+    again = await reencrypt_all(TestingSessionLocal, service=rotated, max_rows_per_second=0)
+    assert all(stats == {"rows_scanned": 0, "rows_updated": 0} for stats in again.values())
+
+
+@pytest.mark.asyncio
+async def test_reencrypt_never_overwrites_concurrent_writes(db_session, test_user):
+    message = Message(sender_id=test_user.id, recipient_id=test_user.id, content_enc=legacy("stara"))
+    db_session.add(message)
+    await db_session.commit()
+    stale = message.content_enc
+
+    # The app rewrote the row after the job read it
+    message.content_enc = encryption_service.encrypt("nowa")
+    await db_session.commit()
+
+    await db_session.execute(
+        _compare_and_set(Message, ("content_enc",)),
+        [{"b_id": message.id, "old_content_enc": stale, "new_content_enc": encryption_service.encrypt("stara")}],
+    )
+    await db_session.commit()
+    await db_session.refresh(message)
+    assert encryption_service.decrypt(message.content_enc) == "nowa"
+
+
+@pytest.mark.asyncio
+async def test_key_rotation_endpoint(client: AsyncClient, db_session, test_user, auth_headers, other_auth_headers):
+    from app.api.v1.endpoints import admin
+    from app.db.session import get_session_factory
+    from app.main import app
+    from tests.conftest import TestingSessionLocal
+
+    response = await client.post("/api/v1/admin/key-rotation", json={}, headers=other_auth_headers)
+    assert response.status_code == 403
+
+    test_user.role = "ADMIN"
+    await db_session.commit()
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+
+    response = await client.post("/api/v1/admin/key-rotation", json={"tables": ["nope"]}, headers=auth_headers)
+    assert response.status_code == 400
+
+    response = await client.post(
+        "/api/v1/admin/key-rotation", json={"tables": ["case"], "reset": True}, headers=auth_headers
+    )
+    assert response.status_code == 202
+    assert response.json()["active_key_id"] == encryption_service.active_key_id
+    await asyncio.wait_for(admin._key_rotation_task, timeout=10)
+
+    response = await client.get("/api/v1/admin/key-rotation", headers=auth_headers)
+    status = response.json()
+    assert status["running"] is False
+    case_status = next(t for t in status["tables"] if t["table_name"] == "case")
+    assert case_status["completed_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_legacy_plaintext_is_indexed_and_encrypted(db_session, test_user):
+    from app.jobs.blind_index import backfill_blind_indexes
+    from tests.conftest import TestingSessionLocal
+
+    # As written by the original update_user_me, before encryption was wired up
+    profile = UserProfile(user_id=test_user.id, pesel_enc=b"44051401359", address_enc=b"ul. Prosta 1")
+    db_session.add(profile)
+    await db_session.commit()
+
+    await backfill_blind_indexes(TestingSessionLocal)
+    await reencrypt_all(TestingSessionLocal, tables=["user_profile"], max_rows_per_second=0, reset=True)
+
+    async with TestingSessionLocal() as session:
+        pesel, bidx, address = (await session.execute(
+            select(UserProfile.pesel_enc, UserProfile.pesel_bidx, UserProfile.address_enc)
+            .where(UserProfile.id == profile.id)
+        )).one()
+    assert bidx == encryption_service.blind_index("pesel", "44051401359")
+    assert pesel[0] == 0x01 and encryption_service.decrypt(pesel) == "44051401359"
+    assert encryption_service.decrypt(address) == "ul. Prosta 1"
+
+
+@pytest.mark.asyncio
+async def test_profile_update_migrates_legacy_plaintext(client: AsyncClient, db_session, test_user, auth_headers):
+    db_session.add(UserProfile(user_id=test_user.id, phone_enc=b"+48600100200"))
+    await db_session.commit()
+
+    response = await client.patch("/api/v1/users/me", json={"first_name": "Jan"}, headers=auth_headers)
+    assert response.status_code == 200
+
+    phone, bidx = (await db_session.execute(
+        select(UserProfile.phone_enc, UserProfile.phone_bidx).where(UserProfile.user_id == test_user.id)
+        .execution_options(populate_existing=True)
+    )).one()
+    assert encryption_service.decrypt(phone) == "+48600100200"
+    assert bidx == encryption_service.blind_index("phone", "+48600100200")
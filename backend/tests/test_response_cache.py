@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.services.response_cache import ResponseCache
+from tests.fake_redis import FakeRedis
+
+
+def make_cache() -> ResponseCache:
+    cache = ResponseCache(None)
+    cache.redis = FakeRedis()
+    return cache
+
+
+def test_key_covers_model_context_and_prompt():
+    key = ResponseCache.make_key("m", "prompt", [{"role": "user", "parts": ["a"]}])
+    assert key == ResponseCache.make_key("m", "prompt", [{"role": "user", "parts": ["a"]}])
+    assert key != ResponseCache.make_key("m2", "prompt", [{"role": "user", "parts": ["a"]}])
+    assert key != ResponseCache.make_key("m", "prompt", [])
+    assert key != ResponseCache.make_key("m", "prompt ", [{"role": "user", "parts": ["a"]}])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call():
+    cache = make_cache()
+    calls = 0
+
+    async def produce():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    results = await asyncio.gather(*(cache.get_or_generate("k", "s", produce) for _ in range(10)))
+    assert results == ["answer"] * 10
+    assert calls == 1
+    assert cache.stats == {"hits": 0, "misses": 1, "coalesced": 9, "bypassed": 0}
+
+    assert await cache.get_or_generate("k", "s", produce) == "answer"
+    assert calls == 1
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_waiters_and_are_not_cached():
+    cache = make_cache()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(cache.get_or_generate("k", "s", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.redis.strings == {}
+
+    async def fallback():
+        return "Error calling Gemini API."
+
+    await cache.get_or_generate("k", "s", fallback, cacheable=lambda text: not text.startswith("Error"))
+    assert cache.redis.strings == {}
+
+
+@pytest.mark.asyncio
+async def test_opted_out_session_bypasses_cache():
+    cache = make_cache()
+    await cache.store("k", "cached")
+    await cache.set_opt_out("private", True)
+
+    async def produce():
+        return "fresh"
+
+    assert await cache.get_or_generate("k", "private", produce) == "fresh"
+    assert cache.redis.strings["k"] == "cached"
+    assert cache.stats["bypassed"] == 1
+
+    await cache.set_opt_out("private", False)
+    assert await cache.get_or_generate("k", "private", produce) == "cached"
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_first_caller_does_not_cancel_the_others():
+    cache = make_cache()
+    release = asyncio.Event()
+    calls = 0
+
+    async def produce():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "answer"
+
+    first = asyncio.create_task(cache.get_or_generate("k", "s", produce))
+    await asyncio.sleep(0)
+    others = [asyncio.create_task(cache.get_or_generate("k", "s", produce)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*others) == ["answer"] * 3
+    assert first.cancelled()
+    assert calls == 1
+    assert cache.redis.strings["k"] == "answer"
+    assert cache.get_stats()["in_flight"] == 0
@@ -0,0 +1,154 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from app.services.storage import BlobStore, UploadTooLarge, acquire_blob_ref, save_upload
+
+
+@pytest.mark.asyncio
+async def test_save_upload_hashes_and_renames(tmp_path):
+    payload = os.urandom(300_000)
+    destination = str(tmp_path / "case_doc.pdf")
+
+    stored = await save_upload(
+        UploadFile(io.BytesIO(payload), filename="doc.pdf"),
+        destination,
+        max_bytes=1_000_000,
+        chunk_size=64 * 1024,
+    )
+
+    assert stored.size == len(payload)
+    assert stored.sha256 == hashlib.sha256(payload).hexdigest()
+    with open(destination, "rb") as f:
+        assert f.read() == payload
+    assert os.listdir(tmp_path) == ["case_doc.pdf"]
+
+
+@pytest.mark.asyncio
+async def test_save_upload_enforces_limit_mid_stream(tmp_path):
+    destination = str(tmp_path / "too_big.pdf")
+
+    with pytest.raises(UploadTooLarge):
+        await save_upload(
+            UploadFile(io.BytesIO(b"x" * 200_000), filename="big.pdf"),
+            destination,
+            max_bytes=100_000,
+            chunk_size=32 * 1024,
+        )
+
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_blob_store_deduplicates(tmp_path):
+    store = BlobStore(str(tmp_path), chunk_size=4096)
+    payload = os.urandom(50_000)
+
+    first = await store.put(UploadFile(io.BytesIO(payload), filename="a.pdf"), max_bytes=1_000_000)
+    second = await store.put(UploadFile(io.BytesIO(payload), filename="b.pdf"), max_bytes=1_000_000)
+
+    assert first.created and not second.created
+    assert first.path == second.path == store.path_for(hashlib.sha256(payload).hexdigest())
+    assert first.path.startswith(str(tmp_path / first.sha256[:2] / first.sha256[2:4]))
+
+
+@pytest.mark.asyncio
+async def test_blob_ref_count_follows_documents(db_session, test_user):
+    from sqlalchemy import select
+    from app.db.models import Blob, Case, Document
+
+    case = Case(user_id=test_user.id, title="Blob refs")
+    db_session.add(case)
+    await db_session.flush()
+
+    sha256 = hashlib.sha256(os.urandom(16)).hexdigest()
+    documents = []
+    for name in ("a.pdf", "b.pdf"):
+        await acquire_blob_ref(db_session, sha256, 10)
+        document = Document(case_id=case.id, filename=name, file_url="x", content_hash=sha256, size_bytes=10)
+        db_session.add(document)
+        documents.append(document)
+    await db_session.commit()
+
+    ref_count = (await db_session.execute(select(Blob.ref_count).where(Blob.sha256 == sha256))).scalar_one()
+    assert ref_count == 2
+
+    await db_session.delete(documents[0])
+    await db_session.commit()
+    ref_count = (await db_session.execute(select(Blob.ref_count).where(Blob.sha256 == sha256))).scalar_one()
+    assert ref_count == 1
+
+
+class RacingSession:
+    """
+    Lets an upload take a reference right after the collector picked its
+    candidates, before the DELETE runs.
+    """
+
+    def __init__(self, session, race):
+        self.session = session
+        self.race = race
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+    async def execute(self, statement, *args, **kwargs):
+        result = await self.session.execute(statement, *args, **kwargs)
+        if self.race is not None and statement.is_select:
+            race, self.race = self.race, None
+            await race()
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+@pytest.mark.asyncio
+async def test_blob_gc_only_removes_what_it_deleted(tmp_path):
+    from datetime import datetime
+    from sqlalchemy import select
+    from app.db.models import Blob
+    from app.jobs.blob_gc import collect_garbage
+    from tests.conftest import TestingSessionLocal
+
+    store = BlobStore(str(tmp_path))
+    stale, revived, orphan = (hashlib.sha256(os.urandom(16)).hexdigest() for _ in range(3))
+    for sha256 in (stale, revived, orphan):
+        path = store.path_for(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x")
+        os.utime(path, (0, 0))
+    async with TestingSessionLocal() as session:
+        for sha256 in (stale, revived):
+            session.add(Blob(sha256=sha256, size_bytes=1, ref_count=0, updated_at=datetime(2000, 1, 1)))
+        await session.commit()
+
+    raced = []
+
+    async def upload_revives_blob():
+        if raced:
+            return
+        raced.append(True)
+        async with TestingSessionLocal() as session:
+            await acquire_blob_ref(session, revived, 1)
+            await session.commit()
+
+    stats = await collect_garbage(
+        lambda: RacingSession(TestingSessionLocal(), upload_revives_blob), store=store, grace_seconds=60
+    )
+
+    assert stats == {"rows_deleted": 1, "files_deleted": 1, "orphan_files_deleted": 1}
+    assert not os.path.exists(store.path_for(stale))
+    assert not os.path.exists(store.path_for(orphan))
+    assert os.path.exists(store.path_for(revived))
+    async with TestingSessionLocal() as session:
+        rows = (await session.execute(select(Blob.sha256, Blob.ref_count).where(Blob.sha256.in_([stale, revived, orphan])))).all()
+    assert rows == [(revived, 1)]
@@ -38,3 +38,16 @@ async def test_profile_created_and_deleted_with_user(client: AsyncClient, db_ses
     # UserProfile ma (user_id) jako Foreign Key z ondelete="CASCADE"
     profile_result = await db_session.execute(select(UserProfile).where(UserProfile.user_id == user_uuid))
     assert profile_result.scalar_one_or_none() is None
+
+
+@pytest.mark.asyncio
+async def test_profile_phone_must_be_e164(client: AsyncClient, db_session, test_user, auth_headers):
+    response = await client.patch("/api/v1/users/me", json={"phone": "600 100 200"}, headers=auth_headers)
+    assert response.status_code == 422
+
+    response = await client.patch("/api/v1/users/me", json={"phone": "+48600100200"}, headers=auth_headers)
+    assert response.status_code == 200
+    profile = await db_session.scalar(
+        select(UserProfile).where(UserProfile.user_id == test_user.id).execution_options(populate_existing=True)
+    )
+    assert profile.phone == "+48600100200"
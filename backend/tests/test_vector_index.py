@@ -0,0 +1,190 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+
+from app.api.v1.endpoints import ai
+from app.db.models import Document
+from app.db.session import get_session_factory
+from app.jobs.index_documents import index_documents
+from app.main import app
+from app.services import storage
+from app.services.context_store import fit_to_budget
+from app.services.document_analysis import DocumentAnalysisError
+from app.services.document_index import DocumentIndexer
+from app.services.embeddings import HashingEmbedder
+from app.services.vector_index import IndexMismatch, VectorIndex, VectorIndexStore
+from tests.conftest import TestingSessionLocal
+
+
+def test_search_matches_brute_force_across_growth(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 32)).astype(np.float32)
+    index = VectorIndex(str(tmp_path), 32, "test", initial_capacity=100)
+    for start in range(0, 3000, 700):
+        assert index.add(vectors[start:start + 700]) == list(range(start, min(start + 700, 3000)))
+    assert index.capacity >= 3000
+
+    query = rng.standard_normal(32)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:10]
+    assert [row for row, _ in index.search(query, k=10)] == list(expected)
+
+    index.remove([int(expected[0])])
+    assert index.search(query, k=1)[0][0] == expected[1]
+    assert index.live_count == 2999
+
+
+def test_other_handles_see_new_rows_and_reject_other_embedders(tmp_path):
+    writer = VectorIndex(str(tmp_path), 4, "test")
+    reader = VectorIndex(str(tmp_path), 4, "test")
+    assert reader.search(np.ones(4)) == []
+    writer.add(np.eye(4))
+    assert reader.search(np.array([0, 0, 1, 0]), k=1)[0][0] == 2
+    with pytest.raises(IndexMismatch):
+        VectorIndex(str(tmp_path), 4, "other")
+
+
+@pytest.mark.asyncio
+async def test_hashing_embedder_is_deterministic_and_lexical():
+    embedder = HashingEmbedder(256)
+    a, b, c = await embedder.embed([
+        "termin na wniesienie sprzeciwu od nakazu zapłaty",
+        "sprzeciw od nakazu zapłaty termin",
+        "umowa najmu lokalu mieszkalnego",
+    ])
+    assert np.allclose(a, HashingEmbedder(256).embed_sync(["termin na wniesienie sprzeciwu od nakazu zapłaty"])[0])
+    assert a @ b > 0.4 > a @ c
+
+
+class MemoryContextStore:
+    async def get_context(self, session_id):
+        return fit_to_budget([], None, 3000)
+
+    async def append_messages(self, session_id, messages, keep_last=None):
+        pass
+
+
+@pytest.fixture
+def rag_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.blob_store, "root", str(tmp_path))
+    indexer = DocumentIndexer(HashingEmbedder(256), VectorIndexStore(str(tmp_path / "index")), chunk_tokens=40, min_score=0.1)
+    monkeypatch.setattr(ai, "_indexer", indexer)
+    monkeypatch.setattr("app.api.v1.endpoints.cases.document_indexer", indexer)
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    yield indexer
+    app.dependency_overrides.pop(get_session_factory, None)
+
+
+@pytest.mark.asyncio
+async def test_generate_grounded_in_case_documents(client: AsyncClient, auth_headers, other_auth_headers, rag_backend, monkeypatch):
+    prompts = []
+
+    class EchoGemini:
+        model = "echo"
+
+        async def generate(self, prompt, context=None):
+            prompts.append(prompt)
+            return "ok"
+
+    monkeypatch.setattr(ai, "_gemini", EchoGemini())
+    monkeypatch.setattr(ai, "_context_store", MemoryContextStore())
+
+    case_id = (await client.post("/api/v1/cases/", json={"title": "Najem"}, headers=auth_headers)).json()["id"]
+    text = (
+        "Umowa najmu lokalu przy ul. Długiej zawarta na czas nieokreślony.\n\n"
+        "Kaucja wynosi trzykrotność miesięcznego czynszu i podlega zwrotowi w terminie miesiąca.\n\n"
+        "Wypowiedzenie umowy następuje z zachowaniem trzymiesięcznego okresu wypowiedzenia."
+    )
+    document = (await client.post(
+        f"/api/v1/cases/{case_id}/documents", files={"file": ("umowa.txt", text.encode(), "text/plain")}, headers=auth_headers
+    )).json()
+    while rag_backend._tasks:
+        await asyncio.sleep(0.01)
+
+    response = await client.post(
+        "/api/v1/ai/generate",
+        json={"prompt": "Jaka jest kaucja i kiedy podlega zwrotowi?", "session_id": "rag", "case_id": case_id},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    sources = response.json()["sources"]
+    assert sources and sources[0]["document_id"] == document["id"] and sources[0]["filename"] == "umowa.txt"
+    assert "Kaucja wynosi" in prompts[0].split("Question:")[0]
+    assert prompts[0].endswith("Question: Jaka jest kaucja i kiedy podlega zwrotowi?")
+
+    body = {"prompt": "Kaucja?", "case_id": case_id}
+    assert (await client.post("/api/v1/ai/generate", json=body)).status_code == 401
+    assert (await client.post("/api/v1/ai/generate", json=body, headers=other_auth_headers)).status_code == 403
+
+    # Backfill finds nothing missing; a rebuild re-embeds the same passages
+    assert (await index_documents(TestingSessionLocal, rag_backend, case_id=uuid.UUID(case_id)))["documents_indexed"] == 0
+    stats = await index_documents(TestingSessionLocal, rag_backend, case_id=uuid.UUID(case_id), rebuild=True)
+    assert stats["documents_indexed"] == 1 and stats["passages"] >= len(sources)
+    assert rag_backend.index_for(uuid.UUID(case_id)).live_count == stats["passages"]
+
+
+@pytest.mark.asyncio
+async def test_retrieval_failure_still_answers(client: AsyncClient, auth_headers, rag_backend, monkeypatch):
+    prompts = []
+
+    class EchoGemini:
+        model = "echo"
+
+        async def generate(self, prompt, context=None):
+            prompts.append(prompt)
+            return "ok"
+
+    async def broken_retrieve(db, case_id, query, k=None):
+        raise IndexMismatch("index was built by another embedder")
+
+    monkeypatch.setattr(ai, "_gemini", EchoGemini())
+    monkeypatch.setattr(ai, "_context_store", MemoryContextStore())
+    monkeypatch.setattr(rag_backend, "retrieve", broken_retrieve)
+
+    case_id = (await client.post("/api/v1/cases/", json={"title": "Najem"}, headers=auth_headers)).json()["id"]
+    response = await client.post(
+        "/api/v1/ai/generate", json={"prompt": "Kaucja?", "session_id": "rag-down", "case_id": case_id}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["sources"] == []
+    assert prompts == ["Kaucja?"]
+
+
+@pytest.mark.asyncio
+async def test_background_indexing_is_bounded_and_size_checked(tmp_path):
+    indexer = DocumentIndexer(
+        HashingEmbedder(256), VectorIndexStore(str(tmp_path / "index")), max_concurrency=2, max_bytes=1024, max_chars=100
+    )
+    running = peak = 0
+    indexed = []
+
+    async def slow_index(session_factory, document):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        indexed.append(document.id)
+        return 1
+
+    real_index = indexer.index_document
+    indexer.index_document = slow_index
+    documents = [Document(id=uuid.uuid4(), case_id=uuid.uuid4(), filename="a.txt", file_url="", size_bytes=10) for _ in range(6)]
+    for document in documents:
+        indexer.schedule(TestingSessionLocal, document)
+    while indexer._tasks:
+        await asyncio.sleep(0.01)
+    assert peak == 2 and len(indexed) == 6
+
+    indexer.index_document = real_index
+    too_big = Document(id=uuid.uuid4(), case_id=uuid.uuid4(), filename="a.txt", file_url="/nonexistent", size_bytes=4096)
+    with pytest.raises(DocumentAnalysisError, match="exceeds 1024 bytes"):
+        await indexer.index_document(TestingSessionLocal, too_big)
+    long_text = tmp_path / "long.txt"
+    long_text.write_text("słowo " * 50)
+    too_long = Document(id=uuid.uuid4(), case_id=uuid.uuid4(), filename="long.txt", file_url=str(long_text), size_bytes=300)
+    with pytest.raises(DocumentAnalysisError, match="exceeds 100 characters"):
+        await indexer.index_document(TestingSessionLocal, too_long)
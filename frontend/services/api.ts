@@ -61,7 +61,7 @@ const getErrorMessage = (errorData: unknown, fallback: string) => {
     return String(detail);
 };
 
-export const apiCall = async (endpoint: string, options: RequestInit = {}) => {
+const apiFetch = async (endpoint: string, options: RequestInit = {}) => {
     const token = localStorage.getItem('token');
     const headers = {
         'Content-Type': 'application/json',
@@ -79,9 +79,28 @@ export const apiCall = async (endpoint: string, options: RequestInit = {}) => {
         throw new Error(getErrorMessage(errorData, 'Something went wrong'));
     }
 
+    return response;
+};
+
+export const apiCall = async (endpoint: string, options: RequestInit = {}) => {
+    const response = await apiFetch(endpoint, options);
     return response.json();
 };
 
+// The case list is paged; follow X-Next-Cursor until the last page
+const listAllCases = async () => {
+    const cases = [];
+    let cursor: string | null = null;
+    do {
+        const params = new URLSearchParams({ include: 'documents', limit: '100' });
+        if (cursor) params.set('cursor', cursor);
+        const response = await apiFetch(`/cases/?${params}`);
+        cases.push(...await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return cases;
+};
+
 export const authApi = {
     login: (loginData: { email: string, password: string }) => {
         const body = new URLSearchParams();
@@ -111,7 +130,7 @@ export const authApi = {
 };
 
 export const casesApi = {
-    list: () => apiCall('/cases/'),
+    list: listAllCases,
     get: (id: string) => apiCall(`/cases/${id}`),
     create: (data: CaseData) => apiCall('/cases/', {
         method: 'POST',